@@ -0,0 +1,158 @@
+import hashlib
+import sys
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import Sentiment
+
+FIELDS = ('title', 'description', 'content', 'url', 'publishedAt', 'source', 'relevance_score', 'sentiment')
+
+#ISO 8601, RFC 2822 and driver timestamps as an aware datetime, naive values are taken as UTC
+def parse_published(value) -> datetime:
+    #neo4j.time.DateTime, as graph timestamps come back from the driver
+    if hasattr(value, 'to_native'):
+        value = value.to_native()
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    value = str(value or "").strip()
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _text(value) -> str:
+    return value if type(value) is str else str(value or '')
+
+#One news article as it moves from the collector through tagging, the graph and the vector store
+#Slots instead of a dict per article; the description is only stored when it differs from the content,
+#source names are interned and the derived text, hashes and sentiment are computed on first use
+class Article:
+    __slots__ = ('title', 'content', 'url', 'published_at', 'source', 'relevance_score',
+                 '_description', '_text', '_text_lower', '_fingerprint', '_published', '_sentiment')
+
+    def __init__(self, title: str = '', content: str = '', url: str = '', published_at: str = '', source: str = '',
+                 description: str = None, relevance_score: float = 0.0, sentiment: float = None):
+        self.title = _text(title)
+        self.content = _text(content) or _text(description)
+        self.url = _text(url)
+        self.published_at = _text(published_at)
+        self.source = sys.intern(_text(source))
+        self.relevance_score = relevance_score
+        description = _text(description)
+        self._description = description if description and description != self.content else None
+        self._text = None
+        self._text_lower = None
+        self._fingerprint = None
+        self._published = None
+        self._sentiment = sentiment
+
+    #Accepts the dict shape older callers and stored payloads use
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Article':
+        source = data.get('source', '')
+        if isinstance(source, dict):
+            source = source.get('name', '')
+        return cls(
+            title=data.get('title', ''),
+            content=data.get('content', ''),
+            url=data.get('url', ''),
+            published_at=data.get('publishedAt', ''),
+            source=source,
+            description=data.get('description'),
+            relevance_score=data.get('relevance_score', 0.0) or 0.0,
+            sentiment=data.get('sentiment')
+        )
+
+    @classmethod
+    def coerce(cls, article) -> 'Article':
+        return article if isinstance(article, cls) else cls.from_dict(article)
+
+    @property
+    def description(self) -> str:
+        return self._description if self._description is not None else self.content
+
+    #Title and content, the text articles are tagged and embedded from
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = f"{self.title} {self.content}"
+        return self._text
+
+    @property
+    def text_lower(self) -> str:
+        if self._text_lower is None:
+            self._text_lower = self.text.lower()
+        return self._text_lower
+
+    #Url when there is one, otherwise the normalized title; the key duplicates are detected by
+    @property
+    def key(self) -> str:
+        return self.url or self.title.strip().lower()
+
+    #Digest of the dedup key, stable across processes unlike hash()
+    @property
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.blake2b(self.key.encode('utf-8'), digest_size=8).hexdigest()
+        return self._fingerprint
+
+    @property
+    def published(self):
+        if self._published is None:
+            self._published = parse_published(self.published_at) or False
+        return self._published or None
+
+    #Lexicon tone in [-1, 1]; batches are scored up front by Sentiment.score_articles, a lone article on first use
+    @property
+    def sentiment(self) -> float:
+        if self._sentiment is None:
+            Sentiment.score_articles([self])
+        return self._sentiment
+
+    @sentiment.setter
+    def sentiment(self, score: float):
+        self._sentiment = score
+
+    @property
+    def scored(self) -> bool:
+        return self._sentiment is not None
+
+    def to_dict(self) -> dict:
+        return {
+            'title': self.title,
+            'description': self.description,
+            'content': self.content,
+            'url': self.url,
+            'publishedAt': self.published_at,
+            'source': self.source,
+            'relevance_score': self.relevance_score,
+            'sentiment': self._sentiment
+        }
+
+    #Read-only dict view, so code written against article dicts keeps working
+    def __getitem__(self, key: str):
+        if key not in FIELDS:
+            raise KeyError(key)
+        if key == 'publishedAt':
+            return self.published_at
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return FIELDS
+
+    def __contains__(self, key) -> bool:
+        return key in FIELDS
+
+    def __repr__(self) -> str:
+        return f"Article({self.title[:60]!r}, url={self.url!r})"
@@ -0,0 +1,153 @@
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from Config import get_setting
+from GraphRag import GraphRAGSystem
+import Metrics
+
+QUERY_FIELDS = ['query', 'question', 'body', 'title']
+
+def _json_value(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+#Reads one query per line, either plain text or a JSON object with a query-like field
+def load_queries(path: str, field: str = None) -> list[dict]:
+    queries = []
+    stream = sys.stdin if path == "-" else open(path)
+    with stream:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = line
+            if isinstance(record, str):
+                queries.append({'id': str(line_number), 'query': record})
+                continue
+            fields = [field] if field else QUERY_FIELDS
+            text = next((record[f] for f in fields if record.get(f)), None)
+            if not text:
+                logging.warning(f"Skipping line {line_number}: no query field")
+                continue
+            query_id = record.get('id') or record.get('request_id') or str(line_number)
+            queries.append({'id': str(query_id), 'query': str(text)})
+    return queries
+
+#Runs process_user_query over many queries with a bounded number in flight
+class BatchRunner:
+    def __init__(self, openai_key: str, concurrency: int = 4):
+        self.openai_key = openai_key
+        self.concurrency = max(1, concurrency)
+        self._local = threading.local()
+        self._systems = []
+        self._systems_lock = threading.Lock()
+
+    #Each worker thread gets its own system so per-instance caches are never shared between threads;
+    #every system is kept so run() can flush and close it
+    def _system(self) -> GraphRAGSystem:
+        system = getattr(self._local, 'system', None)
+        if system is None:
+            system = GraphRAGSystem(self.openai_key)
+            self._local.system = system
+            with self._systems_lock:
+                self._systems.append(system)
+        return system
+
+    #Waits for every system's write-behind queue to land, then closes its queue and graph driver
+    def close(self):
+        with self._systems_lock:
+            systems, self._systems = self._systems, []
+        self._local = threading.local()
+        for system in systems:
+            system.close()
+
+    def run_one(self, item: dict) -> dict:
+        started = time.perf_counter()
+        record = {'id': item['id'], 'query': item['query']}
+        try:
+            result = self._system().process_user_query(item['query'])
+            record.update({
+                'ok': True,
+                'response': result.get('response', ''),
+                'mentioned_tickers': result.get('mentioned_tickers', []),
+                'mentioned_sectors': result.get('mentioned_sectors', []),
+                'stock_data': result.get('stock_data', {}),
+                'articles': [
+                    {
+                        'title': article.get('metadata', {}).get('title', ''),
+                        'url': article.get('metadata', {}).get('url', ''),
+                        'similarity_score': article.get('similarity_score', 0)
+                    }
+                    for article in result.get('relevant_articles', [])
+                ],
+                'search_queries_used': result.get('search_queries_used', []),
+                'timings': result.get('timings', {}),
+                'upstream_calls': result.get('cache_stats', {}).get('upstream_calls', {}),
+                'trace_id': result.get('trace_id')
+            })
+        except Exception as e:
+            record.update({'ok': False, 'error': f"{type(e).__name__}: {e}"})
+        record['elapsed'] = round(time.perf_counter() - started, 4)
+        return record
+
+    def run(self, queries: list[dict], output) -> dict:
+        completed = 0
+        failed = 0
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = [pool.submit(self.run_one, item) for item in queries]
+                for future in as_completed(futures):
+                    record = future.result()
+                    output.write(json.dumps(record, default=_json_value) + "\n")
+                    output.flush()
+                    completed += 1
+                    failed += 0 if record['ok'] else 1
+                    logging.info(f"[{completed}/{len(queries)}] {record['id']} {'ok' if record['ok'] else 'failed'} in {record['elapsed']}s")
+        finally:
+            self.close()
+        return {'queries': completed, 'failed': failed, 'seconds': round(time.perf_counter() - started, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Run financial queries headlessly and write JSONL results")
+    parser.add_argument("input", help="file with one query per line (plain text or JSON), '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output path, '-' for stdout")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="maximum queries in flight")
+    parser.add_argument("--field", help="JSON field holding the query text")
+    parser.add_argument("--limit", type=int, help="only run the first N queries")
+    parser.add_argument("--metrics-out", help="write Prometheus text metrics for the whole batch to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+
+    openai_key = get_setting("OPENAI_API_KEY")
+    if not openai_key:
+        parser.error("OPENAI_API_KEY is not set")
+
+    queries = load_queries(args.input, args.field)
+    if args.limit:
+        queries = queries[:args.limit]
+
+    runner = BatchRunner(openai_key, args.concurrency)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        summary = runner.run(queries, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    logging.info(f"Batch complete: {summary}")
+    if args.metrics_out:
+        with open(args.metrics_out, "w") as f:
+            f.write(Metrics.render_prometheus())
+    sys.exit(1 if summary['failed'] else 0)
+
+if __name__ == "__main__":
+    main()
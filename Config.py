@@ -0,0 +1,44 @@
+import os
+import sys
+from LazyLoader import is_loaded
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+_file_secrets = None
+
+def _read_secrets_file() -> dict:
+    global _file_secrets
+    if _file_secrets is None:
+        _file_secrets = {}
+        if tomllib and os.path.exists(SECRETS_PATH):
+            try:
+                with open(SECRETS_PATH, "rb") as f:
+                    _file_secrets = tomllib.load(f)
+            except Exception:
+                pass
+    return _file_secrets
+
+#Looks a setting up in the environment, then Streamlit secrets, without importing Streamlit
+def get_setting(name: str, default=None):
+    if name in os.environ:
+        return os.environ[name]
+
+    if is_loaded("streamlit"):
+        try:
+            secrets = sys.modules["streamlit"].secrets
+            if name in secrets:
+                return secrets[name]
+        except Exception:
+            pass
+
+    return _read_secrets_file().get(name, default)
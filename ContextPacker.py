@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import math
+import os
+import re
+from datetime import datetime, timezone
+from LazyLoader import lazy_import
+from Article import parse_published
+import Notifier
+
+tiktoken = lazy_import("tiktoken")
+
+CONTEXT_TOKEN_BUDGET = 2500
+TOKENIZER_ENCODING = "o200k_base"
+#tiktoken fetches an encoding over the network on first use; it is stored here once, ahead of time, by
+#python ContextPacker.py --cache-tokenizer, and TokenCounter never downloads on the query path.
+#TokenCounter points tiktoken at it only when it loads an encoding, importing this module leaves the environment alone
+TOKENIZER_CACHE_DIR = os.environ.get("TIKTOKEN_CACHE_DIR", "tiktoken_cache")
+TOKENIZER_URLS = {
+    "o200k_base": "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken",
+    "cl100k_base": "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+}
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(])')
+WORD = re.compile(r"[a-z0-9$%]+(?:\.\d+)?")
+
+_warned_encodings = set()
+
+#tiktoken keys its cache by the sha1 of the encoding's url
+def tokenizer_cached(encoding: str = TOKENIZER_ENCODING) -> bool:
+    url = TOKENIZER_URLS.get(encoding)
+    return url is not None and os.path.exists(os.path.join(TOKENIZER_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest()))
+
+#Counts tokens with the cached tiktoken encoding, or a word-based estimate when it is missing or not installed
+class TokenCounter:
+    def __init__(self, encoding: str = TOKENIZER_ENCODING, download: bool = False):
+        self._encoding = None
+        if not download and not tokenizer_cached(encoding):
+            if encoding in _warned_encodings:
+                return
+            _warned_encodings.add(encoding)
+            Notifier.warning(f"Tokenizer {encoding} is not cached in {TOKENIZER_CACHE_DIR}, token counts are estimated; "
+                             f"run python ContextPacker.py --cache-tokenizer")
+            return
+        try:
+            os.environ.setdefault("TIKTOKEN_CACHE_DIR", TOKENIZER_CACHE_DIR)
+            self._encoding = tiktoken.get_encoding(encoding)
+        except Exception as e:
+            Notifier.warning(f"Tokenizer {encoding} unavailable, token counts are estimated: {e}")
+            self._encoding = None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return int(len(re.findall(r"\w+|[^\w\s]", text)) * 1.3) + 1
+
+def _format_cap(value) -> str:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return "-"
+    if value >= 1e12:
+        return f"${value / 1e12:.2f}T"
+    if value >= 1e9:
+        return f"${value / 1e9:.2f}B"
+    if value >= 1e6:
+        return f"${value / 1e6:.2f}M"
+    return f"${value:.0f}" if value else "-"
+
+#Fills a fixed token budget with stock data, graph context and the best non-redundant article sentences
+class ContextPacker:
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, min_similarity: float = 0.1,
+                 recency_half_life_days: float = 7.0, duplicate_threshold: float = 0.6, max_articles: int = 8):
+        self.token_budget = token_budget
+        self.min_similarity = min_similarity
+        self.recency_half_life_days = recency_half_life_days
+        self.duplicate_threshold = duplicate_threshold
+        self.max_articles = max_articles
+        self.tokens = TokenCounter()
+
+    def stock_table(self, stock_data: dict) -> str:
+        if not stock_data:
+            return ""
+        rows = ["Ticker | Company | Price | Change % | Market Cap | P/E"]
+        for ticker, data in stock_data.items():
+            pe = data.get('peRatio') or 0
+            rows.append(
+                f"{ticker} | {data.get('companyName', '') or ticker} | ${data.get('price', '-')} | "
+                f"{data.get('changePercent', '-')} | {_format_cap(data.get('marketCap'))} | "
+                f"{f'{float(pe):.1f}' if isinstance(pe, (int, float)) and pe else '-'}"
+            )
+        return "\n".join(rows)
+
+    def _recency(self, published, now: datetime) -> float:
+        published = parse_published(published)
+        if published is None:
+            return 0.5
+        age_days = max(0.0, (now - published).total_seconds() / 86400)
+        return math.pow(0.5, age_days / self.recency_half_life_days)
+
+    def rank(self, articles: list[dict], now: datetime = None) -> list[dict]:
+        now = now or datetime.now(timezone.utc)
+        candidates = [a for a in articles if a.get('similarity_score', 0) > self.min_similarity]
+        return sorted(
+            candidates,
+            key=lambda a: a.get('similarity_score', 0) * (0.6 + 0.4 * self._recency(a.get('metadata', {}).get('publishedAt'), now)),
+            reverse=True
+        )
+
+    def _body(self, article: dict) -> str:
+        content = article.get('content', '') or ''
+        if content.startswith("Title: ") and " Content: " in content:
+            content = content.split(" Content: ", 1)[1]
+        return content.strip()
+
+    def _shingles(self, sentence: str) -> set:
+        words = WORD.findall(sentence.lower())
+        if len(words) < 3:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+    def _is_duplicate(self, shingles: set, seen: list) -> bool:
+        if not shingles:
+            return True
+        for other in seen:
+            overlap = len(shingles & other)
+            if overlap and overlap / min(len(shingles), len(other)) >= self.duplicate_threshold:
+                return True
+        return False
+
+    def pack(self, articles: list[dict], stock_data: dict, graph_context: str = "") -> dict:
+        remaining = self.token_budget
+
+        stock_context = self.stock_table(stock_data)
+        remaining -= self.tokens.count(stock_context)
+
+        graph_context = (graph_context or "").strip()
+        graph_tokens = self.tokens.count(graph_context)
+        graph_limit = max(0, remaining // 4)
+        if graph_tokens > graph_limit:
+            kept = []
+            for sentence in SENTENCE_SPLIT.split(graph_context):
+                cost = self.tokens.count(sentence)
+                if cost > graph_limit:
+                    break
+                kept.append(sentence)
+                graph_limit -= cost
+            graph_context = " ".join(kept)
+            graph_tokens = self.tokens.count(graph_context)
+        remaining -= graph_tokens
+
+        seen = []
+        blocks = []
+        used_articles = []
+        for article in self.rank(articles):
+            if len(blocks) >= self.max_articles or remaining <= 0:
+                break
+            metadata = article.get('metadata', {})
+            published = parse_published(metadata.get('publishedAt'))
+            header = f"Article: {metadata.get('title', '')}\nSource: {metadata.get('source', '')}"
+            if published:
+                header += f" ({published.strftime('%Y-%m-%d')})"
+            header_cost = self.tokens.count(header) + 2
+            if header_cost >= remaining:
+                break
+
+            sentences = []
+            budget = remaining - header_cost
+            for sentence in SENTENCE_SPLIT.split(self._body(article)):
+                shingles = self._shingles(sentence)
+                if self._is_duplicate(shingles, seen):
+                    continue
+                cost = self.tokens.count(sentence) + 1
+                if cost > budget:
+                    break
+                sentences.append(sentence)
+                seen.append(shingles)
+                budget -= cost
+
+            if not sentences:
+                continue
+            block = f"{header}\nContent: {' '.join(sentences)}"
+            remaining -= self.tokens.count(block)
+            blocks.append(block)
+            used_articles.append(article)
+
+        article_context = "\n\n".join(blocks)
+        return {
+            'stock_context': stock_context,
+            'graph_context': graph_context,
+            'article_context': article_context,
+            'articles': used_articles,
+            'tokens': self.token_budget - remaining
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare the context packer for offline use")
+    parser.add_argument("--cache-tokenizer", action="store_true",
+                        help="download the tokenizer encoding into TIKTOKEN_CACHE_DIR (./tiktoken_cache by default)")
+    parser.add_argument("--encoding", default=TOKENIZER_ENCODING, choices=sorted(TOKENIZER_URLS))
+    args = parser.parse_args()
+    if args.cache_tokenizer:
+        counter = TokenCounter(args.encoding, download=True)
+        if counter._encoding is None:
+            raise SystemExit(1)
+        print(f"{args.encoding} cached in {TOKENIZER_CACHE_DIR}")
+    else:
+        print(f"{args.encoding} cached: {tokenizer_cached(args.encoding)}")
+
+if __name__ == "__main__":
+    main()
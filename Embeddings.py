@@ -0,0 +1,176 @@
+import argparse
+import logging
+import threading
+from dataclasses import dataclass
+from LazyLoader import lazy_import
+from Config import get_setting
+import Notifier
+
+np = lazy_import("numpy")
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+FULL_DIMENSIONS = 1536
+SCORE_BLOCK_ROWS = 4096
+
+#How vectors are requested and stored: output dimensions and whether int8 codes serve the first search pass (mmap backend)
+@dataclass(frozen=True)
+class EmbeddingProfile:
+    name: str
+    dimensions: int = FULL_DIMENSIONS
+    quantize: bool = False
+    oversample: int = 4
+
+    #Each dimension count gets its own collection so vectors of different sizes never mix
+    @property
+    def collection_suffix(self) -> str:
+        return "" if self.dimensions == FULL_DIMENSIONS else f"_d{self.dimensions}"
+
+    def request_kwargs(self) -> dict:
+        return {} if self.dimensions == FULL_DIMENSIONS else {"dimensions": self.dimensions}
+
+PROFILES = {
+    "full": EmbeddingProfile("full"),
+    "512": EmbeddingProfile("512", 512),
+    "256": EmbeddingProfile("256", 256),
+    "full-int8": EmbeddingProfile("full-int8", FULL_DIMENSIONS, True),
+    "512-int8": EmbeddingProfile("512-int8", 512, True),
+    "256-int8": EmbeddingProfile("256-int8", 256, True)
+}
+
+def get_profile(profile=None) -> EmbeddingProfile:
+    if isinstance(profile, EmbeddingProfile):
+        return profile
+    name = profile or get_setting("EMBEDDING_PROFILE", "full")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown embedding profile {name!r}, expected one of {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+def normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+#text-embedding-3 vectors keep their meaning when cut short and renormalized, so stored vectors can be shrunk without re-embedding
+def truncate(matrix, dimensions: int):
+    return normalize(np.asarray(matrix, dtype=np.float32)[..., :dimensions])
+
+#Symmetric per-row int8 codes, row ~= codes * scale
+def quantize_int8(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=-1) / 127.0
+    scales = np.where(scales == 0, 1, scales).astype(np.float32)
+    codes = np.clip(np.rint(matrix / scales[..., np.newaxis]), -127, 127).astype(np.int8)
+    return codes, scales
+
+#Approximate cosine scores of int8 codes against a float query, one block of rows at a time so the upcast stays small
+def score_int8(codes, scales, query, out=None):
+    query = normalize(query)
+    scores = np.empty(len(codes), dtype=np.float32) if out is None else out
+    for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+        np.dot(codes[start:start + SCORE_BLOCK_ROWS], query, out=scores[start:start + SCORE_BLOCK_ROWS])
+    scores *= scales
+    return scores
+
+#In-memory int8 copy of a set of normalized vectors, used to measure int8 recall; the mmap backend keeps its codes on disk
+class Int8Index:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ids = []
+        self._positions = {}
+        self.codes = None
+        self.scales = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: list[str], vectors):
+        if not ids:
+            return
+        codes, scales = quantize_int8(normalize(vectors))
+        with self._lock:
+            fresh = [i for i, id_ in enumerate(ids) if id_ not in self._positions]
+            for i in range(len(ids)):
+                position = self._positions.get(ids[i])
+                if position is not None:
+                    self.codes[position] = codes[i]
+                    self.scales[position] = scales[i]
+            if not fresh:
+                return
+            if self.codes is None:
+                self.codes, self.scales = codes[fresh], scales[fresh]
+            else:
+                self.codes = np.concatenate([self.codes, codes[fresh]])
+                self.scales = np.concatenate([self.scales, scales[fresh]])
+            for i in fresh:
+                self._positions[ids[i]] = len(self.ids)
+                self.ids.append(ids[i])
+
+    def remove(self, ids: list[str]):
+        with self._lock:
+            drop = {self._positions[id_] for id_ in ids if id_ in self._positions}
+            if not drop:
+                return
+            keep = [i for i in range(len(self.ids)) if i not in drop]
+            self.ids = [self.ids[i] for i in keep]
+            self.codes = self.codes[keep]
+            self.scales = self.scales[keep]
+            self._positions = {id_: i for i, id_ in enumerate(self.ids)}
+
+    #Approximate cosine scores from the int8 codes, returns the top k ids best first
+    def search(self, query, k: int) -> list[tuple[str, float]]:
+        with self._lock:
+            if not self.ids:
+                return []
+            scores = score_int8(self.codes, self.scales, query)
+            k = min(k, len(self.ids))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.ids[i], float(scores[i])) for i in top]
+
+#Copies a collection into the layout of another profile, shrinking stored vectors or re-embedding when growing
+def migrate(source: str, target: str, persist_path: str = "./chroma_db", collection_name: str = "financial_news",
+            openai_key: str = None, batch_size: int = 500) -> dict:
+    from VectorDB import VectorDatabase
+
+    source_profile = get_profile(source)
+    target_profile = get_profile(target)
+    source_db = VectorDatabase(openai_key, persist_path, collection_name, profile=source_profile)
+    target_db = VectorDatabase(openai_key, persist_path, collection_name, profile=target_profile)
+    reembed = target_profile.dimensions > source_profile.dimensions
+    #Profiles that only differ in int8 share a collection; the mmap backend derives its codes when it opens
+    if source_db.collection.name == target_db.collection.name:
+        Notifier.info(f"{source} and {target} share {target_db.collection.name}, nothing to migrate")
+        return {"records": 0, "source": source_db.collection.name, "target": target_db.collection.name,
+                "reembedded": False}
+
+    copied = 0
+    for page in source_db.iter_records(batch_size, include=["embeddings", "documents", "metadatas"]):
+        if reembed:
+            vectors = np.array(target_db.get_embeddings(page['documents']), dtype=np.float32)
+            if not vectors.any(axis=1).all():
+                raise RuntimeError(f"Embedding failed after {copied} records, migration stopped")
+        else:
+            vectors = truncate(page['embeddings'], target_profile.dimensions)
+        target_db.collection.upsert(ids=page['ids'], embeddings=vectors, documents=page['documents'],
+                                    metadatas=page['metadatas'])
+        copied += len(page['ids'])
+
+    summary = {"records": copied, "source": source_db.collection.name, "target": target_db.collection.name,
+               "reembedded": reembed}
+    Notifier.info(f"Embedding migration complete: {summary}")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate the article collection to another embedding profile")
+    parser.add_argument("--from", dest="source", default="full", choices=sorted(PROFILES))
+    parser.add_argument("--to", dest="target", required=True, choices=sorted(PROFILES))
+    parser.add_argument("--persist-path", default="./chroma_db")
+    parser.add_argument("--collection", default="financial_news")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    migrate(args.source, args.target, args.persist_path, args.collection, get_setting("OPENAI_API_KEY"), args.batch_size)
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,26 @@
 import re
-import yfinance as yf
-import json
-from openai import OpenAI
+from functools import cached_property
+from LazyLoader import lazy_import
+from LLMClient import ResilientOpenAI, create_client
+import Notifier
+import Metrics
+from TickerUniverse import SECTOR_TICKERS, STOCK_GROUPS, get_universe
+
+yf = lazy_import("yfinance")
 
 #This classes extracts entities from the user query
 class EntityExtractor:
     def __init__(self, open_api_key: str):
-        self.openai_client = OpenAI(api_key=open_api_key)
+        self.openai_client = create_client(open_api_key)
         self.extraction_cache = {}
-        self.sector_tickers = {
-                'Technology': ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'TSLA', 'NVDA', 'CRM', 'ORCL', 'ADBE'],
-                'Banking': ['JPM', 'BAC', 'WFC', 'C', 'GS', 'MS', 'USB', 'PNC', 'TFC', 'COF'],
-                'Financial': ['JPM', 'BAC', 'WFC', 'C', 'GS', 'MS', 'BRK-B', 'V', 'MA', 'AXP'],
-                'Healthcare': ['JNJ', 'PFE', 'UNH', 'ABT', 'TMO', 'DHR', 'BMY', 'ABBV', 'MRK', 'LLY'],
-                'Energy': ['XOM', 'CVX', 'COP', 'EOG', 'SLB', 'PSX', 'VLO', 'MPC', 'OXY', 'KMI'],
-                'Consumer Discretionary': ['AMZN', 'TSLA', 'HD', 'MCD', 'NKE', 'SBUX', 'TJX', 'LOW', 'TGT', 'F'],
-                'Consumer Staples': ['PG', 'KO', 'PEP', 'WMT', 'COST', 'CL', 'KHC', 'GIS', 'K', 'HSY'],
-                'Industrials': ['BA', 'CAT', 'GE', 'MMM', 'HON', 'UPS', 'RTX', 'LMT', 'DE', 'UNP'],
-                'Materials': ['LIN', 'APD', 'SHW', 'ECL', 'FCX', 'NEM', 'DOW', 'DD', 'PPG', 'IFF'],
-                'Communication Services': ['GOOGL', 'META', 'DIS', 'VZ', 'T', 'NFLX', 'CMCSA', 'TMUS', 'CHTR', 'DISH'],
-                'Utilities': ['NEE', 'DUK', 'SO', 'D', 'AEP', 'EXC', 'XEL', 'SRE', 'PEG', 'ED'],
-                'Real Estate': ['AMT', 'PLD', 'CCI', 'EQIX', 'SPG', 'O', 'WELL', 'DLR', 'PSA', 'EQR']
-            }
-            
-        self.stock_groups = {
-            'FAANG': ['META', 'AAPL', 'AMZN', 'NFLX', 'GOOGL'],
-            'Magnificent 7': ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TSLA', 'META'],
-            'Big Tech': ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'TSLA', 'NVDA', 'CRM', 'ORCL'],
-            'Semiconductor': ['NVDA', 'AMD', 'INTC', 'TSM', 'AVGO', 'QCOM', 'TXN', 'AMAT', 'LRCX', 'KLAC'],
-            'Banking': ['JPM', 'BAC', 'WFC', 'C', 'GS', 'MS', 'USB', 'PNC', 'TFC', 'COF'],
-            'REIT': ['AMT', 'PLD', 'CCI', 'EQIX', 'SPG', 'O', 'WELL', 'DLR', 'PSA', 'EQR'],
-            'EV': ['TSLA', 'RIVN', 'LCID', 'NIO', 'XPEV', 'LI', 'F', 'GM'],
-            'Biotech': ['GILD', 'AMGN', 'BIIB', 'REGN', 'VRTX', 'ILMN', 'MRNA', 'BNTX']
-            }
+        self.sector_tickers = SECTOR_TICKERS
+        self.stock_groups = STOCK_GROUPS
+        self.universe = get_universe()
+
+    @cached_property
+    def llm(self) -> ResilientOpenAI:
+        return ResilientOpenAI(self.openai_client)
+
     #Using GPT to handle the extraction of entities
     def extract_entities(self, text: str) -> dict:
         if text in self.extraction_cache:
@@ -80,27 +68,26 @@ class EntityExtractor:
         user_prompt = f"Extract the financial entities contained in this text: {text}"
         
         try:
-            response = self.openai_client.chat.completions.create(
+            entities = self.llm.chat_json(
+                "extraction",
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 max_tokens=800,
-                temperature=0.0
+                temperature=0.0,
+                hedge=True
             )
-            
-            content = response.choices[0].message.content
-            if not isinstance(content, str):
-                content = ""
-            entities = json.loads(content)
+            if not isinstance(entities, dict):
+                raise ValueError(f"expected a JSON object, got {type(entities).__name__}")
             
             self.extraction_cache[text] = entities
             
             return entities
             
         except Exception as e:
-            print(f"LLM entity extraction failed: {e}")
+            Notifier.log(f"LLM entity extraction failed: {e}")
             return {}
         
     #Extracting tickers for ticker information
@@ -110,7 +97,7 @@ class EntityExtractor:
             
             for company in entities.get('companies', []):
                 if company.get('confidence', 0) > 0.5:
-                    all_tickers.append(company['ticker'])
+                    all_tickers.append(self.resolve_company(company))
                     
             for group in entities.get('stock_groups', []):
                 if group.get('confidence', 0) > 0.5:
@@ -140,30 +127,14 @@ class EntityExtractor:
 
     #Getting sector tickers    
     def get_sector_tickers(self, sector_name: str) -> list[str]:
-        if sector_name in self.sector_tickers:
-            return self.sector_tickers[sector_name][:5]
-            
-        sector_variations = {
-            'tech': 'Technology',
-            'technology': 'Technology',
-            'bank': 'Banking',
-            'banking': 'Banking',
-            'finance': 'Financial',
-            'financial': 'Financial',
-            'healthcare': 'Healthcare',
-            'pharma': 'Healthcare',
-            'energy': 'Energy',
-            'oil': 'Energy',
-            'consumer': 'Consumer Discretionary',
-            'retail': 'Consumer Discretionary'
-        }
-        
-        normalized_sector = sector_variations.get(sector_name.lower(), sector_name)
-        
-        if normalized_sector in self.sector_tickers:
-            return self.sector_tickers[normalized_sector][:5]
-        
-        return []
+        return self.universe.sector_tickers(sector_name)[:5]
+
+    #Prefers the universe entry for the company name when the model guessed an unlisted ticker
+    def resolve_company(self, company: dict) -> str:
+        ticker = company.get('ticker', '')
+        if self.universe.is_known(ticker):
+            return ticker
+        return self.universe.resolve(company.get('name', '')) or ticker
 
     #Extract sectors from entities
     def extract_sectors(self, text: str) -> list[str]:
@@ -195,15 +166,16 @@ class EntityExtractor:
         3. Business description terms (what the company is known for)
         4. Industry-specific terms
         
-        Return only the search terms as a JSON array:
-        ["term1", "term2", "term3", ...]
+        Return only the search terms as a JSON object:
+        {{"terms": ["term1", "term2", "term3", ...]}}
         
         Example for Apple Inc (AAPL):
-        ["Apple Inc", "AAPL stock", "iPhone maker", "Apple earnings", "Tim Cook Apple", "Apple technology", "Apple revenue"]
+        {{"terms": ["Apple Inc", "AAPL stock", "iPhone maker", "Apple earnings", "Tim Cook Apple", "Apple technology", "Apple revenue"]}}
         """
         
         try:
-            response = self.openai_client.chat.completions.create(
+            search_terms = self.llm.chat_json(
+                "search_terms",
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a financial search expert. Generate precise search terms."},
@@ -212,12 +184,8 @@ class EntityExtractor:
                 max_tokens=200,
                 temperature=0.1
             )
-            
-            content = response.choices[0].message.content
-            if not isinstance(content, str):
-                return [company_name, ticker] if company_name and ticker else ["stock news"]
-            
-            search_terms = json.loads(content)
+            if isinstance(search_terms, dict):
+                search_terms = search_terms.get('terms')
             if isinstance(search_terms, list):
                 filtered_terms = [str(term).strip() for term in search_terms if term is not None and str(term).strip()]
                 return filtered_terms if filtered_terms else ([company_name, ticker] if company_name and ticker else ["stock news"])
@@ -248,8 +216,14 @@ class EntityExtractor:
         false_positives = {'US', 'EU', 'CEO', 'CFO', 'IPO', 'ETF', 'SEC', 'FDA', 'LLC', 'INC', 'LTD'}
         return ticker not in false_positives
     
+    #In-memory for universe symbols, the live lookup only covers tickers a partial universe does not list
     def validate_ticker(self, ticker: str) -> bool:
+        if self.universe.is_known(ticker):
+            return True
+        if self.universe.exhaustive:
+            return False
         try:
+            Metrics.count("quote_fetches")
             stock = yf.Ticker(ticker)
             info = stock.info
             return len(info) > 5 and ('symbol' in info or 'shortName' in info)
@@ -1,36 +1,26 @@
-import requests
-import streamlit as st
-import yfinance as yf
 from datetime import datetime, timedelta
-import time
 import re
-import feedparser
 import json
 import os
 from typing import Optional
+from LazyLoader import lazy_import
+from Config import get_setting
+from HttpTransport import HttpTransport
+from NewsQuota import NewsQuota
+from Article import Article
+import QueryDeadline
+import Notifier
+import Metrics
 
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
+yf = lazy_import("yfinance")
+#Seconds for a yahoo history request, overridable with QUOTE_TIMEOUT and cut to the query budget inside a query
+DEFAULT_QUOTE_TIMEOUT = 10.0
 #This class gathers financial data using a NEWS api key and also rss feeds.
 class FinancialDataCollector:
     def __init__(self):
-        self.news_api_key = None
-        if "NEWS_API_KEY" in os.environ:
-            self.news_api_key = os.environ["NEWS_API_KEY"]
-        else:
-            try:
-                if hasattr(st, 'secrets') and "NEWS_API_KEY" in st.secrets:
-                    self.news_api_key = st.secrets["NEWS_API_KEY"]
-            except Exception:
-                pass
-            
-            if not self.news_api_key:
-                self.news_api_key = "d3e138fbb96d490ab6e203a441c32311"
-        self.last_request_time = 0 
-        self.min_request_interval = 1
+        self.news_api_key = get_setting("NEWS_API_KEY", "d3e138fbb96d490ab6e203a441c32311")
+        self.quota = NewsQuota()
+        self.http = HttpTransport()
         
         self.premium_rss_feeds = [
             # Wall Street Journal & Dow Jones
@@ -76,17 +66,31 @@ class FinancialDataCollector:
             'analyst', 'rating', 'price target', 'upgrade', 'downgrade'
         ]
         
-    def rate_limit(self):
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_request_interval:
-            time.sleep(self.min_request_interval - time_since_last)
-        self.last_request_time = time.time()
+    #Remaining NewsAPI budget across every process sharing the key
+    def quota_status(self) -> dict:
+        return self.quota.status()
+    
+    #A 429 pauses NewsAPI for every process; apiKeyExhausted closes it until the day rolls over
+    def _record_rejection(self, response):
+        try:
+            retry_after = float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            retry_after = None
+        try:
+            code = response.json().get('code', '')
+        except Exception:
+            code = ''
+        self.quota.record_rejection(retry_after, exhausted=code == 'apiKeyExhausted')
+        Notifier.warning(f"NewsAPI rejected the request ({code or response.status_code}), backing off")
     #Retrieves stock data from yahoo
     def get_stock_data(self, ticker: str) -> dict:
         try:
+            Metrics.count("quote_fetches")
             stock = yf.Ticker(ticker)
-            hist = stock.history(period="5d")
+            hist = stock.history(period="5d", timeout=QueryDeadline.timeout(float(get_setting("QUOTE_TIMEOUT", DEFAULT_QUOTE_TIMEOUT))))
+            #info takes no timeout, so it is not started once the budget is gone
+            if QueryDeadline.remaining() == 0:
+                raise QueryDeadline.DeadlineExceeded("no time left for the quote details")
             info = stock.info
             
             if not hist.empty:
@@ -119,10 +123,10 @@ class FinancialDataCollector:
                 }
             return {}
         except Exception as e:
-            st.warning(f"Could not fetch data for {ticker}: {e}")
+            Notifier.warning(f"Could not fetch data for {ticker}: {e}")
             return {}
     
-    def get_company_news_direct(self, ticker: str, company_name: str, days_back: int = 7, entity_extractor=None) -> list[dict]:
+    def get_company_news_direct(self, ticker: str, company_name: str, days_back: int = 7, entity_extractor=None) -> list[Article]:
         articles = []
         
         if entity_extractor:
@@ -132,7 +136,7 @@ class FinancialDataCollector:
                     search_terms = []
                 search_terms = [str(term).strip() for term in search_terms if term is not None and str(term).strip()]
             except Exception as e:
-                print(f"Error generating search terms: {e}")
+                Notifier.log(f"Error generating search terms: {e}")
                 search_terms = []
         else:
             search_terms = []
@@ -150,9 +154,10 @@ class FinancialDataCollector:
         
         if self.news_api_key:
             for term in search_terms[:3]:
+                if not self.quota.acquire():
+                    Notifier.log(f"NewsAPI quota unavailable, skipping news for {ticker or company_name}: {self.quota.status()}")
+                    break
                 try:
-                    self.rate_limit()
-                    
                     url = "https://newsapi.org/v2/everything"
                     params = {
                         'q': f'"{term}" AND (stock OR shares OR earnings OR revenue)',
@@ -163,27 +168,32 @@ class FinancialDataCollector:
                         'from': (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
                     }
                     
-                    response = requests.get(url, params=params, timeout=10)
+                    Metrics.count("newsapi_requests")
+                    with Metrics.span("newsapi_request", term=term):
+                        response = self.http.get('newsapi', url, params=params)
+                    if response.status_code == 429:
+                        self._record_rejection(response)
+                        break
                     if response.status_code == 200:
                         data = response.json()
                         for article in data.get('articles', []):
                             if self._is_quality_financial_article(article, ticker, company_name):
-                                articles.append({
-                                    'title': str(article.get('title', '') or ''),
-                                    'description': str(article.get('description', '') or ''),
-                                    'content': str(article.get('content', '') or article.get('description', '') or ''),
-                                    'url': str(article.get('url', '') or ''),
-                                    'publishedAt': str(article.get('publishedAt', '') or ''),
-                                    'source': str(article.get('source', {}).get('name', 'News API') or 'News API'),
-                                    'relevance_score': self._calculate_relevance_score(article, ticker, company_name)
-                                })
+                                articles.append(Article(
+                                    title=article.get('title'),
+                                    description=article.get('description'),
+                                    content=article.get('content'),
+                                    url=article.get('url'),
+                                    published_at=article.get('publishedAt'),
+                                    source=(article.get('source') or {}).get('name') or 'News API',
+                                    relevance_score=self._calculate_relevance_score(article, ticker, company_name)
+                                ))
                 except Exception as e:
-                    print(f"News API error for {term}: {e}")
+                    Notifier.log(f"News API error for {term}: {e}")
                     continue
         
         return articles
     
-    def get_sector_news(self, sector: str, days_back: int = 7) -> list[dict]:
+    def get_sector_news(self, sector: str, days_back: int = 7) -> list[Article]:
         articles = []
         
         sector_keywords = {
@@ -198,29 +208,30 @@ class FinancialDataCollector:
         
         for feed_url in self.premium_rss_feeds[:5]:
             try:
-                feed = feedparser.parse(feed_url)
+                Metrics.count("feed_fetches")
+                with Metrics.span("feed_fetch", url=feed_url):
+                    feed = self.http.fetch_feed(feed_url)
+                source = getattr(feed.feed, 'title', '') or 'RSS Feed'
                 for entry in feed.entries[:10]:
-                    title = str(getattr(entry, 'title', '') or '')
-                    summary = str(getattr(entry, 'summary', '') or '')
-                    content = f"{title} {summary}"
+                    article = Article(
+                        title=getattr(entry, 'title', ''),
+                        content=getattr(entry, 'summary', ''),
+                        url=getattr(entry, 'link', ''),
+                        published_at=getattr(entry, 'published', ''),
+                        source=source
+                    )
+                    content = article.text_lower
                     
-                    if any(keyword.lower() in content.lower() for keyword in keywords):
-                        articles.append({
-                            'title': title,
-                            'description': summary,
-                            'content': summary,
-                            'url': str(getattr(entry, 'link', '') or ''),
-                            'publishedAt': str(getattr(entry, 'published', '') or ''),
-                            'source': str(getattr(feed.feed, 'title', 'RSS Feed') or 'RSS Feed'),
-                            'relevance_score': self._calculate_sector_relevance(content, keywords)
-                        })
+                    if any(keyword.lower() in content for keyword in keywords):
+                        article.relevance_score = self._calculate_sector_relevance(content, keywords)
+                        articles.append(article)
             except Exception as e:
                 continue
         
-        articles.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
+        articles.sort(key=lambda x: x.relevance_score, reverse=True)
         return articles[:15]
     #Finding relevant articles
-    def search_news(self, query: str, days_back: int = 7, query_variants: Optional[list] = None, entity_extractor=None) -> list[dict]:
+    def search_news(self, query: str, days_back: int = 7, query_variants: Optional[list] = None, entity_extractor=None) -> list[Article]:
         all_articles = []
         
         if entity_extractor:
@@ -239,7 +250,7 @@ class FinancialDataCollector:
                     if len(company_articles) < 3:
                         company_sector = "Technology"
                         try:
-                            import yfinance as yf
+                            Metrics.count("quote_fetches")
                             stock = yf.Ticker(company.get('ticker', ''))
                             company_sector = stock.info.get('sector', 'Technology')
                         except:
@@ -257,7 +268,7 @@ class FinancialDataCollector:
             all_articles.extend(self._search_rss_feeds(query, days_back))
         
         unique_articles = self._deduplicate_articles(all_articles)
-        return sorted(unique_articles, key=lambda x: x.get('relevance_score', 0), reverse=True)[:20]
+        return sorted(unique_articles, key=lambda x: x.relevance_score, reverse=True)[:20]
     
     def _is_quality_financial_article(self, article: dict, ticker: str, company_name: str) -> bool:
         title = str(article.get('title', '') or '').lower()
@@ -310,41 +321,41 @@ class FinancialDataCollector:
         
         return min((keyword_matches * 0.3 + financial_matches * 0.1), 1.0)
     
-    def _search_rss_feeds(self, query: str, days_back: int) -> list[dict]:
+    def _search_rss_feeds(self, query: str, days_back: int) -> list[Article]:
         articles = []
         query_lower = query.lower()
         
         for feed_url in self.premium_rss_feeds[:3]:
             try:
-                feed = feedparser.parse(feed_url)
+                Metrics.count("feed_fetches")
+                with Metrics.span("feed_fetch", url=feed_url):
+                    feed = self.http.fetch_feed(feed_url)
+                source = getattr(feed.feed, 'title', '') or 'RSS Feed'
                 for entry in feed.entries[:15]:
-                    title = str(getattr(entry, 'title', '') or '')
-                    summary = str(getattr(entry, 'summary', '') or '')
-                    content = f"{title} {summary}".lower()
+                    article = Article(
+                        title=getattr(entry, 'title', ''),
+                        content=getattr(entry, 'summary', ''),
+                        url=getattr(entry, 'link', ''),
+                        published_at=getattr(entry, 'published', ''),
+                        source=source,
+                        relevance_score=0.5
+                    )
                     
-                    if any(word in content for word in query_lower.split()):
-                        articles.append({
-                            'title': title,
-                            'description': summary,
-                            'content': summary,
-                            'url': str(getattr(entry, 'link', '') or ''),
-                            'publishedAt': str(getattr(entry, 'published', '') or ''),
-                            'source': str(getattr(feed.feed, 'title', 'RSS Feed') or 'RSS Feed'),
-                            'relevance_score': 0.5
-                        })
+                    if any(word in article.text_lower for word in query_lower.split()):
+                        articles.append(article)
             except:
                 continue
         
         return articles
     
-    def _deduplicate_articles(self, articles: list[dict]) -> list[dict]:
+    def _deduplicate_articles(self, articles: list[Article]) -> list[Article]:
         seen_urls = set()
         seen_titles = set()
         unique_articles = []
         
         for article in articles:
-            url = str(article.get('url', '') or '')
-            title = str(article.get('title', '') or '').lower()
+            url = article.url
+            title = article.title.lower()
             
             if url and url in seen_urls:
                 continue
@@ -0,0 +1,345 @@
+import argparse
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from itertools import combinations
+from LazyLoader import lazy_import
+from KG import CO_MENTION_HALF_LIFE_DAYS, SECTOR_MEMBER_REMOVAL, FinancialKnowledgeGraph
+from Article import Article
+from Article import parse_published
+import Notifier
+import Metrics
+
+np = lazy_import("numpy")
+#Ids written before schema 3 were salted hash() values, different in every process
+LEGACY_ARTICLE_ID = r"article_-?[0-9]+"
+
+#Cleanup statements for _run_chunked: each handles at most $limit nodes, committing every $rows of them.
+#Companies leave their sector rollups before they are deleted, so the rollups keep matching their members
+CLEANUP_JOBS = {
+    'incomplete_companies': """
+        MATCH (c:Company) WHERE c.name IS NULL OR c.name = ''
+        WITH c LIMIT $limit
+        CALL { WITH c """ + SECTOR_MEMBER_REMOVAL + """ DETACH DELETE c } IN TRANSACTIONS OF $rows ROWS
+    """,
+    'duplicate_companies': """
+        MATCH (c:Company)
+        WITH c.ticker AS ticker, collect(c) AS companies WHERE size(companies) > 1
+        UNWIND companies[1..] AS c
+        WITH c LIMIT $limit
+        CALL { WITH c """ + SECTOR_MEMBER_REMOVAL + """ DETACH DELETE c } IN TRANSACTIONS OF $rows ROWS
+    """,
+    'orphan_stock_data': """
+        MATCH (s:StockData) WHERE NOT (s)<-[:HAS_PERFORMANCE]-()
+        WITH s LIMIT $limit
+        CALL { WITH s DELETE s } IN TRANSACTIONS OF $rows ROWS
+    """
+}
+
+#Periodic jobs that precompute graph properties so queries only read them, and cleanup that can run next to queries
+#Writes go in small transactions with pauses between batches: duty_cycle is the share of wall time spent writing
+class GraphMaintenance:
+    def __init__(self, knowledge_graph: FinancialKnowledgeGraph = None, batch_size: int = 1000,
+                 transaction_rows: int = 100, duty_cycle: float = 0.5, stop_event: threading.Event = None):
+        self.knowledge_graph = knowledge_graph or FinancialKnowledgeGraph()
+        self.batch_size = batch_size
+        self.transaction_rows = transaction_rows
+        self.duty_cycle = min(max(duty_cycle, 0.01), 1.0)
+        self.stop_event = stop_event or threading.Event()
+        self.progress = {}
+
+    #A batch that took t seconds is followed by a pause of t * (1 - duty_cycle) / duty_cycle, so the pause grows
+    #when the database is busy; a stop request ends the wait early
+    def _throttle(self, elapsed: float):
+        self.stop_event.wait(elapsed * (1 - self.duty_cycle) / self.duty_cycle)
+
+    def _report(self, job: str, rows: int, started: float):
+        progress = self.progress.get(job)
+        if progress is None or progress['started'] != started:
+            progress = self.progress[job] = {'rows': 0, 'batches': 0, 'started': started}
+        progress['rows'] += rows
+        progress['batches'] += 1
+        progress['seconds'] = round(time.time() - progress['started'], 2)
+        Metrics.count("graph_maintenance_rows", rows)
+        Notifier.log(f"Graph maintenance {job}: {progress['rows']} rows in {progress['batches']} batches")
+
+    #Reruns a bounded delete until it finds nothing left. Every run is its own auto-commit transaction and
+    #IN TRANSACTIONS splits it further, so no lock is held for long; interrupting simply leaves the rest for next time
+    def _run_chunked(self, job: str, query: str, counter: str = "nodes_deleted") -> int:
+        started = time.time()
+        removed = 0
+        while not self.stop_event.is_set():
+            batch_started = time.perf_counter()
+            with self.knowledge_graph._session() as session:
+                counters = session.run(query, {'limit': self.batch_size, 'rows': self.transaction_rows}).consume().counters
+            deleted = getattr(counters, counter)
+            if not deleted:
+                break
+            removed += deleted
+            self._report(job, deleted, started)
+            self._throttle(time.perf_counter() - batch_started)
+        return removed
+
+    #Incomplete and duplicate companies and StockData nodes nobody points at
+    def cleanup(self) -> dict:
+        started = time.time()
+        if not self.knowledge_graph.driver:
+            return {"removed": 0, "error": "Neo4j not connected"}
+        summary = {}
+        with Metrics.span("graph_cleanup"):
+            for job, query in CLEANUP_JOBS.items():
+                summary[f"{job}_removed"] = self._run_chunked(job, query)
+        summary['removed'] = sum(summary.values())
+        summary['completed'] = not self.stop_event.is_set()
+        summary['seconds'] = round(time.time() - started, 2)
+        Notifier.info(f"Graph cleanup complete: {summary}")
+        return summary
+
+    #Retention evictions, batch_size ids per statement
+    def delete_articles(self, article_ids: list[str]) -> int:
+        started = time.time()
+        deleted = 0
+        for start in range(0, len(article_ids), self.batch_size):
+            if self.stop_event.is_set():
+                break
+            batch_started = time.perf_counter()
+            with self.knowledge_graph._session() as session:
+                counters = session.run("""
+                    UNWIND $ids AS article_id
+                    MATCH (a:NewsArticle {id: article_id})
+                    CALL { WITH a DETACH DELETE a } IN TRANSACTIONS OF $rows ROWS
+                """, {'ids': article_ids[start:start + self.batch_size], 'rows': self.transaction_rows}).consume().counters
+            deleted += counters.nodes_deleted
+            self._report('delete_articles', counters.nodes_deleted, started)
+            self._throttle(time.perf_counter() - batch_started)
+        return deleted
+
+    def _write_batches(self, session, query: str, rows: list[dict], **params):
+        for start in range(0, len(rows), self.batch_size):
+            session.run(query, dict(params, rows=rows[start:start + self.batch_size]))
+
+    #Rebuilds every CO_MENTIONED edge from the stored articles, for graphs that predate incremental maintenance.
+    #Old edges go in chunks, then each page of articles merges its pairs and is throttled like the cleanup jobs;
+    #a stopped rebuild leaves a partial graph and reports completed False, rerunning it starts over
+    def rebuild_co_mentions(self) -> dict:
+        started = time.time()
+        kg = self.knowledge_graph
+        if not kg.driver:
+            return {"error": "Neo4j not connected"}
+
+        articles = 0
+        edges = 0
+        with Metrics.span("co_mention_rebuild"):
+            removed = self._run_chunked("co_mention_reset", """
+                MATCH ()-[r:CO_MENTIONED]->()
+                WITH r LIMIT $limit
+                CALL { WITH r DELETE r } IN TRANSACTIONS OF $rows ROWS
+            """, counter="relationships_deleted")
+            pages = kg.iter_articles(self.batch_size) if not self.stop_event.is_set() else ()
+            for page in pages:
+                batch_started = time.perf_counter()
+                weights = defaultdict(float)
+                counts = defaultdict(int)
+                for article in page:
+                    tickers = sorted({t for t in article.get('tickers', []) if t})
+                    if len(tickers) < 2:
+                        continue
+                    increment = kg.co_mention_increment(article.get('publishedAt'), started)
+                    for pair in combinations(tickers, 2):
+                        weights[pair] += increment
+                        counts[pair] += 1
+
+                pairs = [{'a': a, 'b': b, 'weight': weight, 'articles': counts[(a, b)]} for (a, b), weight in weights.items()]
+                with kg._session() as session:
+                    self._write_batches(session, """
+                        UNWIND $rows AS pair
+                        MATCH (c1:Company {ticker: pair.a}), (c2:Company {ticker: pair.b})
+                        MERGE (c1)-[r:CO_MENTIONED]->(c2)
+                        ON CREATE SET r.weight = 0.0, r.updatedAt = $now, r.articles = 0
+                        SET r.weight = r.weight * 0.5 ^ (($now - r.updatedAt) / $half_life) + pair.weight,
+                            r.updatedAt = $now,
+                            r.articles = r.articles + pair.articles
+                    """, pairs, now=started, half_life=CO_MENTION_HALF_LIFE_DAYS * 86400)
+                    self._write_batches(session, """
+                        UNWIND $rows AS article_id
+                        MATCH (a:NewsArticle {id: article_id})
+                        SET a.coMentionedAt = $now
+                    """, [article['id'] for article in page], now=started)
+                articles += len(page)
+                edges += len(pairs)
+                self._report('rebuild_co_mentions', len(page), started)
+                self._throttle(time.perf_counter() - batch_started)
+                if self.stop_event.is_set():
+                    break
+
+        summary = {"articles": articles, "edge_updates": edges, "edges_removed": removed,
+                   "completed": not self.stop_event.is_set(), "seconds": round(time.time() - started, 2)}
+        Notifier.info(f"Co-mention rebuild complete: {summary}")
+        return summary
+
+    #One-off upgrade of article nodes written before schema 3: content-hash ids, datetime publishedAt and one node
+    #per article. Each batch commits on its own and migrated nodes stop matching, so an interrupted run just resumes
+    def migrate_articles(self) -> dict:
+        started = time.time()
+        kg = self.knowledge_graph
+        if not kg.driver:
+            return {"error": "Neo4j not connected"}
+
+        migrated = 0
+        #A new id can be all digits too; those nodes are done and must not be picked up again
+        skip = []
+        with Metrics.span("article_migration"):
+            while not self.stop_event.is_set():
+                batch_started = time.perf_counter()
+                with kg._session() as session:
+                    page = [record.data() for record in session.run("""
+                        MATCH (a:NewsArticle)
+                        WHERE a.id =~ $legacy AND NOT elementId(a) IN $skip
+                        RETURN elementId(a) AS node, a.title AS title, a.url AS url, a.publishedAt AS publishedAt
+                        LIMIT $limit
+                    """, {'legacy': LEGACY_ARTICLE_ID, 'skip': skip, 'limit': self.batch_size})]
+                    if not page:
+                        break
+                    rows = [{
+                        'node': row['node'],
+                        'id': kg.article_id(Article(row['title'], url=row['url'])),
+                        'published': parse_published(row['publishedAt'])
+                    } for row in page]
+                    session.run("""
+                        UNWIND $rows AS row
+                        MATCH (a:NewsArticle) WHERE elementId(a) = row.node
+                        SET a.id = row.id, a.publishedAt = row.published
+                    """, {'rows': rows})
+                skip += [row['node'] for row in rows if re.fullmatch(LEGACY_ARTICLE_ID, row['id'])]
+                migrated += len(rows)
+                self._report('migrate_articles', len(rows), started)
+                self._throttle(time.perf_counter() - batch_started)
+
+            merged = self._merge_duplicate_articles()
+
+        if self.stop_event.is_set():
+            return {"articles": migrated, "duplicates_merged": merged, "completed": False}
+        kg.initialize_graph(force=True)
+        summary = {"articles": migrated, "duplicates_merged": merged, "seconds": round(time.time() - started, 2)}
+        Notifier.info(f"Article migration complete: {summary}")
+        return summary
+
+    #The same article stored under several old ids collapses into one node that keeps every MENTIONS edge
+    #and the markers that stop its co-mentions and sentiment from being counted again
+    def _merge_duplicate_articles(self) -> int:
+        merged = 0
+        while not self.stop_event.is_set():
+            batch_started = time.perf_counter()
+            with self.knowledge_graph._session() as session:
+                ids = [record['id'] for record in session.run("""
+                    MATCH (a:NewsArticle)
+                    WITH a.id AS id, count(*) AS copies WHERE copies > 1
+                    RETURN id LIMIT $limit
+                """, {'limit': self.batch_size})]
+                if not ids:
+                    return merged
+                record = session.run("""
+                    UNWIND $ids AS id
+                    MATCH (a:NewsArticle {id: id})
+                    WITH id, collect(a) AS nodes
+                    WITH head(nodes) AS keep, tail(nodes) AS duplicates
+                    UNWIND duplicates AS duplicate
+                    SET keep.coMentionedAt = coalesce(keep.coMentionedAt, duplicate.coMentionedAt),
+                        keep.sentimentRolledAt = coalesce(keep.sentimentRolledAt, duplicate.sentimentRolledAt)
+                    WITH keep, duplicate
+                    OPTIONAL MATCH (duplicate)-[:MENTIONS]->(c:Company)
+                    FOREACH (company IN CASE WHEN c IS NULL THEN [] ELSE [c] END | MERGE (keep)-[:MENTIONS]->(company))
+                    WITH DISTINCT duplicate
+                    DETACH DELETE duplicate
+                    RETURN count(*) AS removed
+                """, {'ids': ids}).single()
+            merged += record['removed'] if record else 0
+            self._throttle(time.perf_counter() - batch_started)
+        return merged
+
+    #Weighted PageRank over the decayed co-mention graph, stored as Company.pagerank
+    def compute_pagerank(self, damping: float = 0.85, max_iterations: int = 100, tolerance: float = 1e-6) -> dict:
+        started = time.time()
+        kg = self.knowledge_graph
+        if not kg.driver:
+            return {"error": "Neo4j not connected"}
+
+        with Metrics.span("pagerank"):
+            with kg._session() as session:
+                tickers = [record['ticker'] for record in session.run("MATCH (c:Company) RETURN c.ticker AS ticker")]
+                edges = [
+                    (record['a'], record['b'], record['weight'])
+                    for record in session.run("""
+                        MATCH (c1:Company)-[r:CO_MENTIONED]->(c2:Company)
+                        RETURN c1.ticker AS a, c2.ticker AS b, r.weight * 0.5 ^ (($now - r.updatedAt) / $half_life) AS weight
+                    """, {'now': started, 'half_life': CO_MENTION_HALF_LIFE_DAYS * 86400})
+                ]
+            if not tickers:
+                return {"companies": 0, "edges": 0}
+
+            scores, iterations = self._pagerank(tickers, edges, damping, max_iterations, tolerance)
+            rows = [{'ticker': ticker, 'pagerank': float(score)} for ticker, score in zip(tickers, scores)]
+            with kg._session() as session:
+                self._write_batches(session, """
+                    UNWIND $rows AS row
+                    MATCH (c:Company {ticker: row.ticker})
+                    SET c.pagerank = row.pagerank, c.pagerankAt = $now
+                """, rows, now=started)
+
+        summary = {"companies": len(tickers), "edges": len(edges), "iterations": iterations,
+                   "seconds": round(time.time() - started, 2)}
+        Notifier.info(f"PageRank complete: {summary}")
+        return summary
+
+    #Power iteration on the undirected weighted graph, isolated companies spread their rank uniformly
+    def _pagerank(self, tickers: list[str], edges: list[tuple], damping: float, max_iterations: int, tolerance: float):
+        index = {ticker: i for i, ticker in enumerate(tickers)}
+        size = len(tickers)
+        sources, targets, weights = [], [], []
+        for a, b, weight in edges:
+            if a in index and b in index and weight and weight > 0:
+                sources += [index[a], index[b]]
+                targets += [index[b], index[a]]
+                weights += [weight, weight]
+        sources = np.array(sources, dtype=np.int64)
+        targets = np.array(targets, dtype=np.int64)
+        weights = np.array(weights, dtype=np.float64)
+
+        out_weight = np.bincount(sources, weights=weights, minlength=size)
+        dangling = out_weight == 0
+        transfer = weights / np.where(out_weight[sources] == 0, 1, out_weight[sources]) if len(weights) else weights
+        scores = np.full(size, 1.0 / size)
+        iterations = 0
+        for iterations in range(1, max_iterations + 1):
+            spread = np.bincount(targets, weights=scores[sources] * transfer, minlength=size)
+            updated = (1 - damping) / size + damping * (spread + scores[dangling].sum() / size)
+            converged = np.abs(updated - scores).sum() < tolerance
+            scores = updated
+            if converged:
+                break
+        return scores, iterations
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute graph properties read at query time")
+    parser.add_argument("job", choices=["pagerank", "co-mentions", "migrate-articles", "cleanup", "all"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--transaction-rows", type=int, default=100, help="nodes deleted per transaction")
+    parser.add_argument("--duty-cycle", type=float, default=0.5, help="share of wall time spent writing, lower is gentler")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    maintenance = GraphMaintenance(batch_size=args.batch_size, transaction_rows=args.transaction_rows,
+                                   duty_cycle=args.duty_cycle)
+    if args.job in ("cleanup", "all"):
+        maintenance.cleanup()
+    if args.job == "migrate-articles":
+        maintenance.migrate_articles()
+    if args.job in ("co-mentions", "all"):
+        maintenance.rebuild_co_mentions()
+    if args.job in ("pagerank", "all"):
+        maintenance.compute_pagerank()
+
+if __name__ == "__main__":
+    main()
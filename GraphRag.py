@@ -1,20 +1,111 @@
-from openai import OpenAI
+import time
+from functools import cached_property
 from FinDataCollector import FinancialDataCollector
 from EntityExtractor import EntityExtractor
 from KG import FinancialKnowledgeGraph
-from VectorDB import VectorDatabase
+from VectorDB import VectorStore, open_vector_db
+from IngestionWorker import QUOTE_MAX_AGE, WatchlistState
+from ContextPacker import ContextPacker
+from QueryCache import SemanticQueryCache
+from LLMClient import ResilientOpenAI, create_client
+from QueryDeadline import Deadline
+from WriteBehind import WriteBehindQueue
+import Metrics
 
 #This class is resposible for understanding the query, gathering information, and synthesizing an analysis
+#Components are created on first use so the system is cheap to construct
 class GraphRAGSystem:
-    def __init__(self, openai_key: str):
-        self.data_collector = FinancialDataCollector()
-        self.entity_extractor = EntityExtractor(openai_key)
-        self.knowledge_graph = FinancialKnowledgeGraph()
-        self.vector_db = VectorDatabase(openai_key)
-        self.openai_client = OpenAI(api_key=openai_key)
-        self.knowledge_graph.initialize_graph()
+    def __init__(self, openai_key: str, query_cache: bool = True):
+        self.openai_key = openai_key
+        self.query_cache = SemanticQueryCache() if query_cache else None
+
+    @cached_property
+    def data_collector(self) -> FinancialDataCollector:
+        return FinancialDataCollector()
+
+    @cached_property
+    def entity_extractor(self) -> EntityExtractor:
+        return EntityExtractor(self.openai_key)
+
+    @cached_property
+    def knowledge_graph(self) -> FinancialKnowledgeGraph:
+        return FinancialKnowledgeGraph()
+
+    @cached_property
+    def vector_db(self) -> VectorStore:
+        return open_vector_db(self.openai_key)
+
+    #Graph and vector writes from queries land in the background, the query reads them from its overlay
+    @cached_property
+    def write_behind(self) -> WriteBehindQueue:
+        return WriteBehindQueue(self.knowledge_graph, self.vector_db)
+
+    @cached_property
+    def watchlist_state(self) -> WatchlistState:
+        return WatchlistState()
+
+    @cached_property
+    def context_packer(self) -> ContextPacker:
+        return ContextPacker()
+
+    @cached_property
+    def openai_client(self):
+        return create_client(self.openai_key)
+
+    @cached_property
+    def llm(self) -> ResilientOpenAI:
+        return ResilientOpenAI(self.openai_client)
+
+    #Lands queued writes and releases connections, touching only what this instance actually opened
+    def close(self, timeout: float = 30.0):
+        if 'write_behind' in self.__dict__:
+            self.write_behind.flush(timeout)
+            self.write_behind.close()
+        if 'knowledge_graph' in self.__dict__:
+            self.knowledge_graph.close()
     
-    def process_user_query(self, user_query: str) -> dict:
+    #Runs the pipeline with per-stage spans and upstream call counters attached to the result
+    #deadline_seconds bounds the whole query (QUERY_DEADLINE_SECONDS by default), late sources are skipped
+    def process_user_query(self, user_query: str, deadline_seconds: float = None) -> dict:
+        metrics = Metrics.QueryMetrics()
+        deadline = Deadline(deadline_seconds)
+        with Metrics.activate(metrics), deadline.activate():
+            with metrics.span("process_user_query"):
+                result = None
+                query_embedding = None
+                if self.query_cache is not None:
+                    with metrics.span("query_cache"):
+                        query_embedding = self.vector_db.get_embeddings([user_query])[0]
+                        result = self.query_cache.lookup(user_query, query_embedding, self._prewarmed_price)
+                    if result is not None:
+                        Metrics.count("query_cache_hits")
+                
+                if result is None:
+                    try:
+                        result = self._run_query(user_query, metrics, query_embedding, deadline)
+                    finally:
+                        metrics.stage(None)
+                    #Partial answers are not cached, the next asker may have time for every source
+                    if (self.query_cache is not None and not result['partial']
+                            and not result['response'].startswith("Error generating response")):
+                        self.query_cache.store(user_query, query_embedding, result)
+        
+        result = dict(result)
+        result['timings'] = metrics.timings()
+        result['spans'] = metrics.to_otel_spans()
+        result['trace_id'] = metrics.trace_id
+        result['cache_stats'] = dict(result['cache_stats'], upstream_calls=dict(metrics.counters))
+        if self.query_cache is not None:
+            result['cache_stats']['query_cache'] = self.query_cache.stats()
+        return result
+
+    def _prewarmed_price(self, ticker: str):
+        return self.watchlist_state.get_quote(ticker).get('price')
+
+    def _run_query(self, user_query: str, metrics: Metrics.QueryMetrics, query_embedding: list[float] = None,
+                   deadline: Deadline = None) -> dict:
+        deadline = deadline or Deadline(0)
+        metrics.stage('extraction')
         
         mentioned_tickers = self.entity_extractor.extract_tickers(user_query)
         mentioned_sectors = self.entity_extractor.extract_sectors(user_query)
@@ -22,6 +113,7 @@ class GraphRAGSystem:
         extraction_details = self.entity_extractor.get_extraction_details(user_query)
         
         sector_tickers = []
+        sector_members = {}
         has_specific_companies = len(mentioned_tickers) > 0
         has_explicit_sector_queries = any(
             sq.get('query_type') == 'broad_sector' 
@@ -34,15 +126,39 @@ class GraphRAGSystem:
                     sector_name = sector_query['sector']
                     tickers = self.entity_extractor.get_sector_tickers(sector_name)
                     sector_tickers.extend(tickers)
+                    sector_members[self.entity_extractor.universe.canonical_sector(sector_name)] = tickers
         
         all_tickers = list(set(mentioned_tickers + sector_tickers))
+        metrics.stage('quotes')
+        
+        #A sector rollup stands in for live quotes of members whose own quote in it is fresh; named companies are always quoted
+        sector_performance = {}
+        if sector_members:
+            sector_performance = deadline.call('quotes', self.knowledge_graph.sector_performance, list(sector_members),
+                                               source="sector rollups", default={})
+        now = time.time()
+        covered = {
+            ticker
+            for sector, rollup in sector_performance.items()
+            for ticker in sector_members.get(sector, [])
+            if now - rollup.get('memberUpdatedAt', {}).get(ticker, 0.0) <= QUOTE_MAX_AGE
+        } - set(mentioned_tickers)
         
         stock_data = {}
+        missing_quotes = []
         for ticker in all_tickers:
-            data = self.data_collector.get_stock_data(ticker)
+            data = self.watchlist_state.get_quote(ticker)
             if data:
                 stock_data[ticker] = data
-                self.knowledge_graph.add_company(data)
+            elif ticker not in covered:
+                missing_quotes.append(ticker)
+        
+        fetched_quotes = deadline.map('quotes', self.data_collector.get_stock_data, missing_quotes)
+        for ticker in missing_quotes:
+            if fetched_quotes.get(ticker):
+                stock_data[ticker] = fetched_quotes[ticker]
+                self.write_behind.add_company(fetched_quotes[ticker])
+        metrics.stage('news')
         
         search_queries = []
         
@@ -86,22 +202,34 @@ class GraphRAGSystem:
         all_articles = []
         all_article_tickers = []
         
-        for query in search_queries[:6]:  
-            articles = self.data_collector.search_news(query, days_back=21, query_variants=list(query_variants), entity_extractor=self.entity_extractor)
-            for article in articles:
-                article_tickers = self.entity_extractor.extract_tickers(
-                    f"{article.get('title', '')} {article.get('content', '')}"
-                )
+        #Tickers kept warm by the ingestion worker are already in the vector database
+        prewarmed = bool(all_tickers) and all(self.watchlist_state.has_fresh_news(t) for t in all_tickers)
+        live_search_queries = [] if prewarmed else search_queries[:6]
+        
+        search_results = deadline.map(
+            'news',
+            lambda query: self.data_collector.search_news(query, days_back=21, query_variants=list(query_variants), entity_extractor=self.entity_extractor),
+            live_search_queries
+        )
+        untagged = 0
+        for query in live_search_queries:
+            for article in search_results.get(query, []):
+                if deadline.expired():
+                    untagged += 1
+                    continue
+                article_tickers = self.entity_extractor.extract_tickers(article.text)
                 all_articles.append(article)
                 all_article_tickers.append(article_tickers)
-
-                self.knowledge_graph.add_news_article(article, article_tickers)
+        if untagged:
+            deadline.skip('tagging', f"{untagged} articles")
         
 
+        metrics.stage('tagging')
+
         if self.entity_extractor is not None:
             relevant_articles = []
             for article in all_articles:
-                entities = self.entity_extractor.extract_entities(article['title'] + ' ' + article['content'])
+                entities = self.entity_extractor.extract_entities(article.text)
                 found = False
                 for variant in query_variants:
                     if variant in [c['name'] for c in entities.get('companies', [])]:
@@ -116,25 +244,16 @@ class GraphRAGSystem:
         else:
             articles = all_articles
 
-        seen = set()
-        unique_articles = []
-        for article in articles:
-            if article['url'] not in seen:
-                unique_articles.append(article)
-                seen.add(article['url'])
-
-        unique_articles_db = []
-        unique_tickers_db = []
-        seen_urls_db = set()
-        for article, tickers in zip(all_articles, all_article_tickers):
-            url = article.get('url')
-            if url and url not in seen_urls_db:
-                unique_articles_db.append(article)
-                unique_tickers_db.append(tickers)
-                seen_urls_db.add(url)
-
-        if unique_articles_db:
-            self.vector_db.add_articles(unique_articles_db, unique_tickers_db)
+        metrics.stage('write_behind')
+        
+        #Graph nodes, embeddings and vector records are written by the drain thread, not on the query path
+        self.write_behind.add_articles(all_articles, all_article_tickers)
+        
+        metrics.stage('vector_search')
+        
+        def search(query: str, n_results: int = 5, **kwargs) -> list[dict]:
+            results = deadline.call('vector_search', self.vector_db.search, query, default=[], n_results=n_results, **kwargs)
+            return self.write_behind.merge_search(query, results, n_results)
         
         is_sector_query = bool(extraction_details.get('sector_queries'))
         
@@ -151,11 +270,11 @@ class GraphRAGSystem:
             }
             
             if sector_name in sector_search_queries:
-                relevant_articles = self.vector_db.search(sector_search_queries[sector_name], n_results=15)
+                relevant_articles = search(sector_search_queries[sector_name], n_results=15)
             else:
-                relevant_articles = self.vector_db.search(user_query, n_results=15)
+                relevant_articles = search(user_query, n_results=15, query_embedding=query_embedding)
         else:
-            relevant_articles = self.vector_db.search(user_query, n_results=15)
+            relevant_articles = search(user_query, n_results=15, query_embedding=query_embedding)
         
         if is_sector_query:
             filtered_articles = []
@@ -212,23 +331,44 @@ class GraphRAGSystem:
             
             relevant_articles = filtered_articles
         
-        if not relevant_articles:
-            relevant_articles = self.vector_db.search(user_query, n_results=5)
+        if not relevant_articles and not deadline.expired():
+            relevant_articles = search(user_query, n_results=5, query_embedding=query_embedding)
+
+        metrics.stage('graph_context')
 
         graph_context = ""
+        company_contexts = deadline.map('graph_context', self.knowledge_graph.query_company_context, all_tickers)
         for ticker in all_tickers:
-            context = self.knowledge_graph.query_company_context(ticker)
+            context = company_contexts.get(ticker) or self.write_behind.company_context(ticker)
             if context:
                 graph_context += context + " "
         
+        if sector_performance:
+            graph_context += self.describe_sector_performance(sector_performance)
+        
+        related_companies = deadline.call('graph_context', self.knowledge_graph.expand_neighborhood, all_tickers,
+                                          source="related companies", default=[])
+        if related_companies:
+            graph_context += self.describe_related(related_companies)
+        
+        sentiment = deadline.call('graph_context', self.knowledge_graph.sentiment_rollups, all_tickers,
+                                  source="news sentiment", default={})
+        if sentiment:
+            graph_context += self.describe_sentiment(sentiment)
+        
+        metrics.stage('generation')
+        
         response = self.generate_response(
             user_query, 
             relevant_articles, 
             stock_data, 
             graph_context,
-            extraction_details  
+            extraction_details,
+            deadline=deadline.generation_deadline()
         )
         
+        metrics.stage(None)
+        
         return {
             'response': response,
             'mentioned_tickers': all_tickers,
@@ -237,25 +377,56 @@ class GraphRAGSystem:
             'stock_data': stock_data,
             'relevant_articles': relevant_articles,
             'graph_context': graph_context,
+            'related_companies': related_companies,
+            'sector_performance': sector_performance,
+            'sentiment': sentiment,
             'extraction_details': extraction_details, 
             'search_queries_used': search_queries[:6],
+            'prewarmed_news': prewarmed,
+            'skipped_sources': list(deadline.skipped),
+            'partial': bool(deadline.skipped),
             'cache_stats': self.entity_extractor.get_cache_stats()
         }
+    def describe_related(self, related_companies: list[dict]) -> str:
+        parts = []
+        for company in related_companies:
+            reasons = [f"{sector} peer" for sector in company['sectors']]
+            reasons += [f"often in the news with {ticker} (weight {weight})" for ticker, weight in company['co_mentions'].items()]
+            parts.append(f"{company['name']} ({company['ticker']}; {', '.join(reasons)})")
+        return "Related companies: " + "; ".join(parts) + ". "
+    
+    def describe_sector_performance(self, sector_performance: dict) -> str:
+        parts = []
+        for sector, rollup in sector_performance.items():
+            text = f"{sector} sector ({rollup['members']} companies): {rollup['advancers']} advancing, {rollup['decliners']} declining"
+            if rollup['weightedChange'] is not None:
+                text += f", market-cap-weighted change {rollup['weightedChange']:+.2f}%"
+            if rollup.get('leader'):
+                text += f", leader {rollup['leader']} ({rollup['leaderChange']:+.2f}%)"
+            if rollup.get('laggard'):
+                text += f", laggard {rollup['laggard']} ({rollup['laggardChange']:+.2f}%)"
+            parts.append(text)
+        return "Sector performance: " + "; ".join(parts) + ". "
+    
+    #Rollups are maintained at ingest, so this is formatting only
+    def describe_sentiment(self, sentiment: dict) -> str:
+        parts = [f"{ticker} {r['label']} ({r['score']:+.2f} over ~{r['weight']:g} recent articles)"
+                 for ticker, r in sentiment.get('companies', {}).items()]
+        parts += [f"{sector} sector {r['label']} ({r['score']:+.2f})" for sector, r in sentiment.get('sectors', {}).items()]
+        if not parts:
+            return ""
+        return "News sentiment: " + "; ".join(parts) + ". "
+    
     #Generate Analysis
-    def generate_response(self, query: str, articles: list[dict], stock_data: dict, graph_context: str, extraction_details: dict) -> str:
-        relevant_articles = [article for article in articles if article.get('similarity_score', 0) > 0.1][:5]
-        
-        article_context = "\n\n".join([
-            f"Article: {article['metadata']['title']}\n"
-            f"Source: {article['metadata']['source']}\n"
-            f"Content: {article['content'][:400]}..."
-            for article in relevant_articles
-        ])
+    def generate_response(self, query: str, articles: list[dict], stock_data: dict, graph_context: str, extraction_details: dict,
+                          deadline: float = None) -> str:
+        with Metrics.span("context_packing"):
+            packed = self.context_packer.pack(articles, stock_data, graph_context)
+        Metrics.count("context_tokens", packed['tokens'])
         
-        stock_context = "\n".join([
-            f"{data['companyName']} ({ticker}) is currently priced at ${data['price']}"
-            for ticker, data in stock_data.items()
-        ])
+        article_context = packed['article_context']
+        stock_context = packed['stock_context']
+        graph_context = packed['graph_context']
         
         extraction_context = ""
         if extraction_details.get('companies'):
@@ -339,7 +510,9 @@ class GraphRAGSystem:
             """
         
         try:
-            response = self.openai_client.chat.completions.create(
+            response = self.llm.chat(
+                "generation",
+                deadline=deadline,
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -0,0 +1,124 @@
+import threading
+from functools import cached_property
+from LazyLoader import lazy_import
+from Config import get_setting
+from QueryDeadline import DeadlineExceeded
+import QueryDeadline
+import Metrics
+
+requests = lazy_import("requests")
+feedparser = lazy_import("feedparser")
+
+#(connect, read) seconds per source, overridable with NEWSAPI_TIMEOUT / RSS_TIMEOUT
+SOURCE_TIMEOUTS = {
+    'newsapi': (3.05, 10.0),
+    'rss': (3.05, 8.0)
+}
+DEFAULT_TIMEOUT = (3.05, 10.0)
+USER_AGENT = "FinancialGraphRAG/1.0"
+
+#One pooled keep-alive session shared by every outbound HTTP call of a collector
+class HttpTransport:
+    def __init__(self, pool_hosts: int = 32, connections_per_host: int = 4, timeouts: dict = None):
+        self.pool_hosts = pool_hosts
+        self.connections_per_host = connections_per_host
+        self.timeouts = dict(SOURCE_TIMEOUTS, **(timeouts or {}))
+        self._feed_cache = {}
+        self._stats_lock = threading.Lock()
+        self._connections_seen = 0
+
+    #pool_block caps each host at connections_per_host sockets, extra callers wait for a free one
+    @cached_property
+    def session(self):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_hosts,
+            pool_maxsize=self.connections_per_host,
+            pool_block=True,
+            max_retries=0
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept-Encoding': 'gzip, deflate'
+        })
+        return session
+
+    def timeout_for(self, source: str):
+        configured = get_setting(f"{source.upper()}_TIMEOUT")
+        if configured:
+            return float(configured)
+        return self.timeouts.get(source, DEFAULT_TIMEOUT)
+
+    #Inside a query the timeouts shrink to what is left of its budget
+    def get(self, source: str, url: str, params: dict = None, headers: dict = None):
+        timeout = self.timeout_for(source)
+        left = QueryDeadline.remaining()
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded(f"no time left for {source} request")
+            timeout = tuple(min(t, left) for t in timeout) if isinstance(timeout, tuple) else min(timeout, left)
+        response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+        Metrics.count("http_requests")
+        self._record_connections()
+        return response
+
+    #Conditional GET: an unchanged feed answers 304 and the previous parse is reused
+    def fetch_feed(self, url: str):
+        cached = self._feed_cache.get(url)
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['modified']:
+                headers['If-Modified-Since'] = cached['modified']
+        response = self.get('rss', url, headers=headers)
+        if response.status_code == 304 and cached:
+            Metrics.count("feed_not_modified")
+            return cached['feed']
+        response.raise_for_status()
+        feed = feedparser.parse(response.content, response_headers=dict(response.headers))
+        self._feed_cache[url] = {
+            'etag': response.headers.get('ETag'),
+            'modified': response.headers.get('Last-Modified'),
+            'feed': feed
+        }
+        return feed
+
+    def _pools(self) -> list:
+        pools = []
+        for adapter in getattr(self.session, 'adapters', {}).values():
+            manager = getattr(adapter, 'poolmanager', None)
+            if manager is None:
+                continue
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is not None and pool not in pools:
+                    pools.append(pool)
+        return pools
+
+    #Counts sockets opened since the last request, so http_requests minus this is the reuse count
+    def _record_connections(self):
+        with self._stats_lock:
+            opened = sum(getattr(pool, 'num_connections', 0) for pool in self._pools())
+            if opened > self._connections_seen:
+                Metrics.count("http_connections_opened", opened - self._connections_seen)
+            self._connections_seen = opened
+
+    def stats(self) -> dict:
+        hosts = {}
+        for pool in self._pools():
+            requests_made = getattr(pool, 'num_requests', 0)
+            connections = getattr(pool, 'num_connections', 0)
+            hosts[f"{pool.scheme}://{pool.host}"] = {
+                'requests': requests_made,
+                'connections': connections,
+                'reused': max(0, requests_made - connections)
+            }
+        return hosts
+
+    def close(self):
+        if 'session' in self.__dict__:
+            self.session.close()
+            del self.__dict__['session']
@@ -0,0 +1,243 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+import Sentiment
+import Notifier
+import Metrics
+
+_DONE = object()
+
+#One step of a Pipeline: fn takes an item, or a list of up to batch_size items, and yields zero or more outputs
+@dataclass
+class Stage:
+    name: str
+    fn: Callable
+    workers: int = 1
+    batch_size: int = 1
+    batch_wait: float = 0.5
+
+@dataclass
+class StageStats:
+    workers: int
+    received: int = 0
+    emitted: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self) -> dict:
+        return {
+            'workers': self.workers,
+            'received': self.received,
+            'emitted': self.emitted,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'blocked_seconds': round(self.blocked_seconds, 3)
+        }
+
+#Runs stages concurrently over bounded queues, so a slow stage holds back its producers instead of buffering everything
+class Pipeline:
+    def __init__(self, stages: list[Stage], queue_size: int = 64, stop_event: threading.Event = None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stop_event = stop_event or threading.Event()
+
+    def _put(self, target: queue.Queue, item, stats: StageStats = None):
+        started = time.perf_counter()
+        target.put(item)
+        if stats is not None:
+            stats.add(blocked_seconds=time.perf_counter() - started)
+
+    #Collects up to batch_size items, returns (items, done) where done means the upstream finished
+    def _take(self, source: queue.Queue, stage: Stage):
+        item = source.get()
+        if item is _DONE:
+            return [], True
+        items = [item]
+        deadline = time.monotonic() + stage.batch_wait
+        while len(items) < stage.batch_size:
+            try:
+                item = source.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _worker(self, stage: Stage, source: queue.Queue, target: queue.Queue, stats: StageStats, remaining: list, lock):
+        done = False
+        while not done:
+            items, done = self._take(source, stage)
+            if items:
+                stats.add(received=len(items))
+                started = time.perf_counter()
+                outputs = []
+                try:
+                    with Metrics.span(f"pipeline_{stage.name}", items=len(items)):
+                        result = stage.fn(items if stage.batch_size > 1 else items[0])
+                        outputs = list(result) if result is not None else []
+                except Exception as e:
+                    stats.add(errors=1)
+                    Notifier.log(f"Pipeline stage {stage.name} failed: {type(e).__name__}: {e}")
+                stats.add(busy_seconds=time.perf_counter() - started)
+                for output in outputs:
+                    self._put(target, output, stats)
+                stats.add(emitted=len(outputs))
+        #Siblings still waiting on the queue need to see the end marker too
+        source.put(_DONE)
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            target.put(_DONE)
+
+    def _feed(self, source: Iterable, target: queue.Queue):
+        try:
+            for item in source:
+                if self.stop_event.is_set():
+                    break
+                target.put(item)
+        except Exception as e:
+            Notifier.log(f"Pipeline source failed: {type(e).__name__}: {e}")
+        finally:
+            target.put(_DONE)
+
+    def run(self, source: Iterable, sink: Callable = None) -> dict:
+        started = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        stats = {stage.name: StageStats(workers=stage.workers) for stage in self.stages}
+        threads = [threading.Thread(target=Metrics.bind(self._feed), args=(source, queues[0]), name="pipeline-source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for n in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=Metrics.bind(self._worker),
+                    args=(stage, queues[index], queues[index + 1], stats[stage.name], remaining, lock),
+                    name=f"pipeline-{stage.name}-{n}",
+                    daemon=True
+                ))
+        for thread in threads:
+            thread.start()
+
+        results = 0
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            results += 1
+            if sink is not None:
+                sink(item)
+        for thread in threads:
+            thread.join()
+
+        return {
+            'results': results,
+            'seconds': round(time.perf_counter() - started, 3),
+            'stages': {name: stage_stats.as_dict() for name, stage_stats in stats.items()}
+        }
+
+#Fetch jobs for every watchlist company and sector feed, consumed lazily by the fetch stage
+def collector_sources(companies: dict, sectors: list[str] = None) -> Iterable:
+    for ticker, company_name in companies.items():
+        yield ('company', ticker, company_name)
+    for sector in sectors or []:
+        yield ('sector', sector, None)
+
+#fetch -> dedup -> tag -> graph -> prepare -> embed -> write (+ archive); the vector stages are skipped without a vector store
+#on_fetch(kind, key, articles) reports each finished fetch job, on_article(article, tickers) each article written to the graph
+#and on_stored(article, tickers) each article the vector store holds afterwards, written now or found already stored
+def build_article_pipeline(collector, knowledge_graph, vector_db=None, tagger: Callable = None, days_back: int = 7,
+                           on_article: Callable = None, on_fetch: Callable = None, on_stored: Callable = None,
+                           fetch_workers: int = 2, tag_workers: int = 2,
+                           graph_workers: int = 4, embed_workers: int = 2, embed_batch: int = 64,
+                           queue_size: int = 64, stop_event: threading.Event = None, archive=None) -> Pipeline:
+    seen_urls = set()
+    seen_lock = threading.Lock()
+
+    def fetch(job):
+        kind, key, company_name = job
+        if kind == 'company':
+            articles = collector.get_company_news_direct(key, company_name, days_back)
+            default_tickers = [key]
+        else:
+            articles = collector.get_sector_news(key, days_back)
+            default_tickers = []
+        if on_fetch:
+            on_fetch(kind, key, len(articles or []))
+        #One vectorized scoring pass per fetched page instead of one per article downstream
+        for article in Sentiment.score_articles(articles or []):
+            yield article, default_tickers
+
+    def dedup(record):
+        url = record[0].url
+        with seen_lock:
+            if url and url in seen_urls:
+                return
+            seen_urls.add(url)
+        yield record
+
+    def tag(record):
+        article, tickers = record
+        tagged = tagger(article) if tagger else []
+        yield article, sorted(set(tickers) | set(tagged))
+
+    def graph(record):
+        article, tickers = record
+        knowledge_graph.add_news_article(article, tickers)
+        if on_article:
+            on_article(article, tickers)
+        yield record
+
+    def prepare(records):
+        batch = vector_db.prepare_articles([r[0] for r in records], [r[1] for r in records])
+        if on_stored:
+            kept = {article.fingerprint for article in batch['articles']}
+            for article, tickers in records:
+                if article.fingerprint not in kept:
+                    on_stored(article, tickers)
+        if batch['documents']:
+            yield batch
+
+    #A failed embedding call fails the batch rather than writing zero vectors; the next cycle fetches it again
+    def embed(batch):
+        yield vector_db.embed_prepared(batch, strict=True)
+
+    def write(batch):
+        vector_db.write_prepared(batch)
+        if on_stored:
+            for article, tickers in zip(batch['articles'], batch['tickers']):
+                on_stored(article, tickers)
+        if archive is not None:
+            archive.append_prepared(batch)
+        yield len(batch['ids'])
+    
+    #Without a vector store the archive still gets every new article, just without vectors
+    def archive_records(records):
+        archive.append([r[0] for r in records], [r[1] for r in records])
+        yield len(records)
+
+    stages = [
+        Stage('fetch', fetch, workers=fetch_workers),
+        Stage('dedup', dedup),
+        Stage('tag', tag, workers=tag_workers),
+        Stage('graph', graph, workers=graph_workers)
+    ]
+    if vector_db is not None:
+        stages += [
+            Stage('prepare', prepare, batch_size=embed_batch),
+            Stage('embed', embed, workers=embed_workers),
+            Stage('write', write)
+        ]
+    elif archive is not None:
+        stages.append(Stage('archive', archive_records, batch_size=embed_batch))
+    return Pipeline(stages, queue_size=queue_size, stop_event=stop_event)
@@ -0,0 +1,298 @@
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from functools import cached_property
+from FinDataCollector import FinancialDataCollector
+from TickerUniverse import NAME_SUFFIXES, SECTOR_TICKERS
+from KG import FinancialKnowledgeGraph
+from VectorDB import open_vector_db
+from Retention import RetentionManager, RetentionPolicy
+from GraphMaintenance import GraphMaintenance
+from IngestPipeline import build_article_pipeline, collector_sources
+from Article import Article
+from NewsArchive import NewsArchive, archive_available
+from Config import get_setting
+import Notifier
+
+WATCHLIST_STATE_PATH = os.environ.get("WATCHLIST_STATE_PATH", "watchlist_state.json")
+QUOTE_MAX_AGE = 15 * 60
+NEWS_MAX_AGE = 60 * 60
+
+def default_watchlist() -> list[str]:
+    return sorted({ticker for tickers in SECTOR_TICKERS.values() for ticker in tickers})
+
+def _json_value(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+#Snapshot of what the worker has already ingested, shared with query processes through a JSON file
+class WatchlistState:
+    def __init__(self, path: str = WATCHLIST_STATE_PATH):
+        self.path = path
+        self._mtime = None
+        self._data = {"tickers": {}, "updated_at": 0}
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                self._data = json.load(f)
+            self._mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def ticker_state(self, ticker: str) -> dict:
+        with self._lock:
+            self._reload()
+            return self._data.get("tickers", {}).get(ticker, {})
+
+    #Returns the pre-fetched quote if it is newer than max_age seconds
+    def get_quote(self, ticker: str, max_age: float = QUOTE_MAX_AGE) -> dict:
+        state = self.ticker_state(ticker)
+        if state.get("quote") and time.time() - state.get("quote_at", 0) <= max_age:
+            return state["quote"]
+        return {}
+
+    def has_fresh_news(self, ticker: str, max_age: float = NEWS_MAX_AGE) -> bool:
+        state = self.ticker_state(ticker)
+        return time.time() - state.get("news_at", 0) <= max_age
+
+    def update(self, ticker: str, **fields):
+        with self._lock:
+            self._reload()
+            self._data.setdefault("tickers", {}).setdefault(ticker, {}).update(fields)
+
+    def save(self):
+        with self._lock:
+            self._data["updated_at"] = time.time()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._data, f, default=_json_value)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+
+#Background job that keeps quotes, news and embeddings warm for a watchlist of tickers
+class IngestionWorker:
+    def __init__(self, watchlist: list[str] = None, openai_key: str = None, interval: float = 900,
+                 days_back: int = 7, sectors: list[str] = None, state_path: str = WATCHLIST_STATE_PATH,
+                 retention_every: int = 0, retention_policy: RetentionPolicy = None, centrality_every: int = 0,
+                 archive: bool = True, cleanup_every: int = 0):
+        self.watchlist = watchlist or default_watchlist()
+        self.openai_key = openai_key or get_setting("OPENAI_API_KEY")
+        self.interval = interval
+        self.days_back = days_back
+        self.sectors = sectors if sectors is not None else list(SECTOR_TICKERS.keys())
+        self.state = WatchlistState(state_path)
+        self.retention_every = retention_every
+        self.retention_policy = retention_policy
+        self.centrality_every = centrality_every
+        self.cleanup_every = cleanup_every
+        self.archive_enabled = archive
+        self._cycles = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @cached_property
+    def data_collector(self) -> FinancialDataCollector:
+        return FinancialDataCollector()
+
+    @cached_property
+    def knowledge_graph(self) -> FinancialKnowledgeGraph:
+        return FinancialKnowledgeGraph()
+
+    @cached_property
+    def vector_db(self):
+        if not self.openai_key:
+            Notifier.log("OPENAI_API_KEY not set - articles will not be embedded")
+            return None
+        return open_vector_db(self.openai_key)
+
+    @cached_property
+    def archive(self) -> NewsArchive:
+        if not self.archive_enabled:
+            return None
+        if not archive_available():
+            Notifier.log("pyarrow not installed - raw news will not be archived")
+            return None
+        return NewsArchive()
+
+    @cached_property
+    def retention(self) -> RetentionManager:
+        return RetentionManager(self.vector_db, self.knowledge_graph, self.retention_policy)
+
+    @cached_property
+    def graph_maintenance(self) -> GraphMaintenance:
+        return GraphMaintenance(self.knowledge_graph, stop_event=self._stop)
+
+    def _name_tokens(self, company_name: str) -> str:
+        words = [w for w in str(company_name).split() if w.lower().strip(',') not in NAME_SUFFIXES]
+        return " ".join(words).strip(',').lower()
+
+    #Cheap tagging without an LLM call: known company names and multi-letter tickers
+    def _tag_article(self, article: Article, names: dict) -> list[str]:
+        text = article.text
+        text_lower = article.text_lower
+        tickers = []
+        for ticker, name in names.items():
+            if name and name in text_lower:
+                tickers.append(ticker)
+            elif len(ticker) > 1 and re.search(rf'\b{re.escape(ticker)}\b', text):
+                tickers.append(ticker)
+        return tickers
+
+    def ingest_quotes(self) -> dict:
+        quotes = {}
+        for ticker in self.watchlist:
+            if self._stop.is_set():
+                break
+            data = self.data_collector.get_stock_data(ticker)
+            if not data:
+                continue
+            quotes[ticker] = data
+            self.knowledge_graph.add_company(data)
+            self.state.update(ticker, quote=data, quote_at=time.time())
+        return quotes
+
+    #Streams fetch, tagging, graph writes and embedding through IngestPipeline so the stages overlap
+    def ingest_news(self, quotes: dict) -> int:
+        names = {ticker: self._name_tokens(data.get('companyName', '')) for ticker, data in quotes.items()}
+        companies = {ticker: quotes.get(ticker, {}).get('companyName', '') for ticker in self.watchlist}
+        counts = Counter()
+        fetched = set()
+        stored = set()
+        counts_lock = threading.Lock()
+
+        def count(article, tickers):
+            with counts_lock:
+                counts.update(tickers)
+
+        #A fetch that came back empty (quota, outage, timeout) must not mark the ticker as prewarmed
+        def fetch_done(kind, key, articles):
+            if kind == 'company' and articles:
+                with counts_lock:
+                    fetched.add(key)
+
+        #Only news that reached the vector store can stand in for a live fetch at query time
+        def store_done(article, tickers):
+            with counts_lock:
+                stored.update(tickers)
+
+        pipeline = build_article_pipeline(
+            self.data_collector,
+            self.knowledge_graph,
+            self.vector_db,
+            tagger=lambda article: self._tag_article(article, names),
+            days_back=self.days_back,
+            on_article=count,
+            on_fetch=fetch_done,
+            on_stored=store_done,
+            stop_event=self._stop,
+            archive=self.archive
+        )
+        stats = pipeline.run(collector_sources(companies, self.sectors))
+        Notifier.log(f"Ingestion pipeline stages: {stats['stages']}")
+        Notifier.log(f"HTTP connection reuse: {self.data_collector.http.stats()}")
+        Notifier.log(f"NewsAPI quota: {self.data_collector.quota_status()}")
+
+        #A stopped run may not have written what it fetched, so nothing counts as fresh
+        if self._stop.is_set():
+            fetched.clear()
+        now = time.time()
+        for ticker in self.watchlist:
+            if ticker in fetched and ticker in stored:
+                self.state.update(ticker, news_at=now, articles=counts.get(ticker, 0))
+        return stats['stages']['graph']['emitted']
+
+    def run_once(self) -> dict:
+        started = time.time()
+        quotes = self.ingest_quotes()
+        self.state.save()
+        article_count = self.ingest_news(quotes)
+        self.state.save()
+        if self.archive is not None:
+            self.archive.compact()
+        self._cycles += 1
+        summary = {
+            "tickers": len(self.watchlist),
+            "quotes": len(quotes),
+            "articles": article_count
+        }
+        if self.retention_every and self._cycles % self.retention_every == 0:
+            summary["evicted"] = self.retention.run()["evicted"]
+        if self.centrality_every and self._cycles % self.centrality_every == 0:
+            summary["pagerank"] = self.graph_maintenance.compute_pagerank().get("companies", 0)
+        if self.cleanup_every and self._cycles % self.cleanup_every == 0:
+            summary["cleaned"] = self.graph_maintenance.cleanup().get("removed", 0)
+        summary["seconds"] = round(time.time() - started, 2)
+        Notifier.info(f"Ingestion cycle complete: {summary}")
+        return summary
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                self.run_once()
+            except Exception as e:
+                Notifier.error(f"Ingestion cycle failed: {e}")
+            self._stop.wait(max(0, self.interval - (time.time() - started)))
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="ingestion-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warm quotes, news and embeddings for a watchlist")
+    parser.add_argument("--tickers", help="comma separated tickers, defaults to every ticker in SECTOR_TICKERS")
+    parser.add_argument("--sectors", help="comma separated sectors to pull RSS news for, defaults to all")
+    parser.add_argument("--interval", type=float, default=900, help="seconds between ingestion cycles")
+    parser.add_argument("--days-back", type=int, default=7)
+    parser.add_argument("--state", default=WATCHLIST_STATE_PATH)
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    parser.add_argument("--retention-every", type=int, default=0, help="run retention every N cycles, 0 to disable")
+    parser.add_argument("--centrality-every", type=int, default=0, help="recompute company PageRank every N cycles, 0 to disable")
+    parser.add_argument("--cleanup-every", type=int, default=0, help="run chunked graph cleanup every N cycles, 0 to disable")
+    parser.add_argument("--no-archive", action="store_true", help="do not append ingested articles to the Parquet archive")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    worker = IngestionWorker(
+        watchlist=[t.strip().upper() for t in args.tickers.split(",")] if args.tickers else None,
+        sectors=[s.strip() for s in args.sectors.split(",")] if args.sectors else None,
+        interval=args.interval,
+        days_back=args.days_back,
+        state_path=args.state,
+        retention_every=args.retention_every,
+        centrality_every=args.centrality_every,
+        cleanup_every=args.cleanup_every,
+        archive=not args.no_archive
+    )
+    if args.once:
+        worker.run_once()
+    else:
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            worker.stop()
+
+if __name__ == "__main__":
+    main()
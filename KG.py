@@ -1,67 +1,330 @@
-import streamlit as st
 import os
-from neo4j import GraphDatabase
+import json
+import threading
+import time
+from collections import OrderedDict
+from LazyLoader import lazy_import
+from Config import get_setting
+from Article import parse_published
+from Article import Article
+from TickerUniverse import get_universe
+import Sentiment
+import Notifier
+import Metrics
+
+neo4j = lazy_import("neo4j")
+GRAPH_SCHEMA_VERSION = 3
+GRAPH_SCHEMA_MARKER = os.environ.get("GRAPH_SCHEMA_MARKER", ".graph_schema.json")
+_schema_lock = threading.Lock()
+_initialized_uris = set()
+NEIGHBORHOOD_CACHE_TTL = 600
+NEIGHBORHOOD_CACHE_SIZE = 256
+CO_MENTION_HALF_LIFE_DAYS = 30
+#Score of a shared sector relative to the strongest co-mention of the seeds, which scores 1.0
+SECTOR_PEER_WEIGHT = 0.5
+SENTIMENT_HALF_LIFE_DAYS = 7
+
+#Pairs of companies mentioned by a newly added article get their CO_MENTIONED weight decayed to now and bumped.
+#Each pair has one edge, from the lower ticker to the higher one.
+CO_MENTION_QUERY = """
+    MATCH (a:NewsArticle {id: $article_id}) WHERE a.coMentionedAt IS NULL
+    SET a.coMentionedAt = $now
+    WITH a
+    MATCH (a)-[:MENTIONS]->(c1:Company), (a)-[:MENTIONS]->(c2:Company)
+    WHERE c1.ticker < c2.ticker
+    MERGE (c1)-[r:CO_MENTIONED]->(c2)
+    ON CREATE SET r.weight = 0.0, r.updatedAt = $now, r.articles = 0
+    SET r.weight = r.weight * 0.5 ^ (($now - r.updatedAt) / $half_life) + $increment,
+        r.updatedAt = $now,
+        r.articles = r.articles + 1
+"""
+
+#MENTIONS edges of a newly added article; the same round trip folds its tone into decayed sums on the
+#mentioned companies and their sectors. The mean tone is sentimentSum / sentimentWeight, both decay alike
+MENTIONS_QUERY = """
+    MATCH (a:NewsArticle {id: $article_id})
+    UNWIND $tickers AS ticker
+    MATCH (c:Company {ticker: ticker})
+    MERGE (a)-[:MENTIONS]->(c)
+    WITH DISTINCT a WHERE a.sentimentRolledAt IS NULL
+    SET a.sentimentRolledAt = $now
+    WITH a
+    MATCH (a)-[:MENTIONS]->(c:Company)
+    WITH c, 0.5 ^ (($now - coalesce(c.sentimentUpdatedAt, $now)) / $half_life) AS decay
+    SET c.sentimentSum = coalesce(c.sentimentSum, 0.0) * decay + $increment * $score,
+        c.sentimentWeight = coalesce(c.sentimentWeight, 0.0) * decay + $increment,
+        c.sentimentUpdatedAt = $now
+    WITH DISTINCT c
+    MATCH (c)-[:BELONGS_TO]->(s:Sector)
+    WITH DISTINCT s
+    WITH s, 0.5 ^ (($now - coalesce(s.sentimentUpdatedAt, $now)) / $half_life) AS decay
+    SET s.sentimentSum = coalesce(s.sentimentSum, 0.0) * decay + $increment * $score,
+        s.sentimentWeight = coalesce(s.sentimentWeight, 0.0) * decay + $increment,
+        s.sentimentUpdatedAt = $now
+"""
+
+#Folds a company's latest quote into the performance rollup of every sector it is listed in.
+#Each LISTED_IN edge holds the company's last contribution, so sums and counts are adjusted by the difference.
+#Leader and laggard are replaced on a better or worse change and only rescanned when the current one slips back
+SECTOR_ROLLUP_QUERY = """
+    MATCH (c:Company {ticker: $ticker})
+    FOREACH (name IN $sectors |
+        MERGE (s:Sector {name: name})
+        MERGE (c)-[:LISTED_IN]->(s))
+    WITH c WHERE $change IS NOT NULL
+    MATCH (c)-[r:LISTED_IN]->(s:Sector)
+    WITH r, s, coalesce(r.cap, 0.0) AS oldCap, r.change AS oldChange
+    SET s.capChangeSum = coalesce(s.capChangeSum, 0.0) - oldCap * coalesce(oldChange, 0.0) + $cap * $change,
+        s.totalCap = coalesce(s.totalCap, 0.0) - oldCap + $cap,
+        s.members = coalesce(s.members, 0) + CASE WHEN oldChange IS NULL THEN 1 ELSE 0 END,
+        s.advancers = coalesce(s.advancers, 0) + CASE WHEN $change > 0 THEN 1 ELSE 0 END
+                      - CASE WHEN oldChange > 0 THEN 1 ELSE 0 END,
+        s.decliners = coalesce(s.decliners, 0) + CASE WHEN $change < 0 THEN 1 ELSE 0 END
+                      - CASE WHEN oldChange < 0 THEN 1 ELSE 0 END,
+        s.performanceUpdatedAt = $now,
+        r.cap = $cap,
+        r.change = $change,
+        r.updatedAt = $now
+    WITH s
+    FOREACH (_ IN CASE WHEN s.leader IS NULL OR $change >= s.leaderChange THEN [1] ELSE [] END |
+        SET s.leader = $ticker, s.leaderChange = $change)
+    FOREACH (_ IN CASE WHEN s.laggard IS NULL OR $change <= s.laggardChange THEN [1] ELSE [] END |
+        SET s.laggard = $ticker, s.laggardChange = $change)
+    WITH s
+    CALL {
+        WITH s
+        WITH s WHERE s.leader = $ticker AND s.leaderChange > $change
+        MATCH (s)<-[m:LISTED_IN]-(peer:Company) WHERE m.change IS NOT NULL
+        WITH s, peer, m ORDER BY m.change DESC LIMIT 1
+        SET s.leader = peer.ticker, s.leaderChange = m.change
+    }
+    CALL {
+        WITH s
+        WITH s WHERE s.laggard = $ticker AND s.laggardChange < $change
+        MATCH (s)<-[m:LISTED_IN]-(peer:Company) WHERE m.change IS NOT NULL
+        WITH s, peer, m ORDER BY m.change ASC LIMIT 1
+        SET s.laggard = peer.ticker, s.laggardChange = m.change
+    }
+"""
+
+#Runs on a row bound to c before the company is deleted: backs each of its LISTED_IN quotes out of the sector
+#rollup the way SECTOR_ROLLUP_QUERY adjusts a member update, then rescans a leader or laggard it held
+SECTOR_MEMBER_REMOVAL = """
+    CALL {
+        WITH c
+        MATCH (c)-[r:LISTED_IN]->(s:Sector) WHERE r.change IS NOT NULL
+        WITH c.ticker AS ticker, r, s, coalesce(r.cap, 0.0) AS oldCap, r.change AS oldChange
+        SET s.capChangeSum = coalesce(s.capChangeSum, 0.0) - oldCap * oldChange,
+            s.totalCap = coalesce(s.totalCap, 0.0) - oldCap,
+            s.members = coalesce(s.members, 0) - 1,
+            s.advancers = coalesce(s.advancers, 0) - CASE WHEN oldChange > 0 THEN 1 ELSE 0 END,
+            s.decliners = coalesce(s.decliners, 0) - CASE WHEN oldChange < 0 THEN 1 ELSE 0 END
+        DELETE r
+        WITH s, ticker
+        CALL {
+            WITH s, ticker
+            WITH s WHERE s.leader = ticker
+            OPTIONAL MATCH (s)<-[m:LISTED_IN]-(peer:Company) WHERE m.change IS NOT NULL
+            WITH s, peer, m ORDER BY m.change DESC LIMIT 1
+            SET s.leader = peer.ticker, s.leaderChange = m.change
+        }
+        CALL {
+            WITH s, ticker
+            WITH s WHERE s.laggard = ticker
+            OPTIONAL MATCH (s)<-[m:LISTED_IN]-(peer:Company) WHERE m.change IS NOT NULL
+            WITH s, peer, m ORDER BY m.change ASC LIMIT 1
+            SET s.laggard = peer.ticker, s.laggardChange = m.change
+        }
+    }
+"""
+
+#Sector peers and co-mentioned companies of the seed tickers in one round trip, reading precomputed edge weights
+#Co-mention weights are scaled so the strongest is 1.0, sector peers get $sector_weight below that, and each
+#relation keeps its own top $per_relation rows, so a large sector cannot crowd co-mentions out of the candidates
+NEIGHBORHOOD_QUERY = """
+    MATCH (seed:Company) WHERE seed.ticker IN $tickers
+    WITH collect(seed) AS seeds
+    CALL {
+        WITH seeds
+        UNWIND seeds AS seed
+        MATCH (seed)-[r:CO_MENTIONED]-(peer:Company)
+        WHERE NOT peer IN seeds
+        WITH peer, seed, r.weight * 0.5 ^ (($now - r.updatedAt) / $half_life) AS strength
+        ORDER BY strength DESC
+        LIMIT $per_relation
+        WITH collect({peer: peer, via: seed.ticker, strength: strength}) AS rows
+        WITH rows, CASE WHEN size(rows) > 0 AND rows[0].strength > 0 THEN rows[0].strength ELSE 1.0 END AS strongest
+        UNWIND rows AS row
+        RETURN row.peer AS peer, 'co_mentioned' AS relation, row.via AS via, row.strength / strongest AS weight,
+               row.strength AS strength
+        UNION ALL
+        WITH seeds
+        UNWIND seeds AS seed
+        MATCH (seed)-[:BELONGS_TO]->(s:Sector)<-[:BELONGS_TO]-(peer:Company)
+        WHERE NOT peer IN seeds
+        WITH peer, s
+        ORDER BY coalesce(peer.pagerank, 0.0) DESC
+        LIMIT $per_relation
+        RETURN peer, 'sector_peer' AS relation, s.name AS via, $sector_weight AS weight, null AS strength
+    }
+    RETURN peer.ticker AS ticker, peer.name AS name, relation, via, weight, strength,
+           coalesce(peer.pagerank, 0.0) AS pagerank
+    ORDER BY weight DESC, pagerank DESC
+"""
+
+#Session wrapper that counts every Cypher round trip
+class _CountingSession:
+    def __init__(self, session):
+        self._session = session
+
+    def __enter__(self):
+        self._session.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._session.__exit__(*exc)
+
+    def run(self, query, parameters=None, **kwargs):
+        Metrics.count("neo4j_round_trips")
+        return self._session.run(query, parameters, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
 
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
 #This class deals with the neo4j graph
 class FinancialKnowledgeGraph:
     def __init__(self):
+        self._driver = None
+        self._connected = False
+        self.neo4j_uri = None
+        self._neighborhood_cache = OrderedDict()
+        self._neighborhood_lock = threading.Lock()
+
+    #The driver is created on first use so constructing the graph costs nothing
+    @property
+    def driver(self):
+        if not self._connected:
+            self._connected = True
+            self._driver = self._connect()
+            if self._driver:
+                self.initialize_graph()
+        return self._driver
+
+    @driver.setter
+    def driver(self, value):
+        self._connected = True
+        self._driver = value
+
+    #Releases the driver if one was opened; a later write connects again
+    def close(self):
+        if self._driver:
+            self._driver.close()
+        self._driver = None
+        self._connected = False
+
+    def _connect(self):
         try:
-            neo4j_uri = os.environ.get("NEO4J_URI")
-            neo4j_user = os.environ.get("NEO4J_USER", "neo4j")
-            neo4j_password = os.environ.get("NEO4J_PASSWORD")
-            
-            try:
-                if hasattr(st, 'secrets'):
-                    neo4j_uri = st.secrets.get("NEO4J_URI", neo4j_uri)
-                    neo4j_user = st.secrets.get("NEO4J_USER", neo4j_user)
-                    neo4j_password = st.secrets.get("NEO4J_PASSWORD", neo4j_password)
-            except Exception:
-                pass
+            neo4j_uri = get_setting("NEO4J_URI")
+            neo4j_user = get_setting("NEO4J_USER", "neo4j")
+            neo4j_password = get_setting("NEO4J_PASSWORD")
             
             if not neo4j_uri or not neo4j_password:
-                st.error("Neo4j credentials not configured. Please set NEO4J_URI and NEO4J_PASSWORD in secrets.")
+                Notifier.error("Neo4j credentials not configured. Please set NEO4J_URI and NEO4J_PASSWORD in secrets.")
                 raise ValueError("Neo4j credentials missing")
                 
-            self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
-            with self.driver.session() as session:
-                session.run("MATCH () RETURN count(*) as count")
-            st.success("Connected to Neo4j")
+            driver = neo4j.GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+            driver.verify_connectivity()
+            self.neo4j_uri = neo4j_uri
+            Notifier.success("Connected to Neo4j")
+            return driver
         except Exception as e:
-            st.warning(f"Neo4j not available: {e}")
-            self.driver = None
-    #Intialization of the graph
-    def initialize_graph(self):
+            Notifier.warning(f"Neo4j not available: {e}")
+            return None
+
+    def _session(self):
+        return _CountingSession(self.driver.session())
+
+    def _schema_marker(self) -> dict:
+        try:
+            with open(GRAPH_SCHEMA_MARKER) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _schema_is_current(self) -> bool:
+        if self.neo4j_uri in _initialized_uris:
+            return True
+        return self._schema_marker().get(self.neo4j_uri) == GRAPH_SCHEMA_VERSION
+
+    def _mark_schema_current(self):
+        _initialized_uris.add(self.neo4j_uri)
+        marker = self._schema_marker()
+        marker[self.neo4j_uri] = GRAPH_SCHEMA_VERSION
+        try:
+            with open(GRAPH_SCHEMA_MARKER, "w") as f:
+                json.dump(marker, f)
+        except OSError:
+            pass
+
+    #Intialization of the graph, runs once per deployment and schema version
+    def initialize_graph(self, force: bool = False):
         if not self.driver:
             return
         
-        try:
-            constraints = [
-                "CREATE CONSTRAINT company_ticker IF NOT EXISTS FOR (c:Company) REQUIRE c.ticker IS UNIQUE",
-                "CREATE CONSTRAINT sector_name IF NOT EXISTS FOR (s:Sector) REQUIRE s.name IS UNIQUE"
-            ]
+        with _schema_lock:
+            if not force and self._schema_is_current():
+                return
             
-            with self.driver.session() as session:
-                for constraint in constraints:
-                    try:
-                        session.run(constraint)
-                    except:
-                        pass
-            
-            st.success("Knowledge graph initialized")
+            try:
+                constraints = [
+                    "CREATE CONSTRAINT company_ticker IF NOT EXISTS FOR (c:Company) REQUIRE c.ticker IS UNIQUE",
+                    "CREATE CONSTRAINT sector_name IF NOT EXISTS FOR (s:Sector) REQUIRE s.name IS UNIQUE",
+                    "CREATE INDEX news_article_url IF NOT EXISTS FOR (a:NewsArticle) ON (a.url)",
+                    "CREATE INDEX news_article_published IF NOT EXISTS FOR (a:NewsArticle) ON (a.publishedAt)"
+                ]
+                
+                with self._session() as session:
+                    for constraint in constraints:
+                        try:
+                            session.run(constraint)
+                        except:
+                            pass
+                    article_ids_unique = self._create_article_id_constraint(session)
+                
+                #Retried on the next start until GraphMaintenance.py migrate-articles has merged the duplicates
+                if article_ids_unique:
+                    self._mark_schema_current()
+                Notifier.success("Knowledge graph initialized")
+            except Exception as e:
+                Notifier.error(f"Graph initialization error: {e}")
+    #The unique constraint replaces the plain id index of older schemas. Graphs written with the old
+    #per-process ids may hold duplicates that block it; they keep the plain index until migrated
+    def _create_article_id_constraint(self, session) -> bool:
+        try:
+            session.run("DROP INDEX news_article_id IF EXISTS").consume()
+            session.run("CREATE CONSTRAINT news_article_id_unique IF NOT EXISTS FOR (a:NewsArticle) REQUIRE a.id IS UNIQUE").consume()
+            return True
         except Exception as e:
-            st.error(f"Graph initialization error: {e}")
-    #Add a company node to the graph
-    def add_company(self, company_data: dict):
+            session.run("CREATE INDEX news_article_id IF NOT EXISTS FOR (a:NewsArticle) ON (a.id)")
+            Notifier.warning(f"NewsArticle ids are not unique yet, run: python GraphMaintenance.py migrate-articles ({e})")
+            return False
+    
+    #Id of an article's node, derived from its url or title so every process and restart agrees on it
+    @staticmethod
+    def article_id(article: Article) -> str:
+        return f"article_{article.fingerprint}"
+    
+    #Add a company node to the graph; strict re-raises write errors for callers that retry
+    def add_company(self, company_data: dict, strict: bool = False):
+        with Metrics.span("graph_write", kind="company"):
+            self._add_company(company_data, strict)
+
+    def _add_company(self, company_data: dict, strict: bool = False):
         if not company_data:
             return
             
         if not self.driver:
-            st.warning(f"❌ Neo4j not connected - cannot add {company_data.get('ticker', 'Unknown')} to knowledge graph")
+            Notifier.warning(f"❌ Neo4j not connected - cannot add {company_data.get('ticker', 'Unknown')} to knowledge graph")
             return
         
         
@@ -78,7 +341,7 @@ class FinancialKnowledgeGraph:
                 else:
                     return str(value)
             
-            with self.driver.session() as session:
+            with self._session() as session:
                 session.run("""
                     MERGE (c:Company {ticker: $ticker})
                     SET c.name = $name,
@@ -122,50 +385,215 @@ class FinancialKnowledgeGraph:
                         'lastUpdated': str(company_data.get('lastUpdated', ''))
                     })
                 
+                session.run(SECTOR_ROLLUP_QUERY, {
+                    'ticker': ticker,
+                    'sectors': self.listed_sectors(ticker, sector),
+                    'change': self.change_percent(company_data) if 'price' in company_data else None,
+                    'cap': self.market_cap(convert_value(company_data.get('marketCap', 0))),
+                    'now': time.time()
+                })
+                
         except Exception as e:
-            st.warning(f"Error adding company {company_data.get('ticker', 'Unknown')}: {e}")
+            if strict:
+                raise
+            Notifier.warning(f"Error adding company {company_data.get('ticker', 'Unknown')}: {e}")
+    
+    #The quote's own sector plus every universe sector that lists the ticker
+    @staticmethod
+    def listed_sectors(ticker: str, sector: str = '') -> list[str]:
+        sectors = get_universe().sectors_for(ticker)
+        if sector:
+            sectors.add(str(sector))
+        return sorted(sectors)
     
-    #Add article node to the graph
-    def add_news_article(self, article: dict, mentioned_tickers: list[str]):
+    @staticmethod
+    def change_percent(company_data: dict):
+        try:
+            return float(str(company_data.get('changePercent', '')).strip().rstrip('%'))
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def market_cap(value) -> float:
+        try:
+            return float(value or 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+    
+    #Add article node to the graph; strict re-raises write errors for callers that retry
+    def add_news_article(self, article: dict, mentioned_tickers: list[str], strict: bool = False):
+        with Metrics.span("graph_write", kind="article"):
+            self._add_news_article(article, mentioned_tickers, strict)
+
+    def _add_news_article(self, article: dict, mentioned_tickers: list[str], strict: bool = False):
         if not self.driver or not article:
             return
         
         try:
-            article_id = f"article_{hash(article.get('title', ''))}"
+            article = Article.coerce(article)
+            article_id = self.article_id(article)
             
-            with self.driver.session() as session:
+            with self._session() as session:
                 session.run("""
                     MERGE (a:NewsArticle {id: $id})
                     SET a.title = $title,
                         a.content = $content,
                         a.source = $source,
                         a.publishedAt = $publishedAt,
-                        a.url = $url
+                        a.url = $url,
+                        a.sentiment = $sentiment,
+                        a.sentimentLabel = $sentimentLabel,
+                        a.ingestedAt = coalesce(a.ingestedAt, $ingestedAt)
                 """, {
                     'id': article_id,
-                    'title': article.get('title', ''),
-                    'content': article.get('content', '')[:500],
-                    'source': article.get('source', ''),
-                    'publishedAt': article.get('publishedAt', ''),
-                    'url': article.get('url', '')
+                    'title': article.title,
+                    'content': article.content[:500],
+                    'source': article.source,
+                    'publishedAt': article.published,
+                    'url': article.url,
+                    'sentiment': article.sentiment,
+                    'sentimentLabel': Sentiment.label(article.sentiment),
+                    'ingestedAt': time.time()
                 })
                 
-                for ticker in mentioned_tickers:
-                    session.run("""
-                        MATCH (a:NewsArticle {id: $article_id})
-                        MATCH (c:Company {ticker: $ticker})
-                        MERGE (a)-[:MENTIONS]->(c)
-                    """, {'article_id': article_id, 'ticker': ticker})
+                if mentioned_tickers:
+                    now = time.time()
+                    session.run(MENTIONS_QUERY, {
+                        'article_id': article_id,
+                        'tickers': list(mentioned_tickers),
+                        'now': now,
+                        'half_life': SENTIMENT_HALF_LIFE_DAYS * 86400,
+                        'score': article.sentiment,
+                        'increment': self.co_mention_increment(article.published, now, SENTIMENT_HALF_LIFE_DAYS)
+                    })
+                
+                if len(set(mentioned_tickers)) > 1:
+                    now = time.time()
+                    session.run(CO_MENTION_QUERY, {
+                        'article_id': article_id,
+                        'now': now,
+                        'half_life': CO_MENTION_HALF_LIFE_DAYS * 86400,
+                        'increment': self.co_mention_increment(article.published, now)
+                    })
                     
         except Exception as e:
-            st.warning(f"Error adding news article: {e}")
+            if strict:
+                raise
+            Notifier.warning(f"Error adding news article: {e}")
+    
+    #Old news counts for less: an article published one half-life ago adds 0.5 to each pair it mentions
+    def co_mention_increment(self, published_at, now: float, half_life_days: float = CO_MENTION_HALF_LIFE_DAYS) -> float:
+        published = parse_published(published_at)
+        if published is None:
+            return 1.0
+        age = max(0.0, now - published.timestamp())
+        return 0.5 ** (age / (half_life_days * 86400))
+    
+    #Decayed co-mention weights and PageRank of the given companies, one read of their incident edges
+    def company_relations(self, tickers: list[str]) -> dict:
+        if not tickers or not self.driver:
+            return {}
+        try:
+            with self._session() as session:
+                result = session.run("""
+                    MATCH (c:Company) WHERE c.ticker IN $tickers
+                    OPTIONAL MATCH (c)-[r:CO_MENTIONED]-(other:Company)
+                    RETURN c.ticker AS ticker, c.pagerank AS pagerank,
+                           collect({ticker: other.ticker, weight: r.weight * 0.5 ^ (($now - r.updatedAt) / $half_life)}) AS related
+                """, {'tickers': list(tickers), 'now': time.time(), 'half_life': CO_MENTION_HALF_LIFE_DAYS * 86400})
+                return {
+                    record['ticker']: {
+                        'pagerank': record['pagerank'] or 0.0,
+                        'co_mentioned': sorted(
+                            [r for r in record['related'] if r['ticker']], key=lambda r: r['weight'], reverse=True)
+                    }
+                    for record in result
+                }
+        except Exception as e:
+            Notifier.log(f"Company relations lookup failed: {e}")
+            return {}
+    
+    #Materialized performance of the given sectors, one node read each instead of a quote per member
+    def sector_performance(self, sectors: list[str]) -> dict:
+        if not sectors or not self.driver:
+            return {}
+        try:
+            with self._session() as session:
+                result = session.run("""
+                    MATCH (s:Sector) WHERE s.name IN $sectors AND s.members > 0
+                    OPTIONAL MATCH (s)<-[m:LISTED_IN]-(member:Company) WHERE m.change IS NOT NULL
+                    WITH s, collect([member.ticker, coalesce(m.updatedAt, 0.0)]) AS memberTimes
+                    RETURN s.name AS sector, s.members AS members, s.advancers AS advancers, s.decliners AS decliners,
+                           s.capChangeSum AS capChangeSum, s.totalCap AS totalCap, s.leader AS leader,
+                           s.leaderChange AS leaderChange, s.laggard AS laggard, s.laggardChange AS laggardChange,
+                           s.performanceUpdatedAt AS lastUpdatedAt, memberTimes
+                """, {'sectors': list(sectors)})
+                rows = [record.data() for record in result]
+        except Exception as e:
+            Notifier.log(f"Sector performance lookup failed: {e}")
+            return {}
+        
+        performance = {}
+        for row in rows:
+            total_cap = row.pop('totalCap') or 0.0
+            cap_change_sum = row.pop('capChangeSum') or 0.0
+            row['weightedChange'] = round(cap_change_sum / total_cap, 2) if total_cap > 0 else None
+            #The rollup is only as fresh as its stalest member quote; memberUpdatedAt lets callers check each one
+            row['memberUpdatedAt'] = {ticker: updated for ticker, updated in row.pop('memberTimes') if ticker}
+            row['updatedAt'] = min(row['memberUpdatedAt'].values(), default=0.0)
+            performance[row.pop('sector')] = row
+        return performance
+    
+    #Precomputed news tone of the given companies and their sectors, one read of node properties
+    #weight is the decayed article count behind the mean, so a lone old article reads as thin evidence
+    def sentiment_rollups(self, tickers: list[str]) -> dict:
+        if not tickers or not self.driver:
+            return {}
+        try:
+            with self._session() as session:
+                result = session.run("""
+                    MATCH (c:Company) WHERE c.ticker IN $tickers
+                    OPTIONAL MATCH (c)-[:BELONGS_TO]->(s:Sector)
+                    RETURN c.ticker AS ticker, c.sentimentSum AS sum, c.sentimentWeight AS weight,
+                           c.sentimentUpdatedAt AS updatedAt, s.name AS sector, s.sentimentSum AS sectorSum,
+                           s.sentimentWeight AS sectorWeight, s.sentimentUpdatedAt AS sectorUpdatedAt
+                """, {'tickers': list(tickers)})
+                rows = [record.data() for record in result]
+        except Exception as e:
+            Notifier.log(f"Sentiment rollup lookup failed: {e}")
+            return {}
+        
+        now = time.time()
+        half_life = SENTIMENT_HALF_LIFE_DAYS * 86400
+        def rollup(total, weight, updated_at):
+            if not weight:
+                return None
+            return {
+                'score': round(total / weight, 3),
+                'label': Sentiment.label(total / weight),
+                'weight': round(weight * 0.5 ** (max(0.0, now - (updated_at or now)) / half_life), 2)
+            }
+        
+        rollups = {'companies': {}, 'sectors': {}}
+        for row in rows:
+            company = rollup(row['sum'], row['weight'], row['updatedAt'])
+            if company:
+                rollups['companies'][row['ticker']] = company
+            sector = rollup(row['sectorSum'], row['sectorWeight'], row['sectorUpdatedAt'])
+            if row['sector'] and sector:
+                rollups['sectors'][row['sector']] = sector
+        return rollups
+    
+    @staticmethod
+    def describe_company(ticker: str, name: str, sector: str, price) -> str:
+        return f"{name} ({ticker}) operates in {sector} sector, trading at ${price}"
     
     def query_company_context(self, ticker: str) -> str:
         if not self.driver:
             return ""
         
         try:
-            with self.driver.session() as session:
+            with self._session() as session:
                 result = session.run("""
                     MATCH (c:Company {ticker: $ticker})
                     OPTIONAL MATCH (c)-[:BELONGS_TO]->(s:Sector)
@@ -175,17 +603,96 @@ class FinancialKnowledgeGraph:
                 
                 record = result.single()
                 if record:
-                    return f"{record['company']} ({ticker}) operates in {record['sector']} sector, trading at ${record['price']}"
+                    return self.describe_company(ticker, record['company'], record['sector'], record['price'])
                 return ""
         except:
             return ""
     
+    #Pages through article nodes with the tickers they mention, ordered by id so paging is stable
+    def iter_articles(self, batch_size: int = 1000):
+        if not self.driver:
+            return
+        last_id = ""
+        while True:
+            with self._session() as session:
+                result = session.run("""
+                    MATCH (a:NewsArticle)
+                    WHERE a.id > $last_id
+                    WITH a ORDER BY a.id LIMIT $limit
+                    OPTIONAL MATCH (a)-[:MENTIONS]->(c:Company)
+                    RETURN a.id as id, a.url as url, a.publishedAt as publishedAt,
+                           coalesce(a.ingestedAt, a.coMentionedAt, a.sentimentRolledAt) as ingestedAt,
+                           collect(c.ticker) as tickers
+                    ORDER BY id
+                """, {'last_id': last_id, 'limit': batch_size})
+                page = [record.data() for record in result]
+            if not page:
+                return
+            yield page
+            if len(page) < batch_size:
+                return
+            last_id = page[-1]['id']
+    
+    #Related companies ranked by decayed co-mention weight, then sector membership and PageRank; cached per ticker set
+    def expand_neighborhood(self, tickers: list[str], limit: int = 5) -> list[dict]:
+        if not tickers or not self.driver:
+            return []
+        
+        key = (frozenset(tickers), limit)
+        now = time.time()
+        with self._neighborhood_lock:
+            cached = self._neighborhood_cache.get(key)
+            if cached and now - cached[0] <= NEIGHBORHOOD_CACHE_TTL:
+                self._neighborhood_cache.move_to_end(key)
+                Metrics.count("neighborhood_cache_hits")
+                return cached[1]
+        
+        try:
+            with Metrics.span("graph_expansion", tickers=len(tickers)):
+                with self._session() as session:
+                    result = session.run(NEIGHBORHOOD_QUERY, {
+                        'tickers': list(tickers),
+                        'per_relation': limit * 4,
+                        'sector_weight': SECTOR_PEER_WEIGHT,
+                        'now': now,
+                        'half_life': CO_MENTION_HALF_LIFE_DAYS * 86400
+                    })
+                    rows = [record.data() for record in result]
+        except Exception as e:
+            Notifier.log(f"Graph expansion failed: {e}")
+            return []
+        
+        related = {}
+        for row in rows:
+            entry = related.setdefault(row['ticker'], {
+                'ticker': row['ticker'],
+                'name': row.get('name') or row['ticker'],
+                'score': 0.0,
+                'sectors': [],
+                'co_mentions': {}
+            })
+            entry['pagerank'] = row.get('pagerank') or 0.0
+            if row['relation'] == 'sector_peer':
+                if row['via'] not in entry['sectors']:
+                    entry['sectors'].append(row['via'])
+                    entry['score'] += row['weight']
+            else:
+                entry['co_mentions'][row['via']] = round(row['strength'], 2)
+                entry['score'] += row['weight']
+        neighborhood = sorted(related.values(), key=lambda e: (e['score'], e['pagerank']), reverse=True)[:limit]
+        
+        with self._neighborhood_lock:
+            self._neighborhood_cache[key] = (now, neighborhood)
+            while len(self._neighborhood_cache) > NEIGHBORHOOD_CACHE_SIZE:
+                self._neighborhood_cache.popitem(last=False)
+        return neighborhood
+    
     def get_graph_stats(self) -> dict:
         if not self.driver:
             return {"companies": 0, "sectors": 0, "articles": 0, "status": "Neo4j not connected"}
         
         try:
-            with self.driver.session() as session:
+            with self._session() as session:
                 companies_result = session.run("MATCH (c:Company) RETURN count(c) as count")
                 companies = companies_result.single()['count']
                 
@@ -216,60 +723,29 @@ class FinancialKnowledgeGraph:
         except Exception as e:
             return {"companies": 0, "sectors": 0, "articles": 0, "status": f"Error: {e}"}
     
+    #Delegates to GraphMaintenance, which deletes in small throttled transactions instead of one pass per kind
     def cleanup_graph(self) -> dict:
-        if not self.driver:
-            return {"removed": 0, "error": "Neo4j not connected"}
-        
+        from GraphMaintenance import GraphMaintenance
         try:
-            removed_count = 0
-            
-            with self.driver.session() as session:
-                result = session.run("""
-                    MATCH (c:Company) 
-                    WHERE c.name IS NULL OR c.name = ''
-                    DETACH DELETE c
-                    RETURN count(c) as removed
-                """)
-                incomplete_removed = result.single()['removed']
-                removed_count += incomplete_removed
-                
-                result = session.run("""
-                    MATCH (c:Company)
-                    WITH c.ticker as ticker, collect(c) as companies
-                    WHERE size(companies) > 1
-                    UNWIND companies[1..] as duplicateCompany
-                    DETACH DELETE duplicateCompany
-                    RETURN count(duplicateCompany) as removed
-                """)
-                duplicate_removed = result.single()['removed']
-                removed_count += duplicate_removed
-                
-                result = session.run("""
-                    MATCH (s:StockData)
-                    WHERE NOT (s)<-[:HAS_PERFORMANCE]-()
-                    DELETE s
-                    RETURN count(s) as removed
-                """)
-                orphan_removed = result.single()['removed']
-                removed_count += orphan_removed
-            
-            return {
-                "removed": removed_count,
-                "incomplete_removed": incomplete_removed,
-                "duplicate_removed": duplicate_removed,
-                "orphan_removed": orphan_removed,
-                "status": "Success"
-            }
-            
+            summary = GraphMaintenance(self).cleanup()
         except Exception as e:
             return {"removed": 0, "error": str(e)}
+        if "error" in summary:
+            return summary
+        return {
+            "removed": summary["removed"],
+            "incomplete_removed": summary["incomplete_companies_removed"],
+            "duplicate_removed": summary["duplicate_companies_removed"],
+            "orphan_removed": summary["orphan_stock_data_removed"],
+            "status": "Success"
+        }
     
     def list_all_companies(self) -> list:
         if not self.driver:
             return []
         
         try:
-            with self.driver.session() as session:
+            with self._session() as session:
                 result = session.run("""
                     MATCH (c:Company)
                     OPTIONAL MATCH (c)-[:BELONGS_TO]->(s:Sector)
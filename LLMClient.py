@@ -0,0 +1,194 @@
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from LazyLoader import lazy_import
+from Config import get_setting
+from QueryDeadline import DeadlineExceeded
+import QueryDeadline
+import Metrics
+
+openai = lazy_import("openai")
+
+#Seconds allowed per attempt; the whole call, retries included, gets half as much again, cut short by an explicit or active query deadline
+LLM_TIMEOUTS = {
+    'extraction': 10.0,
+    'search_terms': 8.0,
+    'embedding': 10.0,
+    'generation': 45.0
+}
+DEFAULT_TIMEOUT = 20.0
+
+RETRYABLE_ERRORS = {'APITimeoutError', 'APIConnectionError', 'RateLimitError', 'InternalServerError', 'TimeoutError'}
+
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+#Retries are done by ResilientOpenAI, so the SDK's own retry loop is switched off
+def create_client(api_key: str = None):
+    return openai.OpenAI(api_key=api_key, max_retries=0)
+
+def is_retryable(error: Exception) -> bool:
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    status = getattr(error, 'status_code', None)
+    return status is not None and (status == 429 or status >= 500)
+
+#Tolerates code fences and prose around the object before giving up on a paid-for response
+def parse_json(content: str):
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError("empty model response")
+    try:
+        return json.loads(content)
+    except ValueError:
+        pass
+    match = re.search(r"(\{.*\}|\[.*\])", content, re.DOTALL)
+    if match:
+        return json.loads(match.group(1))
+    raise ValueError(f"model response is not JSON: {content[:80]!r}")
+
+#Opens after consecutive upstream failures so callers fail fast, lets one trial call through after reset_timeout
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+#One breaker per upstream, shared by every client in the process
+def get_breaker(name: str = "openai") -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker()
+        return _breakers[name]
+
+#Wraps an OpenAI client with per-call deadlines, jittered retries, optional hedging and a circuit breaker
+class ResilientOpenAI:
+    def __init__(self, client, max_retries: int = 2, backoff: float = 0.5, max_backoff: float = 4.0,
+                 hedge_after: float = None, breaker: CircuitBreaker = None):
+        self.client = client
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        if hedge_after is None:
+            hedge_after = float(get_setting("OPENAI_HEDGE_AFTER", 0) or 0)
+        self.hedge_after = hedge_after
+        self.breaker = breaker or get_breaker()
+
+    def chat(self, kind: str, timeout: float = None, deadline: float = None, hedge: bool = False, **kwargs):
+        response = self._call(kind, self.client.chat.completions.create, kwargs, timeout, deadline, hedge)
+        Metrics.record_llm(response, kind)
+        return response
+
+    #JSON mode plus parsing, raises ValueError only if the model still returned something unparseable
+    def chat_json(self, kind: str, **kwargs):
+        response = self.chat(kind, response_format={"type": "json_object"}, **kwargs)
+        try:
+            return parse_json(response.choices[0].message.content)
+        except ValueError:
+            Metrics.count("llm_json_errors")
+            raise
+
+    def embed(self, timeout: float = None, deadline: float = None, hedge: bool = False, **kwargs):
+        response = self._call("embedding", self.client.embeddings.create, kwargs, timeout, deadline, hedge)
+        Metrics.record_llm(response, "embedding")
+        return response
+
+    def _call(self, kind: str, create, kwargs: dict, timeout: float, deadline: float, hedge: bool):
+        timeout = timeout or LLM_TIMEOUTS.get(kind, DEFAULT_TIMEOUT)
+        if deadline is None:
+            deadline = time.monotonic() + timeout * 1.5
+            query_deadline = QueryDeadline.gather_until()
+            if query_deadline is not None:
+                deadline = min(deadline, query_deadline)
+        attempt = 0
+        while True:
+            #Checked before allow(), which would otherwise hold the half-open trial slot for a call that never runs
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{kind} call ran out of time")
+            if not self.breaker.allow():
+                Metrics.count("llm_circuit_open")
+                raise CircuitOpenError(f"OpenAI circuit open, skipping {kind} call")
+            try:
+                response = self._hedged(create, kwargs, min(timeout, remaining), hedge)
+            except Exception as e:
+                if not is_retryable(e):
+                    #A rejected request still proves the service is answering
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                attempt += 1
+                #Full jitter keeps concurrent queries from retrying in lockstep
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                Metrics.count("llm_retries")
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return response
+
+    #Sends a duplicate request when the first is slower than hedge_after, whichever answers first wins
+    def _hedged(self, create, kwargs: dict, timeout: float, hedge: bool):
+        if not hedge or not self.hedge_after or self.hedge_after >= timeout:
+            return create(timeout=timeout, **kwargs)
+        started = time.monotonic()
+        primary = _hedge_pool.submit(Metrics.bind(create), timeout=timeout, **kwargs)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        Metrics.count("llm_hedges")
+        backup = _hedge_pool.submit(Metrics.bind(create), timeout=max(0.1, timeout - (time.monotonic() - started)), **kwargs)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is backup:
+                    Metrics.count("llm_hedge_wins")
+                return result
+        raise error
@@ -0,0 +1,39 @@
+import importlib
+import importlib.util
+import sys
+
+#Stand-in for an optional module that is not installed, fails only when it is actually used
+class _MissingModule:
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        raise ImportError(f"Optional dependency '{self._name}' is not installed")
+
+    def __bool__(self):
+        return False
+
+#Returns a module object whose body only executes on first attribute access
+def lazy_import(name: str):
+    if name in sys.modules:
+        return sys.modules[name]
+
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None or spec.loader is None:
+        return _MissingModule(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def is_loaded(name: str) -> bool:
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    return type(module).__name__ != '_LazyModule'
@@ -0,0 +1,227 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_metrics = contextvars.ContextVar("query_metrics", default=None)
+_current_span = contextvars.ContextVar("query_span", default=None)
+
+def _span_id() -> str:
+    return os.urandom(8).hex()
+
+#Process-wide counters and stage histograms exposed in Prometheus text format
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.histograms = {}
+
+    def count(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = {'buckets': [0] * len(STAGE_BUCKETS), 'sum': 0.0, 'count': 0}
+                self.histograms[stage] = histogram
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP financial_upstream_calls_total Calls and units consumed from upstream services.",
+                "# TYPE financial_upstream_calls_total counter"
+            ]
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'financial_upstream_calls_total{{kind="{name}"}} {value}')
+            lines.append("# HELP financial_stage_seconds Time spent in each query pipeline stage.")
+            lines.append("# TYPE financial_stage_seconds histogram")
+            for stage, histogram in sorted(self.histograms.items()):
+                for bound, bucket in zip(STAGE_BUCKETS, histogram['buckets']):
+                    lines.append(f'financial_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {bucket}')
+                lines.append(f'financial_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'financial_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+                lines.append(f'financial_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+            return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+#Spans and upstream call counters for a single process_user_query call
+class QueryMetrics:
+    def __init__(self, name: str = "process_user_query"):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._stage = None
+
+    def count(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def begin(self, name: str, **attributes) -> dict:
+        parent = _current_span.get()
+        span = {
+            'name': name,
+            'span_id': _span_id(),
+            'parent_id': parent['span_id'] if parent and parent.get('trace_id') == self.trace_id else None,
+            'trace_id': self.trace_id,
+            'start': time.time(),
+            'perf_start': time.perf_counter(),
+            'end': None,
+            'duration': None,
+            'attributes': attributes,
+            'status': 'OK'
+        }
+        span['token'] = _current_span.set(span)
+        return span
+
+    def end(self, span: dict, error: Exception = None):
+        span['duration'] = time.perf_counter() - span.pop('perf_start')
+        span['end'] = span['start'] + span['duration']
+        if error is not None:
+            span['status'] = 'ERROR'
+            span['attributes']['error'] = f"{type(error).__name__}: {error}"
+        try:
+            _current_span.reset(span.pop('token'))
+        except ValueError:
+            _current_span.set(None)
+        with self._lock:
+            self.spans.append(span)
+        REGISTRY.observe(span['name'], span['duration'])
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        span = self.begin(name, **attributes)
+        try:
+            yield span
+        except Exception as e:
+            self.end(span, e)
+            raise
+        else:
+            self.end(span)
+
+    #Closes the running pipeline stage and opens the next one, None just closes it
+    def stage(self, name: str = None):
+        if self._stage is not None:
+            self.end(self._stage)
+            self._stage = None
+        if name is not None:
+            self._stage = self.begin(name)
+
+    def timings(self) -> dict:
+        totals = {}
+        for span in self.spans:
+            totals[span['name']] = round(totals.get(span['name'], 0) + span['duration'], 4)
+        return totals
+
+    def to_otel_spans(self) -> list[dict]:
+        spans = []
+        for span in sorted(self.spans, key=lambda s: s['start']):
+            spans.append({
+                'traceId': span['trace_id'],
+                'spanId': span['span_id'],
+                'parentSpanId': span['parent_id'] or "",
+                'name': span['name'],
+                'kind': 'SPAN_KIND_INTERNAL',
+                'startTimeUnixNano': int(span['start'] * 1e9),
+                'endTimeUnixNano': int(span['end'] * 1e9),
+                'attributes': [{'key': k, 'value': {'stringValue': str(v)}} for k, v in span['attributes'].items()],
+                'status': {'code': 'STATUS_CODE_ERROR' if span['status'] == 'ERROR' else 'STATUS_CODE_OK'}
+            })
+        return spans
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'financial_query_upstream_calls{{kind="{name}",trace_id="{self.trace_id}"}} {value}')
+        for stage, seconds in sorted(self.timings().items()):
+            lines.append(f'financial_query_stage_seconds{{stage="{stage}",trace_id="{self.trace_id}"}} {seconds}')
+        return "\n".join(lines) + "\n"
+
+@contextmanager
+def activate(metrics: QueryMetrics):
+    token = _current_metrics.set(metrics)
+    span_token = _current_span.set(None)
+    try:
+        yield metrics
+    finally:
+        _current_span.reset(span_token)
+        _current_metrics.reset(token)
+
+def current() -> QueryMetrics:
+    return _current_metrics.get()
+
+#Counts an upstream call against the active query (if any) and the process registry
+def count(name: str, amount: float = 1):
+    REGISTRY.count(name, amount)
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.count(name, amount)
+
+#Times a block as a child span of the active query, or only into the registry outside a query
+@contextmanager
+def span(name: str, **attributes):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        started = time.perf_counter()
+        try:
+            yield None
+        finally:
+            REGISTRY.observe(name, time.perf_counter() - started)
+        return
+    with metrics.span(name, **attributes) as active:
+        yield active
+
+#Records call count and token usage from an OpenAI response
+def record_llm(response, kind: str):
+    count(f"llm_{kind}_calls")
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    count("llm_prompt_tokens", getattr(usage, 'prompt_tokens', 0) or 0)
+    count("llm_completion_tokens", getattr(usage, 'completion_tokens', 0) or 0)
+
+#Carries the active query context into worker threads
+def bind(fn):
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+#Serves the process registry on /metrics for a Prometheus scraper
+def serve_metrics(port: int = 9108, host: str = "0.0.0.0"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,343 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from LazyLoader import lazy_import
+from Embeddings import normalize, quantize_int8, score_int8
+from VectorDB import VectorStore
+import Notifier
+import Metrics
+
+np = lazy_import("numpy")
+
+SEARCH_BLOCK_ROWS = 65536
+
+#Exact-search vector store: normalized float32 rows in an append-only memory-mapped file, records in a SQLite side table
+#-int8 profiles add per-row int8 codes and scales in two more append-only files; search scans the codes and only
+#reads the float32 rows of the oversampled candidates
+class MmapVectorDatabase(VectorStore):
+    def __init__(self, openai_key: str = None, persist_path: str = "./vector_store", collection_name: str = "financial_news",
+                 profile=None):
+        super().__init__(openai_key, profile)
+        self.persist_path = persist_path
+        self.collection_name = collection_name + self.profile.collection_suffix
+        self.dimensions = self.profile.dimensions
+        self.row_bytes = self.dimensions * 4
+        os.makedirs(persist_path, exist_ok=True)
+        self.vectors_path = os.path.join(persist_path, f"{self.collection_name}.f32")
+        self.records_path = os.path.join(persist_path, f"{self.collection_name}.sqlite")
+        self.lock_path = os.path.join(persist_path, f"{self.collection_name}.lock")
+        self.quantized = self.profile.quantize
+        self.codes_path = os.path.join(persist_path, f"{self.collection_name}.i8")
+        self.scales_path = os.path.join(persist_path, f"{self.collection_name}.scales")
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.records_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                url TEXT,
+                document TEXT,
+                metadata TEXT,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS records_url ON records(url);
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._check_dimensions()
+        self._recover_compaction()
+
+        self._vectors = None
+        self._file_id = None
+        self._data_version = None
+        self._rows = 0
+        self._deleted = None
+        self._codes = None
+        self._scales = None
+        if self.quantized:
+            with self._write_lock():
+                self._sync_codes(self._committed_rows())
+        self._refresh(force=True)
+
+    def _check_dimensions(self):
+        row = self._db.execute("SELECT value FROM info WHERE key = 'dimensions'").fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO info VALUES ('dimensions', ?)", (str(self.dimensions),))
+        elif int(row[0]) != self.dimensions:
+            raise ValueError(f"{self.records_path} holds {row[0]}-dimension vectors, profile expects {self.dimensions}")
+
+    #Serializes writers across threads and processes sharing the same files
+    @contextmanager
+    def _write_lock(self):
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    #One connection is shared by every thread using this instance
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _committed_rows(self) -> int:
+        return self._query("SELECT COALESCE(MAX(row) + 1, 0) FROM records")[0][0]
+
+    @staticmethod
+    def _stat_id(path: str):
+        try:
+            stat = os.stat(path)
+            return (stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _code_rows(self) -> int:
+        codes, scales = self._stat_id(self.codes_path), self._stat_id(self.scales_path)
+        if codes is None or scales is None:
+            return 0
+        return min(codes[1] // self.dimensions, scales[1] // 4)
+
+    #Brings the code files to exactly rows rows, quantizing missing ones from the vector file; caller holds the write lock
+    #Covers stores written before the profile was quantized and bytes left by a write that never committed
+    def _sync_codes(self, rows: int, batch_size: int = SEARCH_BLOCK_ROWS // 16):
+        have = min(self._code_rows(), rows)
+        with open(self.codes_path, "ab") as codes_file, open(self.scales_path, "ab") as scales_file:
+            codes_file.truncate(have * self.dimensions)
+            scales_file.truncate(have * 4)
+            if have < rows:
+                vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+                for start in range(have, rows, batch_size):
+                    codes, scales = quantize_int8(vectors[start:min(start + batch_size, rows)])
+                    codes_file.write(codes.tobytes())
+                    scales_file.write(scales.tobytes())
+                Notifier.info(f"Quantized {rows - have} rows of {self.collection_name}")
+            codes_file.flush()
+            scales_file.flush()
+            os.fsync(codes_file.fileno())
+            os.fsync(scales_file.fileno())
+
+    #Re-maps the files only when this or another process changed them, otherwise free
+    def _refresh(self, force: bool = False):
+        with self._lock:
+            data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            file_id = self._stat_id(self.vectors_path)
+            if self.quantized:
+                file_id = (file_id, self._stat_id(self.codes_path), self._stat_id(self.scales_path))
+            if not force and data_version == self._data_version and file_id == self._file_id:
+                return
+            vectors_id = file_id[0] if self.quantized else file_id
+            rows = self._committed_rows()
+            if vectors_id is None or rows == 0:
+                rows = 0
+                self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+            else:
+                rows = min(rows, vectors_id[1] // self.row_bytes)
+                self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+            if self.quantized:
+                #Rows another process has not quantized yet are scored exactly from the float32 file
+                code_rows = min(rows, self._code_rows())
+                if code_rows:
+                    self._codes = np.memmap(self.codes_path, dtype=np.int8, mode="r", shape=(code_rows, self.dimensions))
+                    self._scales = np.memmap(self.scales_path, dtype=np.float32, mode="r", shape=(code_rows,))
+                else:
+                    self._codes = np.zeros((0, self.dimensions), dtype=np.int8)
+                    self._scales = np.zeros(0, dtype=np.float32)
+            self._rows = rows
+            self._deleted = np.zeros(rows, dtype=bool)
+            for (row,) in self._db.execute("SELECT row FROM records WHERE deleted = 1 AND row < ?", (rows,)):
+                self._deleted[row] = True
+            self._data_version = data_version
+            self._file_id = file_id
+
+    def count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM records WHERE deleted = 0")[0][0]
+
+    def _existing_urls(self, urls: list[str]) -> set:
+        existing = set()
+        for start in range(0, len(urls), 500):
+            batch = urls[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            existing.update(url for (url,) in self._query(
+                f"SELECT url FROM records WHERE deleted = 0 AND url IN ({placeholders})", batch))
+        return existing
+
+    #Vectors are appended and synced before their records commit, so a crash only leaves unreferenced bytes
+    def _write(self, ids: list[str], documents: list[str], embeddings, metadatas: list[dict]):
+        vectors = normalize(embeddings)
+        with self._write_lock():
+            placeholders = ",".join("?" * len(ids))
+            taken = {id_ for (id_,) in self._query(f"SELECT id FROM records WHERE id IN ({placeholders})", ids)}
+            keep = [i for i, id_ in enumerate(ids) if id_ not in taken and id_ not in ids[:i]]
+            if not keep:
+                return
+            first_row = self._committed_rows()
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(first_row * self.row_bytes)
+                f.write(np.ascontiguousarray(vectors[keep], dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            if self.quantized:
+                self._sync_codes(first_row + len(keep))
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT INTO records (row, id, url, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (first_row + n, ids[i], metadatas[i].get('url', ''), documents[i], json.dumps(metadatas[i]))
+                        for n, i in enumerate(keep)
+                    ]
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        self._refresh(force=True)
+
+    def _fetch(self, rows: list[int]) -> dict:
+        placeholders = ",".join("?" * len(rows))
+        return {
+            row: (id_, document, json.loads(metadata))
+            for row, id_, document, metadata in self._query(
+                f"SELECT row, id, document, metadata FROM records WHERE row IN ({placeholders})", rows)
+        }
+
+    #Exact top-k: one matrix-vector product per block of rows over the mapped file
+    def search(self, query: str, n_results: int = 5, query_embedding: list[float] = None) -> list[dict]:
+        try:
+            if query_embedding is None:
+                query_embedding = self.get_embeddings([query])[0]
+
+            with Metrics.span("vector_query", n_results=n_results, backend="mmap", quantized=self.quantized):
+                self._refresh()
+                with self._lock:
+                    vectors, deleted, rows = self._vectors, self._deleted, self._rows
+                    codes, scales = self._codes, self._scales
+                live = rows - int(deleted.sum())
+                if live <= 0:
+                    return []
+                query_vector = normalize(query_embedding)
+                scores = np.empty(rows, dtype=np.float32)
+                code_rows = len(codes) if self.quantized else 0
+                if code_rows:
+                    score_int8(codes, scales, query_vector, out=scores[:code_rows])
+                for start in range(code_rows, rows, SEARCH_BLOCK_ROWS):
+                    end = min(start + SEARCH_BLOCK_ROWS, rows)
+                    np.dot(vectors[start:end], query_vector, out=scores[start:end])
+                scores[deleted] = -np.inf
+                k = min(n_results, live)
+                if code_rows:
+                    #Exact float32 scores for the oversampled int8 candidates decide the final order
+                    candidates = np.argpartition(-scores, min(k * self.profile.oversample, live) - 1)[:k * self.profile.oversample]
+                    candidates = np.sort(candidates[np.isfinite(scores[candidates])])
+                    scores[candidates] = vectors[candidates] @ query_vector
+                    k = min(k, len(candidates))
+                    top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+                else:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                records = self._fetch([int(row) for row in top])
+
+            formatted_results = []
+            for row in top:
+                record = records.get(int(row))
+                if record is None:
+                    continue
+                id_, document, metadata = record
+                formatted_results.append({
+                    'content': document,
+                    'metadata': metadata,
+                    'similarity_score': float(scores[row]),
+                    'id': id_
+                })
+            return formatted_results
+        except Exception as e:
+            Notifier.error(f"Search error: {e}")
+            return []
+
+    def iter_records(self, batch_size: int = 1000, include: list[str] = None):
+        include = include or ["metadatas"]
+        self._refresh()
+        last_row = -1
+        while True:
+            page_rows = self._query(
+                "SELECT row, id, document, metadata FROM records WHERE deleted = 0 AND row > ? ORDER BY row LIMIT ?",
+                (last_row, batch_size)
+            )
+            if not page_rows:
+                return
+            page = {'ids': [r[1] for r in page_rows]}
+            if "documents" in include:
+                page['documents'] = [r[2] for r in page_rows]
+            if "metadatas" in include:
+                page['metadatas'] = [json.loads(r[3]) for r in page_rows]
+            if "embeddings" in include:
+                page['embeddings'] = np.array(self._vectors[[r[0] for r in page_rows]])
+            yield page
+            if len(page_rows) < batch_size:
+                return
+            last_row = page_rows[-1][0]
+
+    #Deleted rows are only masked; compact() reclaims their space
+    def delete_ids(self, ids: list[str], batch_size: int = 500) -> int:
+        deleted = 0
+        with self._write_lock():
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                placeholders = ",".join("?" * len(batch))
+                cursor = self._db.execute(
+                    f"UPDATE records SET deleted = 1 WHERE deleted = 0 AND id IN ({placeholders})", batch)
+                deleted += cursor.rowcount
+        self._refresh(force=True)
+        return deleted
+
+    def _recover_compaction(self):
+        row = self._db.execute("SELECT value FROM info WHERE key = 'compacting'").fetchone()
+        if row is None:
+            return
+        for path in (self.vectors_path, self.codes_path, self.scales_path):
+            if os.path.exists(f"{path}.compact"):
+                os.replace(f"{path}.compact", path)
+        self._db.execute("DELETE FROM info WHERE key = 'compacting'")
+        Notifier.warning(f"Finished an interrupted compaction of {self.collection_name}")
+
+    #Rewrites the vector (and code) files without deleted rows and renumbers the records to match
+    def compact(self, batch_size: int = 1000) -> dict:
+        started = time.time()
+        with self._write_lock():
+            if self.quantized:
+                self._sync_codes(self._committed_rows())
+            self._refresh(force=True)
+            files = [(self.vectors_path, self._vectors)]
+            if self.quantized:
+                files += [(self.codes_path, self._codes), (self.scales_path, self._scales)]
+            live_rows = [row for (row,) in self._db.execute("SELECT row FROM records WHERE deleted = 0 ORDER BY row")]
+            for path, source in files:
+                with open(f"{path}.compact", "wb") as f:
+                    for start in range(0, len(live_rows), batch_size):
+                        f.write(np.ascontiguousarray(source[live_rows[start:start + batch_size]]).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM records WHERE deleted = 1")
+                #Ascending order never collides, every slot below a live row is already free
+                self._db.executemany("UPDATE records SET row = ? WHERE row = ?",
+                                     [(new, old) for new, old in enumerate(live_rows) if new != old])
+                self._db.execute("INSERT OR REPLACE INTO info VALUES ('compacting', '1')")
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                for path, _ in files:
+                    os.remove(f"{path}.compact")
+                raise
+            for path, _ in files:
+                os.replace(f"{path}.compact", path)
+            self._db.execute("DELETE FROM info WHERE key = 'compacting'")
+        self._refresh(force=True)
+        return {"records": len(live_rows), "seconds": round(time.time() - started, 2)}
@@ -0,0 +1,341 @@
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from LazyLoader import lazy_import
+from Article import Article
+from Embeddings import truncate
+from Config import get_setting
+import Notifier
+import Metrics
+
+np = lazy_import("numpy")
+pyarrow = lazy_import("pyarrow")
+
+DEFAULT_ARCHIVE_PATH = "news_archive"
+ROW_GROUP_SIZE = 10000
+
+#pyarrow submodules cannot be lazy-imported without loading pyarrow itself, so they are pulled in on first use
+def _arrow():
+    import pyarrow.compute
+    import pyarrow.dataset
+    import pyarrow.parquet
+    return pyarrow
+
+def archive_available() -> bool:
+    return bool(pyarrow)
+
+def _schema():
+    pa = _arrow()
+    return pa.schema([
+        ('fingerprint', pa.string()),
+        ('url', pa.string()),
+        ('title', pa.string()),
+        ('description', pa.string()),
+        ('content', pa.string()),
+        ('source', pa.string()),
+        #Publication time, or ingestion time for articles without one, so every row has a time to filter on
+        ('published', pa.timestamp('us', tz='UTC')),
+        ('published_at', pa.string()),
+        ('ingested', pa.timestamp('us', tz='UTC')),
+        ('tickers', pa.list_(pa.string())),
+        ('relevance_score', pa.float32()),
+        ('embedding', pa.list_(pa.float32()))
+    ])
+
+def _partitioning():
+    pa = _arrow()
+    return pa.dataset.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+#Keeps the first row of each fingerprint, so sort newest first beforehand to let the newest copy win
+def _dedupe(table):
+    pa = _arrow()
+    seen = set()
+    keep = []
+    for index, fingerprint in enumerate(table.column('fingerprint').to_pylist()):
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            keep.append(index)
+    if len(keep) == table.num_rows:
+        return table
+    return table.take(pa.array(keep, type=pa.int64()))
+
+#Append-only Parquet copy of every ingested article, partitioned by publication date
+#Files are immutable once renamed into place; date, source and time filters are pushed into the scan
+class NewsArchive:
+    def __init__(self, path: str = None):
+        self.path = path or get_setting("NEWS_ARCHIVE_PATH", DEFAULT_ARCHIVE_PATH)
+
+    #Fingerprints of rows already in the given date partitions; only the fingerprint column of those partitions is read
+    def archived_fingerprints(self, fingerprints: set, dates: set) -> set:
+        if not fingerprints or not dates or not os.path.isdir(self.path):
+            return set()
+        pa = _arrow()
+        field = pa.dataset.field
+        expression = field('date').isin(sorted(dates)) & field('fingerprint').isin(sorted(fingerprints))
+        found = set()
+        for batch in self._dataset().scanner(columns=['fingerprint'], filter=expression).to_batches():
+            found.update(batch.column('fingerprint').to_pylist())
+        return found
+
+    #Writes one new file per date partition touched, sorted by source and time so row-group statistics prune well
+    #Articles already archived under the same fingerprint are skipped, so refetched news is not stored again
+    def append(self, articles: list[Article], mentioned_tickers: list[list[str]], embeddings=None) -> int:
+        if not articles:
+            return 0
+        pa = _arrow()
+        ingested = datetime.now(timezone.utc)
+        articles = [Article.coerce(article) for article in articles]
+        dates = {(article.published or ingested).astimezone(timezone.utc).date().isoformat() for article in articles}
+        known = self.archived_fingerprints({article.fingerprint for article in articles}, dates)
+        partitions = {}
+        for i, (article, tickers) in enumerate(zip(articles, mentioned_tickers)):
+            if article.fingerprint in known:
+                continue
+            known.add(article.fingerprint)
+            published = article.published or ingested
+            vector = embeddings[i] if embeddings is not None else None
+            row = {
+                'fingerprint': article.fingerprint,
+                'url': article.url,
+                'title': article.title,
+                'description': article.description if article.description != article.content else None,
+                'content': article.content,
+                'source': article.source,
+                'published': published,
+                'published_at': article.published_at,
+                'ingested': ingested,
+                'tickers': sorted(set(tickers or [])),
+                'relevance_score': float(article.relevance_score or 0.0),
+                'embedding': np.asarray(vector, dtype=np.float32) if vector is not None and len(vector) else None
+            }
+            partitions.setdefault(published.astimezone(timezone.utc).date().isoformat(), []).append(row)
+
+        skipped = len(articles) - sum(len(rows) for rows in partitions.values())
+        if skipped:
+            Metrics.count("archive_duplicates_skipped", skipped)
+        schema = _schema()
+        written = 0
+        with Metrics.span("archive_write", articles=len(articles)):
+            for date, rows in partitions.items():
+                rows.sort(key=lambda row: (row['source'], row['published']))
+                table = pa.Table.from_pylist(rows, schema=schema)
+                directory = os.path.join(self.path, f"date={date}")
+                os.makedirs(directory, exist_ok=True)
+                name = f"part-{int(time.time() * 1000)}-{os.getpid()}-{uuid.uuid4().hex[:8]}.parquet"
+                #Dot-prefixed files are ignored by dataset discovery, so readers never see a half-written part
+                tmp_path = os.path.join(directory, f".{name}.tmp")
+                pa.parquet.write_table(table, tmp_path, compression='zstd', row_group_size=ROW_GROUP_SIZE)
+                os.replace(tmp_path, os.path.join(directory, name))
+                written += len(rows)
+        Metrics.count("archived_articles", written)
+        return written
+
+    #Small per-batch files pile up in busy partitions; merging them keeps scans from paying per-file overhead
+    #Duplicate fingerprints collapse to the newest ingested copy
+    #The merged file lands before the old parts are removed, readers dedupe the overlap by fingerprint
+    def compact(self, min_files: int = 8) -> dict:
+        pa = _arrow()
+        summary = {'partitions': 0, 'files_merged': 0}
+        if not os.path.isdir(self.path):
+            return summary
+        for entry in sorted(os.listdir(self.path)):
+            directory = os.path.join(self.path, entry)
+            if not entry.startswith("date=") or not os.path.isdir(directory):
+                continue
+            parts = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                           if name.startswith("part-") and name.endswith(".parquet"))
+            if len(parts) < min_files:
+                continue
+            table = pa.concat_tables(pa.parquet.read_table(part, schema=_schema()) for part in parts)
+            table = _dedupe(table.sort_by([('ingested', 'descending')]))
+            table = table.sort_by([('source', 'ascending'), ('published', 'ascending')])
+            name = f"part-{int(time.time() * 1000)}-{os.getpid()}-{uuid.uuid4().hex[:8]}.parquet"
+            tmp_path = os.path.join(directory, f".{name}.tmp")
+            pa.parquet.write_table(table, tmp_path, compression='zstd', row_group_size=ROW_GROUP_SIZE)
+            os.replace(tmp_path, os.path.join(directory, name))
+            for part in parts:
+                os.remove(part)
+            summary['partitions'] += 1
+            summary['files_merged'] += len(parts)
+        return summary
+
+    #Takes a VectorStore.prepare_articles batch after embedding, so archived rows carry their vectors
+    def append_prepared(self, batch: dict) -> int:
+        return self.append(batch['articles'], batch['tickers'], batch.get('embeddings'))
+
+    def _dataset(self):
+        pa = _arrow()
+        return pa.dataset.dataset(self.path, format='parquet', partitioning=_partitioning(), schema=_schema().append(
+            pa.field('date', pa.string())))
+
+    #Date bounds prune whole partitions; time and source bounds are checked against row-group statistics
+    def _filter(self, start: datetime = None, end: datetime = None, sources: list[str] = None):
+        pa = _arrow()
+        field = pa.dataset.field
+        conditions = []
+        if start is not None:
+            conditions.append(field('date') >= start.astimezone(timezone.utc).date().isoformat())
+            conditions.append(field('published') >= pa.scalar(start, type=pa.timestamp('us', tz='UTC')))
+        if end is not None:
+            conditions.append(field('date') <= end.astimezone(timezone.utc).date().isoformat())
+            conditions.append(field('published') < pa.scalar(end, type=pa.timestamp('us', tz='UTC')))
+        if sources:
+            conditions.append(field('source').isin(list(sources)))
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    @staticmethod
+    def _window(days: float = None, start: datetime = None, end: datetime = None) -> tuple:
+        if days is not None and start is None:
+            start = datetime.now(timezone.utc) - timedelta(days=days)
+        if start is not None and start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        if end is not None and end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        return start, end
+
+    #Streams matching record batches; only the requested columns are read
+    #Ticker membership is a list column, so it is applied per batch after the pushed-down filters
+    def scan(self, days: float = None, start: datetime = None, end: datetime = None, tickers: list[str] = None,
+             sources: list[str] = None, columns: list[str] = None, batch_size: int = 65536):
+        if not os.path.isdir(self.path):
+            return
+        pa = _arrow()
+        start, end = self._window(days, start, end)
+        read_columns = None
+        if columns is not None:
+            read_columns = list(columns) + (['tickers'] if tickers and 'tickers' not in columns else [])
+        scanner = self._dataset().scanner(columns=read_columns, filter=self._filter(start, end, sources),
+                                          batch_size=batch_size)
+        wanted = pa.array(sorted({t.upper() for t in tickers})) if tickers else None
+        with Metrics.span("archive_scan"):
+            for batch in scanner.to_batches():
+                if not batch.num_rows:
+                    continue
+                if wanted is not None:
+                    lists = batch.column('tickers')
+                    hits = pa.compute.is_in(pa.compute.list_flatten(lists), value_set=wanted)
+                    rows = np.unique(pa.compute.list_parent_indices(lists).filter(hits).to_numpy())
+                    if not len(rows):
+                        continue
+                    batch = batch.take(pa.array(rows))
+                    if columns is not None and 'tickers' not in columns:
+                        batch = batch.drop_columns(['tickers'])
+                yield batch
+
+    #One row per fingerprint, the newest ingested copy
+    def query(self, **filters):
+        pa = _arrow()
+        columns = filters.pop('columns', None)
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys(list(columns) + ['fingerprint', 'ingested']))
+        batches = list(self.scan(columns=read_columns, **filters))
+        if not batches:
+            schema = _schema() if columns is None else pa.schema([_schema().field(c) for c in columns if c != 'date'])
+            return schema.empty_table()
+        table = _dedupe(pa.Table.from_batches(batches).sort_by([('ingested', 'descending')]))
+        if columns is not None:
+            table = table.select(list(columns))
+        return table
+
+    #Distinct articles per source, ticker or day, e.g. counts('source', tickers=['NVDA'], days=30)
+    def counts(self, by: str = 'source', **filters) -> dict:
+        column = {'ticker': 'tickers', 'day': 'published'}.get(by, by)
+        seen = set()
+        counts = Counter()
+        for batch in self.scan(columns=['fingerprint', column], **filters):
+            fingerprints = batch.column('fingerprint').to_pylist()
+            values = batch.column(column).to_pylist()
+            for fingerprint, value in zip(fingerprints, values):
+                if fingerprint in seen:
+                    continue
+                seen.add(fingerprint)
+                if by == 'ticker':
+                    wanted = {t.upper() for t in filters.get('tickers') or []}
+                    counts.update(t for t in value if not wanted or t in wanted)
+                elif by == 'day':
+                    counts[value.date().isoformat()] += 1
+                else:
+                    counts[value] += 1
+        return dict(counts.most_common())
+
+    #Archived articles as Article records with their tickers and stored vectors, newest duplicate wins
+    def iter_articles(self, batch_size: int = 500, **filters):
+        seen = set()
+        columns = ['fingerprint', 'url', 'title', 'description', 'content', 'source', 'published_at', 'tickers',
+                   'relevance_score', 'embedding']
+        for batch in self.scan(columns=columns, batch_size=batch_size, **filters):
+            articles, tickers, vectors = [], [], []
+            for row in batch.to_pylist():
+                if row['fingerprint'] in seen:
+                    continue
+                seen.add(row['fingerprint'])
+                articles.append(Article(row['title'], row['content'], row['url'], row['published_at'], row['source'],
+                                        row['description'], row['relevance_score'] or 0.0))
+                tickers.append(row['tickers'] or [])
+                vectors.append(row['embedding'])
+            if articles:
+                yield articles, tickers, vectors
+
+    #Rebuilds a vector store from the archive; stored vectors are reused or truncated, only missing or too short ones are embedded
+    def reindex(self, vector_db, batch_size: int = 500, **filters) -> dict:
+        started = time.time()
+        dimensions = vector_db.profile.dimensions
+        summary = {'articles': 0, 'written': 0, 'reembedded': 0}
+        for articles, tickers, vectors in self.iter_articles(batch_size, **filters):
+            summary['articles'] += len(articles)
+            by_fingerprint = {article.fingerprint: vector for article, vector in zip(articles, vectors)}
+            batch = vector_db.prepare_articles(articles, tickers)
+            if not batch['documents']:
+                continue
+            stored = [by_fingerprint.get(article.fingerprint) for article in batch['articles']]
+            missing = [i for i, vector in enumerate(stored) if vector is None or len(vector) < dimensions]
+            if missing:
+                fresh = vector_db.get_embeddings([batch['documents'][i] for i in missing])
+                for i, vector in zip(missing, fresh):
+                    stored[i] = vector
+                summary['reembedded'] += len(missing)
+            batch['embeddings'] = truncate(np.asarray(stored, dtype=np.float32), dimensions)
+            vector_db.write_prepared(batch)
+            summary['written'] += len(batch['ids'])
+        summary['seconds'] = round(time.time() - started, 2)
+        Notifier.info(f"Reindex from archive complete: {summary}")
+        return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the raw news archive or rebuild the vector store from it")
+    parser.add_argument("command", choices=["counts", "articles", "reindex", "compact"])
+    parser.add_argument("--path", help="archive directory, defaults to NEWS_ARCHIVE_PATH or ./news_archive")
+    parser.add_argument("--ticker", action="append", help="only articles mentioning this ticker, repeatable")
+    parser.add_argument("--source", action="append", help="only articles from this source, repeatable")
+    parser.add_argument("--days", type=float, help="only articles published in the last N days")
+    parser.add_argument("--by", default="source", choices=["source", "ticker", "day"], help="grouping for counts")
+    parser.add_argument("--limit", type=int, default=20, help="rows to print for articles")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    archive = NewsArchive(args.path)
+    filters = {'tickers': args.ticker, 'sources': args.source, 'days': args.days}
+    if args.command == "counts":
+        print(json.dumps(archive.counts(args.by, **filters), indent=2))
+    elif args.command == "articles":
+        table = archive.query(columns=['published', 'source', 'title', 'url', 'tickers'], **filters)
+        for row in table.sort_by([('published', 'descending')]).slice(0, args.limit).to_pylist():
+            print(f"{row['published']:%Y-%m-%d %H:%M}  {row['source']:<24}  {', '.join(row['tickers']):<16}  {row['title']}")
+    elif args.command == "compact":
+        print(json.dumps(archive.compact()))
+    else:
+        from VectorDB import open_vector_db
+        archive.reindex(open_vector_db(get_setting("OPENAI_API_KEY")), args.batch_size, **filters)
+
+if __name__ == "__main__":
+    main()
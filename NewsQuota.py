@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from Config import get_setting
+import QueryDeadline
+import Metrics
+
+NEWSAPI_QUOTA_PATH = os.environ.get("NEWSAPI_QUOTA_PATH", "newsapi_quota.sqlite")
+DEFAULT_DAILY_LIMIT = 100
+DEFAULT_REQUESTS_PER_SECOND = 1.0
+#Share of the daily budget that background ingestion may not touch
+DEFAULT_INTERACTIVE_RESERVE = 0.2
+DEFAULT_BACKOFF = 60.0
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+#Daily and per-second NewsAPI budget shared by every process on the host through one SQLite file
+#Interactive callers book the next free slot straight away, background callers only take a slot nobody has booked
+class NewsQuota:
+    def __init__(self, path: str = None, daily_limit: int = None, requests_per_second: float = None,
+                 interactive_reserve: float = None, name: str = "newsapi"):
+        self.path = path or NEWSAPI_QUOTA_PATH
+        self.name = name
+        if daily_limit is None:
+            daily_limit = int(get_setting("NEWSAPI_DAILY_LIMIT", DEFAULT_DAILY_LIMIT))
+        if requests_per_second is None:
+            requests_per_second = float(get_setting("NEWSAPI_REQUESTS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND))
+        if interactive_reserve is None:
+            interactive_reserve = float(get_setting("NEWSAPI_INTERACTIVE_RESERVE", DEFAULT_INTERACTIVE_RESERVE))
+        self.daily_limit = daily_limit
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.interactive_reserve = int(daily_limit * interactive_reserve) if daily_limit > 0 else 0
+        self._local = threading.local()
+        self._ready = False
+        self._init_lock = threading.Lock()
+
+    #One connection per thread; sqlite3 connections cannot be shared across threads
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            #WAL without a sync per commit keeps a booking well under a millisecond; losing the last few on power loss is harmless
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS quota (
+                            name TEXT PRIMARY KEY,
+                            day TEXT NOT NULL,
+                            used INTEGER NOT NULL DEFAULT 0,
+                            next_at REAL NOT NULL DEFAULT 0,
+                            blocked_until REAL NOT NULL DEFAULT 0
+                        )
+                    """)
+                    self._ready = True
+        return connection
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+    #BEGIN IMMEDIATE takes the file's write lock, so the read-modify-write below is atomic across processes
+    def _transaction(self, update):
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT day, used, next_at, blocked_until FROM quota WHERE name = ?", (self.name,)
+            ).fetchone()
+            today = self._today()
+            if row is None or row[0] != today:
+                state = {'day': today, 'used': 0, 'next_at': row[2] if row else 0.0,
+                         'blocked_until': row[3] if row else 0.0}
+            else:
+                state = {'day': row[0], 'used': row[1], 'next_at': row[2], 'blocked_until': row[3]}
+            #Wall-clock time, the schedule is shared between processes
+            result = update(state, time.time())
+            connection.execute(
+                "INSERT OR REPLACE INTO quota (name, day, used, next_at, blocked_until) VALUES (?, ?, ?, ?, ?)",
+                (self.name, state['day'], state['used'], state['next_at'], state['blocked_until'])
+            )
+            connection.execute("COMMIT")
+            return result
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _limit_for(self, priority: str) -> int:
+        if priority == INTERACTIVE:
+            return self.daily_limit
+        return self.daily_limit - self.interactive_reserve
+
+    #Waits for a request slot; False when the day's budget is spent or no slot frees up within timeout
+    #Inside a query the priority is interactive and the wait is capped by the query deadline
+    def acquire(self, priority: str = None, timeout: float = None) -> bool:
+        if priority is None:
+            priority = INTERACTIVE if QueryDeadline.current() is not None else BACKGROUND
+        if timeout is None:
+            timeout = QueryDeadline.remaining()
+        if timeout is None:
+            timeout = 30.0 if priority == BACKGROUND else 10.0
+        give_up_at = time.time() + timeout
+
+        def book(state: dict, now: float):
+            if self.daily_limit > 0 and state['used'] >= self._limit_for(priority):
+                return 'exhausted'
+            slot = max(now, state['next_at'], state['blocked_until'])
+            if slot > give_up_at:
+                return 'timeout'
+            if priority == BACKGROUND and slot > now:
+                return slot
+            state['used'] += 1
+            state['next_at'] = slot + self.interval
+            return ('booked', slot)
+
+        while True:
+            outcome = self._transaction(book)
+            if isinstance(outcome, tuple):
+                wait = outcome[1] - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                Metrics.count(f"newsapi_quota_{priority}")
+                return True
+            if outcome in ('exhausted', 'timeout'):
+                Metrics.count(f"newsapi_quota_{outcome}")
+                return False
+            #A background caller polls for an unbooked slot instead of queueing ahead of queries
+            time.sleep(min(max(outcome - time.time(), 0.01), max(self.interval, 0.05)))
+
+    #Called on a 429: every process backs off, and an exhausted key closes the rest of the day
+    def record_rejection(self, retry_after: float = None, exhausted: bool = False):
+        def update(state: dict, now: float):
+            state['blocked_until'] = max(state['blocked_until'], now + (retry_after or DEFAULT_BACKOFF))
+            if exhausted and self.daily_limit > 0:
+                state['used'] = max(state['used'], self.daily_limit)
+        Metrics.count("newsapi_rejections")
+        self._transaction(update)
+
+    def status(self) -> dict:
+        def read(state: dict, now: float):
+            return dict(state, blocked_for=round(max(0.0, state['blocked_until'] - now), 1))
+        state = self._transaction(read)
+        status = {
+            'day': state['day'],
+            'used': state['used'],
+            'daily_limit': self.daily_limit,
+            'blocked_for': state['blocked_for']
+        }
+        if self.daily_limit > 0:
+            status['remaining'] = max(0, self.daily_limit - state['used'])
+            status['background_remaining'] = max(0, self._limit_for(BACKGROUND) - state['used'])
+        return status
@@ -0,0 +1,50 @@
+import logging
+import sys
+from LazyLoader import is_loaded
+
+logger = logging.getLogger("financial_analysis")
+
+#Returns streamlit only when code is running inside a Streamlit script, never imports it
+def _streamlit():
+    if not is_loaded("streamlit"):
+        return None
+    st = sys.modules["streamlit"]
+    try:
+        if st.runtime.exists():
+            return st
+    except Exception:
+        pass
+    return None
+
+#Status messages go to the Streamlit page when there is one and to logging otherwise
+def info(message: str):
+    st = _streamlit()
+    if st:
+        st.info(message)
+    else:
+        logger.info(message)
+
+def success(message: str):
+    st = _streamlit()
+    if st:
+        st.success(message)
+    else:
+        logger.info(message)
+
+def warning(message: str):
+    st = _streamlit()
+    if st:
+        st.warning(message)
+    else:
+        logger.warning(message)
+
+def error(message: str):
+    st = _streamlit()
+    if st:
+        st.error(message)
+    else:
+        logger.error(message)
+
+#Diagnostics that should never be shown to end users
+def log(message: str):
+    logger.warning(message)
@@ -0,0 +1,130 @@
+import re
+import threading
+import time
+from LazyLoader import lazy_import
+
+np = lazy_import("numpy")
+
+#Words that never distinguish one question from another, everything else has to match exactly
+GENERIC_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'am', 'do', 'does', 'did', 'doing', 'done',
+    'how', 'what', 'whats', "what's", 'why', 'when', 'where', 'which', 'who', 'whom', 'will', 'would', 'should', 'could',
+    'can', 'may', 'might', 'i', 'me', 'my', 'we', 'our', 'you', 'your', 'it', 'its', "it's", 'they', 'their', 'them',
+    'this', 'that', 'these', 'those', 'there', 'here', 'of', 'in', 'on', 'at', 'for', 'to', 'from', 'with', 'about',
+    'by', 'and', 'or', 'vs', 'versus', 'than', 'as', 'so', 'up', 'down', 'over', 'into', 'out', 'right', 'now',
+    'today', 'currently', 'current', 'lately', 'recently', 'recent', 'latest', 'week', 'month', 'year',
+    'tell', 'give', 'show', 'explain', 'describe', 'analyze', 'analyse', 'analysis', 'compare', 'comparison',
+    'stock', 'stocks', 'share', 'shares', 'company', 'companies', 'corp', 'inc', 'performing', 'performance',
+    'perform', 'outlook', 'trend', 'trends', 'trending', 'market', 'markets', 'price', 'prices', 'trading',
+    'valuation', 'earnings', 'news', 'going', 'look', 'looking', 'like', 'any', 'some', 'much', 'many', 'well',
+    'good', 'bad', 'buy', 'sell', 'hold', 'invest', 'investment', 'worth', 'future', 'happening', 'overall',
+    'sector', 'sectors', 'industry', 'please', 'think', 'expect', 'view', 'update', 'status'
+}
+
+WORD = re.compile(r"[a-z0-9][a-z0-9.&'-]*")
+
+def entity_signature(query: str) -> frozenset:
+    return frozenset(w.strip(".'-") for w in WORD.findall(query.lower()) if w.strip(".'-") not in GENERIC_WORDS)
+
+#In-memory semantic cache of whole query results keyed by normalized query embeddings
+class SemanticQueryCache:
+    def __init__(self, threshold: float = 0.92, max_entries: int = 256, fresh_ttl: float = 120,
+                 stable_ttl: float = 1800):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.fresh_ttl = fresh_ttl
+        self.stable_ttl = stable_ttl
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._entries = []
+        self.hits = 0
+        self.misses = 0
+
+    def _normalize(self, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    #Quote data unchanged keeps an entry for stable_ttl, otherwise it is only good for fresh_ttl
+    def _is_fresh(self, entry: dict, quote_lookup, now: float) -> bool:
+        age = now - entry['created']
+        if age <= self.fresh_ttl:
+            return True
+        if age > self.stable_ttl or quote_lookup is None:
+            return False
+        if not entry['quotes']:
+            return False
+        for ticker, price in entry['quotes'].items():
+            current = quote_lookup(ticker)
+            if current is None or current != price:
+                return False
+        return True
+
+    def lookup(self, query: str, embedding, quote_lookup=None):
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+            vector = self._normalize(embedding)
+            if vector.shape[0] != self._matrix.shape[1]:
+                self.misses += 1
+                return None
+            scores = self._matrix @ vector
+            signature = entity_signature(query)
+            now = time.time()
+            for index in np.argsort(-scores)[:5]:
+                score = float(scores[index])
+                if score < self.threshold:
+                    break
+                entry = self._entries[index]
+                if entry['signature'] != signature:
+                    continue
+                if not self._is_fresh(entry, quote_lookup, now):
+                    continue
+                self.hits += 1
+                return dict(entry['result'], cache_hit={
+                    'similarity': round(score, 4),
+                    'age_seconds': round(now - entry['created'], 1),
+                    'original_query': entry['query']
+                })
+            self.misses += 1
+            return None
+
+    def store(self, query: str, embedding, result: dict):
+        quotes = {ticker: data.get('price') for ticker, data in result.get('stock_data', {}).items()}
+        with self._lock:
+            vector = self._normalize(embedding)
+            if not vector.any():
+                return
+            if self._matrix is not None and self._matrix.shape[1] != vector.shape[0]:
+                self._matrix = None
+                self._entries = []
+            entry = {
+                'query': query,
+                'signature': entity_signature(query),
+                'created': time.time(),
+                'quotes': quotes,
+                'result': result
+            }
+            self._entries.append(entry)
+            row = vector[np.newaxis, :]
+            self._matrix = row if self._matrix is None else np.vstack([self._matrix, row])
+            self._evict()
+
+    #Drops expired entries first, then the oldest ones beyond max_entries
+    def _evict(self):
+        now = time.time()
+        keep = [i for i, e in enumerate(self._entries) if now - e['created'] <= self.stable_ttl]
+        if len(keep) > self.max_entries:
+            keep = keep[-self.max_entries:]
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._matrix = self._matrix[keep] if keep else None
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+
+    def stats(self) -> dict:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,138 @@
+import contextvars
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from contextlib import contextmanager
+from Config import get_setting
+import Metrics
+
+DEFAULT_QUERY_DEADLINE = 8.0
+DEFAULT_GENERATION_RESERVE = 3.0
+DEFAULT_GENERATION_TIMEOUT = 60.0
+STAGE_WORKERS = 16
+
+_current_deadline = contextvars.ContextVar("query_deadline", default=None)
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+#Time budget for gathering a query's data, stopping early enough to leave the reserve for generation
+#A budget of 0 or less means no deadline; the answer itself has its own GENERATION_TIMEOUT_SECONDS
+class Deadline:
+    def __init__(self, seconds: float = None, generation_reserve: float = None, generation_timeout: float = None):
+        if seconds is None:
+            seconds = float(get_setting("QUERY_DEADLINE_SECONDS", DEFAULT_QUERY_DEADLINE))
+        if seconds <= 0:
+            seconds = math.inf
+        if generation_reserve is None:
+            generation_reserve = float(get_setting("GENERATION_RESERVE_SECONDS", DEFAULT_GENERATION_RESERVE))
+        if generation_timeout is None:
+            generation_timeout = float(get_setting("GENERATION_TIMEOUT_SECONDS", DEFAULT_GENERATION_TIMEOUT))
+        self.seconds = seconds
+        self.generation_reserve = generation_reserve
+        self.generation_timeout = generation_timeout
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds
+        self.gather_until = self.started + max(0.0, seconds - generation_reserve)
+        self.skipped = []
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def remaining(self) -> float:
+        return max(0.0, self.gather_until - time.monotonic())
+
+    #Timeout argument for futures, which reject an infinite wait
+    def _wait_time(self):
+        left = self.remaining()
+        return None if math.isinf(left) else left
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.gather_until
+
+    #Monotonic deadline for the final LLM call, counted from when generation starts; the budget only shortens gathering
+    def generation_deadline(self) -> float:
+        return time.monotonic() + self.generation_timeout
+
+    def skip(self, stage: str, source=None, reason: str = "deadline"):
+        Metrics.count("deadline_skips")
+        with self._lock:
+            self.skipped.append({'stage': stage, 'source': source, 'reason': reason})
+
+    @contextmanager
+    def activate(self):
+        token = _current_deadline.set(self)
+        try:
+            yield self
+        finally:
+            _current_deadline.reset(token)
+            self.close()
+
+    #Workers belong to this query, so calls it abandoned can never hold up the stages of a later query
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="deadline-stage")
+            return self._pool
+
+    #Drops queued calls; running ones end on their own request timeouts
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    #Runs fn in a worker and stops waiting when the budget runs out; the abandoned call finishes in the background
+    def call(self, stage: str, fn, *args, source=None, default=None, **kwargs):
+        if self.expired():
+            self.skip(stage, source)
+            return default
+        future = self._executor().submit(Metrics.bind(fn), *args, **kwargs)
+        try:
+            return future.result(timeout=self._wait_time())
+        except FutureTimeout:
+            self.skip(stage, source)
+            return default
+
+    #Runs fn over items concurrently and returns {item: result} for those that finished in time
+    def map(self, stage: str, fn, items: list, source=None) -> dict:
+        results = {}
+        if not items:
+            return results
+        if self.expired():
+            for item in items:
+                self.skip(stage, source(item) if source else item)
+            return results
+        pool = self._executor()
+        futures = {pool.submit(Metrics.bind(fn), item): item for item in items}
+        done, pending = wait(futures, timeout=self._wait_time())
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                self.skip(stage, source(futures[future]) if source else futures[future], reason=f"{type(e).__name__}: {e}")
+        for future in pending:
+            self.skip(stage, source(futures[future]) if source else futures[future])
+        return results
+
+def current() -> Deadline:
+    return _current_deadline.get()
+
+#Seconds left for data gathering in the active query, None outside a query or without a deadline
+def remaining() -> float:
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+#Request timeout for a call made inside a stage: the source's own timeout, cut to what is left of the query budget
+def timeout(default: float) -> float:
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("no time left for the request")
+    return min(default, left)
+
+#Absolute monotonic end of data gathering for the active query, for clients that take deadlines
+def gather_until() -> float:
+    deadline = _current_deadline.get()
+    return deadline.gather_until if deadline is not None else None
@@ -0,0 +1,201 @@
+import argparse
+import logging
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from Article import parse_published
+from Config import get_setting
+from GraphMaintenance import GraphMaintenance
+import Notifier
+import Metrics
+
+#Age and size limits for stored articles, None disables a limit
+@dataclass
+class RetentionPolicy:
+    max_age_days: float = 90
+    max_per_ticker: int = 200
+    max_total: int = None
+    compact_ratio: float = 0.2
+
+#Evicts articles from the vector store and the graph together, joined on article url
+class RetentionManager:
+    def __init__(self, vector_db=None, knowledge_graph=None, policy: RetentionPolicy = None, batch_size: int = 500):
+        self.vector_db = vector_db
+        self.knowledge_graph = knowledge_graph
+        self.policy = policy or RetentionPolicy()
+        self.batch_size = batch_size
+
+    #Publication time, else ingestion time, else None: an article of unknown age is never evicted for it
+    @staticmethod
+    def _timestamp(published, ingested) -> float:
+        if isinstance(published, (int, float)) and published > 0:
+            return float(published)
+        published = parse_published(published)
+        if published:
+            return published.timestamp()
+        if isinstance(ingested, (int, float)) and ingested > 0:
+            return float(ingested)
+        return None
+
+    #Folds one store's view of an article into its index entry [published, tickers]; ticker names are interned
+    #so the index costs one float and one shared tuple per article
+    @staticmethod
+    def _merge(index: dict, key: str, timestamp: float, tickers):
+        entry = index.get(key)
+        if entry is None:
+            entry = index[key] = [None, ()]
+        if timestamp is not None:
+            entry[0] = max(entry[0] or 0.0, timestamp)
+        tickers = {sys.intern(t) for t in tickers if t}
+        if tickers - set(entry[1]):
+            entry[1] = tuple(sorted(tickers.union(entry[1])))
+
+    #Streams both stores into a bounded index, key -> [published, tickers], without holding ids or metadata;
+    #returns it with the number of vector records
+    def _collect(self) -> tuple[dict, int]:
+        index = {}
+        vector_total = 0
+
+        if self.vector_db is not None:
+            for page in self.vector_db.iter_records(self.batch_size):
+                for record_id, metadata in zip(page['ids'], page['metadatas']):
+                    metadata = metadata or {}
+                    vector_total += 1
+                    self._merge(index, metadata.get('url') or record_id,
+                                self._timestamp(metadata.get('publishedTs') or metadata.get('publishedAt'),
+                                                metadata.get('ingestedTs')),
+                                (t.strip() for t in metadata.get('tickers', '').split(',')))
+
+        if self.knowledge_graph is not None:
+            for page in self.knowledge_graph.iter_articles(self.batch_size):
+                for article in page:
+                    self._merge(index, article.get('url') or article['id'],
+                                self._timestamp(article.get('publishedAt'), article.get('ingestedAt')),
+                                article.get('tickers', []))
+
+        return index, vector_total
+
+    #Second pass over both stores for the ids behind the evicted keys
+    def _evicted_ids(self, evict: set) -> tuple[list, list]:
+        vector_ids = []
+        graph_ids = []
+        if not evict:
+            return vector_ids, graph_ids
+        if self.vector_db is not None:
+            for page in self.vector_db.iter_records(self.batch_size):
+                for record_id, metadata in zip(page['ids'], page['metadatas']):
+                    if ((metadata or {}).get('url') or record_id) in evict:
+                        vector_ids.append(record_id)
+        if self.knowledge_graph is not None:
+            for page in self.knowledge_graph.iter_articles(self.batch_size):
+                for article in page:
+                    if (article.get('url') or article['id']) in evict:
+                        graph_ids.append(article['id'])
+        return vector_ids, graph_ids
+
+    #An article survives if it is within the age limit and among the newest max_per_ticker for any of its tickers
+    #Articles with no publication or ingestion time cannot be ranked by age, so they are kept and left out of the counts;
+    #untagged articles have no ticker to rank them under, so only the age and total limits apply to them
+    def select_evictions(self, index: dict, now: float = None) -> set:
+        now = now or time.time()
+        policy = self.policy
+        evict = set()
+        dated = {key for key, (published, _) in index.items() if published is not None}
+
+        if policy.max_age_days is not None:
+            cutoff = now - policy.max_age_days * 86400
+            evict.update(key for key in dated if index[key][0] < cutoff)
+
+        live = sorted((key for key in dated if key not in evict), key=lambda k: index[k][0], reverse=True)
+
+        if policy.max_per_ticker is not None:
+            per_ticker = defaultdict(int)
+            keep = set()
+            for key in live:
+                tickers = index[key][1]
+                if not tickers:
+                    keep.add(key)
+                for ticker in tickers:
+                    per_ticker[ticker] += 1
+                    if per_ticker[ticker] <= policy.max_per_ticker:
+                        keep.add(key)
+            evict.update(key for key in live if key not in keep)
+            live = [key for key in live if key in keep]
+
+        if policy.max_total is not None and len(live) > policy.max_total:
+            evict.update(live[policy.max_total:])
+
+        return evict
+
+    def run(self, compact: bool = None, dry_run: bool = False) -> dict:
+        started = time.time()
+        with Metrics.span("retention"):
+            index, vector_total = self._collect()
+            evict = self.select_evictions(index, started)
+            vector_ids, graph_ids = self._evicted_ids(evict)
+
+            summary = {
+                'articles': len(index),
+                'evicted': len(evict),
+                'undated': sum(1 for published, _ in index.values() if published is None),
+                'vector_deleted': 0,
+                'graph_deleted': 0,
+                'compacted': False
+            }
+            del index
+            if dry_run:
+                summary.update(vector_deleted=len(vector_ids), graph_deleted=len(graph_ids))
+                summary['seconds'] = round(time.time() - started, 2)
+                return summary
+
+            if vector_ids:
+                summary['vector_deleted'] = self.vector_db.delete_ids(vector_ids, self.batch_size)
+            if graph_ids:
+                summary['graph_deleted'] = GraphMaintenance(self.knowledge_graph, self.batch_size).delete_articles(graph_ids)
+            Metrics.count("retention_evicted", len(evict))
+
+            if compact is None:
+                compact = vector_total > 0 and summary['vector_deleted'] / vector_total >= self.policy.compact_ratio
+            if compact and self.vector_db is not None:
+                with Metrics.span("compaction"):
+                    summary['compaction'] = self.vector_db.compact(self.batch_size * 2)
+                summary['compacted'] = summary['compaction'].get('rebuilt', True)
+
+        summary['seconds'] = round(time.time() - started, 2)
+        Notifier.info(f"Retention complete: {summary}")
+        return summary
+
+def _optional_limit(value: str):
+    return None if value.lower() in ("none", "off", "0") else float(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Evict old articles from the vector store and graph and compact the index")
+    parser.add_argument("--max-age-days", type=_optional_limit, default=90, help="drop articles older than this, 'none' to disable")
+    parser.add_argument("--max-per-ticker", type=_optional_limit, default=200, help="keep only the newest N articles per ticker")
+    parser.add_argument("--max-total", type=_optional_limit, default=None, help="cap on the total number of articles")
+    parser.add_argument("--compact", action="store_true", help="always compact the vector store after eviction")
+    parser.add_argument("--no-compact", action="store_true", help="never compact the vector store")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be evicted")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    from KG import FinancialKnowledgeGraph
+    from VectorDB import open_vector_db
+
+    policy = RetentionPolicy(
+        max_age_days=args.max_age_days,
+        max_per_ticker=int(args.max_per_ticker) if args.max_per_ticker else None,
+        max_total=int(args.max_total) if args.max_total else None
+    )
+    manager = RetentionManager(
+        vector_db=open_vector_db(get_setting("OPENAI_API_KEY")),
+        knowledge_graph=FinancialKnowledgeGraph(),
+        policy=policy,
+        batch_size=args.batch_size
+    )
+    manager.run(compact=True if args.compact else False if args.no_compact else None, dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    main()
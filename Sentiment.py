@@ -0,0 +1,95 @@
+import re
+from itertools import chain
+from LazyLoader import lazy_import
+
+np = lazy_import("numpy")
+
+#Financial news tone words in the spirit of the Loughran-McDonald lists; strong moves and events weigh double
+POSITIVE = {
+    'beat': 1.5, 'beats': 1.5, 'topped': 1.5, 'tops': 1.0, 'exceeded': 1.5, 'exceeds': 1.5, 'outperform': 1.5,
+    'outperformed': 1.5, 'outperforms': 1.5, 'upgrade': 2.0, 'upgraded': 2.0, 'upgrades': 2.0, 'surge': 2.0,
+    'surged': 2.0, 'surges': 2.0, 'soar': 2.0, 'soared': 2.0, 'soars': 2.0, 'jump': 1.5, 'jumped': 1.5, 'jumps': 1.5,
+    'rally': 1.5, 'rallied': 1.5, 'rallies': 1.5, 'gain': 1.0, 'gained': 1.0, 'gains': 1.0, 'rise': 1.0, 'rose': 1.0,
+    'rises': 1.0, 'climb': 1.0, 'climbed': 1.0, 'climbs': 1.0, 'record': 1.0, 'strong': 1.0, 'stronger': 1.0,
+    'strength': 1.0, 'robust': 1.0, 'growth': 1.0, 'grow': 1.0, 'grew': 1.0, 'growing': 1.0, 'profit': 1.0,
+    'profitable': 1.0, 'profitability': 1.0, 'raised': 1.0, 'raises': 1.0, 'boost': 1.0, 'boosted': 1.0,
+    'boosts': 1.0, 'bullish': 2.0, 'optimistic': 1.5, 'optimism': 1.5, 'upbeat': 1.5, 'positive': 1.0,
+    'improve': 1.0, 'improved': 1.0, 'improves': 1.0, 'improvement': 1.0, 'expand': 1.0, 'expanded': 1.0,
+    'expansion': 1.0, 'success': 1.0, 'successful': 1.0, 'win': 1.0, 'wins': 1.0, 'won': 1.0, 'approval': 1.5,
+    'approved': 1.5, 'breakthrough': 1.5, 'dividend': 0.5, 'buyback': 1.0, 'rebound': 1.0, 'rebounded': 1.0,
+    'recovery': 1.0, 'momentum': 0.5, 'opportunity': 0.5, 'opportunities': 0.5, 'innovative': 0.5, 'buy': 1.0,
+    'overweight': 1.0, 'accelerate': 1.0, 'accelerated': 1.0, 'accelerating': 1.0, 'highs': 1.0, 'upside': 1.0
+}
+
+NEGATIVE = {
+    'miss': 1.5, 'missed': 1.5, 'misses': 1.5, 'downgrade': 2.0, 'downgraded': 2.0, 'downgrades': 2.0,
+    'plunge': 2.0, 'plunged': 2.0, 'plunges': 2.0, 'plummet': 2.0, 'plummeted': 2.0, 'tumble': 1.5,
+    'tumbled': 1.5, 'tumbles': 1.5, 'slump': 1.5, 'slumped': 1.5, 'slumps': 1.5, 'sink': 1.5, 'sank': 1.5,
+    'sinks': 1.5, 'drop': 1.0, 'dropped': 1.0, 'drops': 1.0, 'fall': 1.0, 'fell': 1.0, 'falls': 1.0,
+    'decline': 1.0, 'declined': 1.0, 'declines': 1.0, 'loss': 1.0, 'losses': 1.0, 'lost': 1.0, 'weak': 1.0,
+    'weaker': 1.0, 'weakness': 1.0, 'slowdown': 1.0, 'slowing': 1.0, 'cut': 1.0, 'cuts': 1.0, 'lowered': 1.0,
+    'lowers': 1.0, 'warning': 1.5, 'warns': 1.5, 'warned': 1.5, 'bearish': 2.0, 'pessimistic': 1.5,
+    'concern': 1.0, 'concerns': 1.0, 'worries': 1.0, 'worried': 1.0, 'fears': 1.0, 'risk': 0.5, 'risks': 0.5,
+    'uncertainty': 1.0, 'volatile': 0.5, 'volatility': 0.5, 'lawsuit': 1.5, 'lawsuits': 1.5, 'sued': 1.5,
+    'probe': 1.5, 'investigation': 1.5, 'fine': 0.5, 'fined': 1.5, 'penalty': 1.5, 'recall': 1.5,
+    'recalls': 1.5, 'layoffs': 1.5, 'layoff': 1.5, 'bankruptcy': 2.0, 'bankrupt': 2.0, 'default': 1.5,
+    'fraud': 2.0, 'scandal': 2.0, 'halted': 1.5, 'delay': 1.0, 'delayed': 1.0, 'delays': 1.0, 'shortfall': 1.5,
+    'disappointing': 1.5, 'disappointed': 1.5, 'disappoints': 1.5, 'sell': 1.0, 'underweight': 1.0,
+    'underperform': 1.5, 'underperformed': 1.5, 'downturn': 1.5, 'recession': 1.5, 'headwinds': 1.0,
+    'pressure': 0.5, 'lows': 1.0, 'downside': 1.0, 'selloff': 1.5, 'crash': 2.0, 'crashed': 2.0
+}
+
+LEXICON = {**POSITIVE, **{word: -weight for word, weight in NEGATIVE.items()}}
+NEGATORS = {'not', 'no', 'never', 'without', 'hardly', 'barely', 'cannot', "didn't", "doesn't", "don't", "isn't",
+            "wasn't", "weren't", "aren't", "won't", "couldn't", "failed", 'fails'}
+#A negator flips the tone of lexicon words up to this many tokens after it
+NEGATION_WINDOW = 3
+#Keeps a single tone word from scoring a full +-1
+SMOOTHING = 2.0
+LABEL_THRESHOLD = 0.15
+_TOKEN = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+#Tone of each text in [-1, 1]: (positive - negative) / (positive + negative + SMOOTHING) over lexicon weights
+#Tokens of the whole batch are flattened into one array, so negation and the per-document sums are numpy operations
+def score_texts(texts: list[str]):
+    count = len(texts)
+    token_lists = [_TOKEN.findall(text.lower().replace('’', "'")) for text in texts]
+    lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=count)
+    total = int(lengths.sum()) if count else 0
+    if total == 0:
+        return np.zeros(count, dtype=np.float32)
+
+    tokens = list(chain.from_iterable(token_lists))
+    weights = np.fromiter((LEXICON.get(token, 0.0) for token in tokens), dtype=np.float64, count=total)
+    negators = np.fromiter((token in NEGATORS for token in tokens), dtype=bool, count=total)
+
+    documents = np.repeat(np.arange(count), lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    positions = np.arange(total)
+    #negators_before[i] counts negators ahead of token i, so a window is a difference of two lookups
+    negators_before = np.concatenate(([0], np.cumsum(negators)))
+    window_start = np.maximum(positions - NEGATION_WINDOW, starts)
+    negated = negators_before[positions] - negators_before[window_start] > 0
+    weights = np.where(negated, -weights, weights)
+
+    positive = np.bincount(documents, weights=np.clip(weights, 0.0, None), minlength=count)
+    negative = np.bincount(documents, weights=np.clip(-weights, 0.0, None), minlength=count)
+    return ((positive - negative) / (positive + negative + SMOOTHING)).astype(np.float32)
+
+def score_text(text: str) -> float:
+    return float(score_texts([text])[0])
+
+#Scores every article that has no score yet in one pass
+def score_articles(articles: list) -> list:
+    pending = [article for article in articles if not article.scored]
+    if pending:
+        for article, score in zip(pending, score_texts([article.text for article in pending])):
+            article.sentiment = round(float(score), 4)
+    return articles
+
+def label(score: float) -> str:
+    if score >= LABEL_THRESHOLD:
+        return 'positive'
+    if score <= -LABEL_THRESHOLD:
+        return 'negative'
+    return 'neutral'
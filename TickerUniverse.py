@@ -0,0 +1,284 @@
+import argparse
+import csv
+import difflib
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from Config import get_setting
+
+DEFAULT_UNIVERSE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ticker_universe.csv")
+
+SECTOR_TICKERS = {
+    'Technology': ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'TSLA', 'NVDA', 'CRM', 'ORCL', 'ADBE'],
+    'Banking': ['JPM', 'BAC', 'WFC', 'C', 'GS', 'MS', 'USB', 'PNC', 'TFC', 'COF'],
+    'Financial': ['JPM', 'BAC', 'WFC', 'C', 'GS', 'MS', 'BRK-B', 'V', 'MA', 'AXP'],
+    'Healthcare': ['JNJ', 'PFE', 'UNH', 'ABT', 'TMO', 'DHR', 'BMY', 'ABBV', 'MRK', 'LLY'],
+    'Energy': ['XOM', 'CVX', 'COP', 'EOG', 'SLB', 'PSX', 'VLO', 'MPC', 'OXY', 'KMI'],
+    'Consumer Discretionary': ['AMZN', 'TSLA', 'HD', 'MCD', 'NKE', 'SBUX', 'TJX', 'LOW', 'TGT', 'F'],
+    'Consumer Staples': ['PG', 'KO', 'PEP', 'WMT', 'COST', 'CL', 'KHC', 'GIS', 'K', 'HSY'],
+    'Industrials': ['BA', 'CAT', 'GE', 'MMM', 'HON', 'UPS', 'RTX', 'LMT', 'DE', 'UNP'],
+    'Materials': ['LIN', 'APD', 'SHW', 'ECL', 'FCX', 'NEM', 'DOW', 'DD', 'PPG', 'IFF'],
+    'Communication Services': ['GOOGL', 'META', 'DIS', 'VZ', 'T', 'NFLX', 'CMCSA', 'TMUS', 'CHTR', 'DISH'],
+    'Utilities': ['NEE', 'DUK', 'SO', 'D', 'AEP', 'EXC', 'XEL', 'SRE', 'PEG', 'ED'],
+    'Real Estate': ['AMT', 'PLD', 'CCI', 'EQIX', 'SPG', 'O', 'WELL', 'DLR', 'PSA', 'EQR']
+}
+
+STOCK_GROUPS = {
+    'FAANG': ['META', 'AAPL', 'AMZN', 'NFLX', 'GOOGL'],
+    'Magnificent 7': ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TSLA', 'META'],
+    'Big Tech': ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'TSLA', 'NVDA', 'CRM', 'ORCL'],
+    'Semiconductor': ['NVDA', 'AMD', 'INTC', 'TSM', 'AVGO', 'QCOM', 'TXN', 'AMAT', 'LRCX', 'KLAC'],
+    'Banking': ['JPM', 'BAC', 'WFC', 'C', 'GS', 'MS', 'USB', 'PNC', 'TFC', 'COF'],
+    'REIT': ['AMT', 'PLD', 'CCI', 'EQIX', 'SPG', 'O', 'WELL', 'DLR', 'PSA', 'EQR'],
+    'EV': ['TSLA', 'RIVN', 'LCID', 'NIO', 'XPEV', 'LI', 'F', 'GM'],
+    'Biotech': ['GILD', 'AMGN', 'BIIB', 'REGN', 'VRTX', 'ILMN', 'MRNA', 'BNTX']
+}
+
+SECTOR_ALIASES = {
+    'tech': 'Technology',
+    'technology': 'Technology',
+    'bank': 'Banking',
+    'banking': 'Banking',
+    'banks': 'Banking',
+    'finance': 'Financial',
+    'financial': 'Financial',
+    'financials': 'Financial',
+    'healthcare': 'Healthcare',
+    'health care': 'Healthcare',
+    'pharma': 'Healthcare',
+    'energy': 'Energy',
+    'oil': 'Energy',
+    'consumer': 'Consumer Discretionary',
+    'retail': 'Consumer Discretionary',
+    'telecom': 'Communication Services',
+    'media': 'Communication Services',
+    'reit': 'Real Estate',
+    'reits': 'Real Estate'
+}
+
+NAME_SUFFIXES = {'inc', 'inc.', 'corp', 'corp.', 'corporation', 'co', 'co.', 'company', 'ltd', 'plc', 'group', 'holdings', '&', 'the'}
+
+#Lowercased name without punctuation or corporate suffixes, the form every index is keyed on
+def normalize_name(name: str) -> str:
+    words = re.sub(r"[^\w&\s-]", " ", str(name).lower()).split()
+    return " ".join(w for w in words if w not in NAME_SUFFIXES)
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+@dataclass(frozen=True)
+class Symbol:
+    ticker: str
+    name: str
+    aliases: tuple = ()
+    sector: str = ""
+    industry: str = ""
+
+class _TrieNode:
+    __slots__ = ('children', 'tickers')
+
+    def __init__(self):
+        self.children = {}
+        self.tickers = set()
+
+#In-memory symbol universe: exact, prefix and fuzzy lookups plus ticker to sector and group maps
+class TickerUniverse:
+    #exhaustive marks a full exchange listing, where an unknown ticker can be rejected without asking upstream
+    def __init__(self, symbols: list[Symbol] = (), sector_tickers: dict = None, stock_groups: dict = None,
+                 exhaustive: bool = False):
+        self.symbols = {}
+        self.sector_members = {sector: list(tickers) for sector, tickers in (sector_tickers or SECTOR_TICKERS).items()}
+        self.stock_groups = stock_groups or STOCK_GROUPS
+        self.exhaustive = exhaustive
+        self._names = {}
+        self._keys = []
+        self._trigram_index = defaultdict(set)
+        self._trie = _TrieNode()
+        for symbol in symbols:
+            self.add(symbol)
+
+        self._ticker_sectors = defaultdict(set)
+        for sector, tickers in self.sector_members.items():
+            for ticker in tickers:
+                self._ticker_sectors[ticker].add(sector)
+        self._ticker_groups = defaultdict(set)
+        for group, tickers in self.stock_groups.items():
+            for ticker in tickers:
+                self._ticker_groups[ticker].add(group)
+
+    @classmethod
+    def load(cls, path: str = None) -> "TickerUniverse":
+        configured = path or get_setting("TICKER_UNIVERSE_PATH")
+        path = configured or DEFAULT_UNIVERSE_PATH
+        if not os.path.exists(path):
+            return cls()
+        with open(path, newline="") as f:
+            rows = json.load(f) if path.endswith(".json") else list(csv.DictReader(f))
+        symbols = []
+        for row in rows:
+            aliases = row.get('aliases') or ()
+            if isinstance(aliases, str):
+                aliases = aliases.split(";")
+            symbols.append(Symbol(
+                ticker=str(row['ticker']).strip().upper(),
+                name=str(row.get('name') or "").strip(),
+                aliases=tuple(a.strip() for a in aliases if a and a.strip()),
+                sector=str(row.get('sector') or "").strip(),
+                industry=str(row.get('industry') or "").strip()
+            ))
+        return cls(symbols, exhaustive=bool(configured))
+
+    def add(self, symbol: Symbol):
+        self.symbols[symbol.ticker] = symbol
+        if symbol.sector:
+            members = self.sector_members.setdefault(symbol.sector, [])
+            if symbol.ticker not in members:
+                members.append(symbol.ticker)
+        self._insert(symbol.ticker.lower(), symbol.ticker)
+        for text in (symbol.name, *symbol.aliases):
+            key = normalize_name(text)
+            if not key:
+                continue
+            self._names.setdefault(key, symbol.ticker)
+            position = len(self._keys)
+            self._keys.append((key, symbol.ticker))
+            for gram in _trigrams(key):
+                self._trigram_index[gram].add(position)
+            #Every word start is a prefix entry, so "morgan" completes to JPM and MS
+            words = key.split()
+            for i in range(len(words)):
+                self._insert(" ".join(words[i:]), symbol.ticker)
+
+    def _insert(self, key: str, ticker: str):
+        node = self._trie
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        node.tickers.add(ticker)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, ticker: str) -> bool:
+        return self.is_known(ticker)
+
+    def _canonical_ticker(self, ticker: str) -> str:
+        ticker = str(ticker or "").strip().upper()
+        if ticker not in self.symbols and "." in ticker and ticker.replace(".", "-") in self.symbols:
+            return ticker.replace(".", "-")
+        return ticker
+
+    def is_known(self, ticker: str) -> bool:
+        ticker = self._canonical_ticker(ticker)
+        return ticker in self.symbols or ticker in self._ticker_sectors or ticker in self._ticker_groups
+
+    def get(self, ticker: str) -> Symbol:
+        return self.symbols.get(self._canonical_ticker(ticker))
+
+    #Tickers whose symbol, name or any name word starts with prefix, shortest completions first
+    def complete(self, prefix: str, limit: int = 10) -> list[str]:
+        node = self._trie
+        for char in normalize_name(prefix) or prefix.strip().lower():
+            node = node.children.get(char)
+            if node is None:
+                return []
+        found = []
+        level = [node]
+        while level and len(found) < limit:
+            for current in level:
+                for ticker in sorted(current.tickers):
+                    if ticker not in found:
+                        found.append(ticker)
+            level = [child for current in level for _, child in sorted(current.children.items())]
+        return found[:limit]
+
+    #Trigram candidates reranked by edit similarity, returns (ticker, score) pairs above cutoff
+    def fuzzy(self, text: str, limit: int = 5, cutoff: float = 0.6) -> list[tuple]:
+        query = normalize_name(text)
+        if not query:
+            return []
+        grams = _trigrams(query)
+        overlap = defaultdict(int)
+        for gram in grams:
+            for position in self._trigram_index.get(gram, ()):
+                overlap[position] += 1
+        candidates = sorted(overlap, key=lambda p: -overlap[p])[:limit * 8]
+
+        best = {}
+        for position in candidates:
+            key, ticker = self._keys[position]
+            score = difflib.SequenceMatcher(None, query, key).ratio()
+            if score >= cutoff and score > best.get(ticker, 0):
+                best[ticker] = score
+        return sorted(best.items(), key=lambda item: -item[1])[:limit]
+
+    #Ticker for a symbol, company name or alias, or None when nothing is close enough
+    def resolve(self, text: str, cutoff: float = 0.8) -> str:
+        if not text:
+            return None
+        ticker = self._canonical_ticker(text)
+        if ticker in self.symbols:
+            return ticker
+        key = normalize_name(text)
+        if key in self._names:
+            return self._names[key]
+        matches = self.fuzzy(text, limit=1, cutoff=cutoff)
+        return matches[0][0] if matches else None
+
+    def canonical_sector(self, sector_name: str) -> str:
+        if sector_name in self.sector_members:
+            return sector_name
+        lowered = str(sector_name).strip().lower()
+        for sector in self.sector_members:
+            if sector.lower() == lowered:
+                return sector
+        return SECTOR_ALIASES.get(lowered, sector_name)
+
+    #Curated SECTOR_TICKERS order first, then listed symbols tagged with the sector
+    def sector_tickers(self, sector_name: str) -> list[str]:
+        return list(self.sector_members.get(self.canonical_sector(sector_name), []))
+
+    def sectors_for(self, ticker: str) -> set:
+        ticker = self._canonical_ticker(ticker)
+        sectors = set(self._ticker_sectors.get(ticker, ()))
+        symbol = self.symbols.get(ticker)
+        if symbol and symbol.sector:
+            sectors.add(symbol.sector)
+        return sectors
+
+    def groups_for(self, ticker: str) -> set:
+        return set(self._ticker_groups.get(self._canonical_ticker(ticker), ()))
+
+_universe = None
+_universe_lock = threading.Lock()
+
+#Process-wide universe, loaded once from TICKER_UNIVERSE_PATH or the bundled ticker_universe.csv
+def get_universe() -> TickerUniverse:
+    global _universe
+    if _universe is None:
+        with _universe_lock:
+            if _universe is None:
+                _universe = TickerUniverse.load()
+    return _universe
+
+def main():
+    parser = argparse.ArgumentParser(description="Look names and tickers up in the local symbol universe")
+    parser.add_argument("text", help="ticker, company name or prefix")
+    parser.add_argument("--path", help="universe file, defaults to TICKER_UNIVERSE_PATH or ticker_universe.csv")
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    universe = TickerUniverse.load(args.path)
+    ticker = universe.resolve(args.text)
+    print(f"resolve:  {ticker}")
+    if ticker:
+        print(f"sectors:  {', '.join(sorted(universe.sectors_for(ticker)))}")
+        print(f"groups:   {', '.join(sorted(universe.groups_for(ticker)))}")
+    print(f"complete: {', '.join(universe.complete(args.text, args.limit))}")
+    print(f"fuzzy:    {', '.join(f'{t} ({s:.2f})' for t, s in universe.fuzzy(args.text, args.limit))}")
+
+if __name__ == "__main__":
+    main()
@@ -1,103 +1,193 @@
-# Fix for Streamlit Cloud sqlite3 issue
 import sys
-try:
-    import pysqlite3
-    sys.modules['sqlite3'] = pysqlite3
-except ImportError:
-    pass
+import time
+from abc import ABC, abstractmethod
+from functools import cached_property
+from LazyLoader import lazy_import
+from Article import Article
+import Sentiment
+from Embeddings import EMBEDDING_MODEL, get_profile
+from Config import get_setting
+from LLMClient import ResilientOpenAI, create_client
+import Notifier
+import Metrics
 
-import streamlit as st
-import numpy as np
-from openai import OpenAI
-import chromadb
+np = lazy_import("numpy")
+chromadb = lazy_import("chromadb")
 
-class VectorDatabase:
-    def __init__(self, openai_key: str):
-        self.openai_client = OpenAI(api_key=openai_key)
-        
+# Fix for Streamlit Cloud sqlite3 issue, applied right before chromadb is first loaded
+def _load_chromadb():
+    if 'pysqlite3' not in sys.modules:
         try:
-            self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
-            
-            try:
-                self.collection = self.chroma_client.get_collection("financial_news")
-                st.info(f"Using existing collection with {self.collection.count()} articles")
-            except:
-                self.collection = self.chroma_client.create_collection(
-                    "financial_news",
-                    metadata={"hnsw:space": "cosine"}
-                )
-                st.info("Created new financial_news collection")
-        except Exception as e:
-            st.error(f"ChromaDB initialization failed: {e}")
-            raise
+            import pysqlite3
+            sys.modules['sqlite3'] = pysqlite3
+        except ImportError:
+            pass
+    return chromadb
+
+#Embedding and article bookkeeping shared by the vector store backends
+class VectorStore(ABC):
+    def __init__(self, openai_key: str = None, profile=None):
+        self.openai_key = openai_key
+        self.profile = get_profile(profile)
+    
+    #Only needed for embedding, maintenance jobs can open the store without a key
+    @cached_property
+    def openai_client(self):
+        return create_client(self.openai_key)
+    
+    @cached_property
+    def llm(self) -> ResilientOpenAI:
+        return ResilientOpenAI(self.openai_client)
     
-    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+    #Single query embeddings sit on the interactive path and may be hedged, ingestion batches are not
+    #A failure yields zero vectors unless strict, where it raises so a retrying writer never stores them
+    def get_embeddings(self, texts: list[str], strict: bool = False) -> list[list[float]]:
         try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=texts
-            )
+            with Metrics.span("embedding", texts=len(texts)):
+                response = self.llm.embed(
+                    model=EMBEDDING_MODEL,
+                    input=texts,
+                    hedge=len(texts) == 1,
+                    **self.profile.request_kwargs()
+                )
+            Metrics.count("embedded_texts", len(texts))
             return [data.embedding for data in response.data]
         except Exception as e:
-            st.error(f"Embedding error: {e}")
-            return [[0.0] * 1536] * len(texts)
+            if strict:
+                raise
+            Notifier.error(f"Embedding error: {e}")
+            return [[0.0] * self.profile.dimensions] * len(texts)
     
-    def add_articles(self, articles: list[dict], mentioned_tickers: list[list[str]]):
-        if not articles:
-            return
-        
-        existing_urls = set()
+    #Urls among these that the backend already stores
+    @abstractmethod
+    def _existing_urls(self, urls: list[str]) -> set:
+        pass
+    
+    @abstractmethod
+    def _write(self, ids: list[str], documents: list[str], embeddings, metadatas: list[dict]):
+        pass
+    
+    #Drops articles already stored or repeated in the batch and builds their documents and metadata
+    def prepare_articles(self, articles: list[Article], mentioned_tickers: list[list[str]]) -> dict:
+        articles = Sentiment.score_articles([Article.coerce(article) for article in articles])
         try:
-            existing_data = self.collection.get()
-            for metadata in existing_data.get('metadatas', []):
-                if metadata and 'url' in metadata:
-                    existing_urls.add(metadata['url'])
-        except:
-            pass
+            existing_urls = self._existing_urls([a.url for a in articles if a.url])
+        except Exception:
+            existing_urls = set()
         
         documents = []
         metadatas = []
         ids = []
+        kept_articles = []
+        kept_tickers = []
         
         for article, tickers in zip(articles, mentioned_tickers):
-            url = article.get('url', '')
+            url = article.url
             if url and url in existing_urls:
                 continue
-                
-            content = f"Title: {article.get('title', '')} Content: {article.get('content', '')}"
-            metadata = {
-                'title': article.get('title', '')[:200],
-                'source': article.get('source', ''),
-                'url': url,
-                'tickers': ', '.join(tickers) if tickers else '',
-                'publishedAt': article.get('publishedAt', '')
-            }
+            existing_urls.add(url)
+            #Articles without a url share an id when their titles match
+            if not url and f"article_{article.fingerprint}" in ids:
+                continue
             
+            article_id, content, metadata = self.article_record(article, tickers)
             documents.append(content)
             metadatas.append(metadata)
-            ids.append(f"article_{hash(url) if url else hash(content)}")
+            ids.append(article_id)
+            kept_articles.append(article)
+            kept_tickers.append(tickers)
         
-        if documents:
-            embeddings = np.array(self.get_embeddings(documents), dtype=np.float32)
-            self.collection.add(
-                documents=documents,
-                embeddings=embeddings,
-                metadatas=metadatas,
-                ids=ids
-            )
-            
-            st.success(f"Added {len(documents)} new articles to vector database")
+        return {'ids': ids, 'documents': documents, 'metadatas': metadatas, 'articles': kept_articles,
+                'tickers': kept_tickers}
+    
+    #Id, document and metadata an article is stored under, also used to show articles that are not written yet
+    @staticmethod
+    def article_record(article: Article, tickers: list[str]) -> tuple:
+        url = article.url
+        content = f"Title: {article.title} Content: {article.content}"
+        published = article.published
+        metadata = {
+            'title': article.title[:200],
+            'source': article.source,
+            'url': url,
+            'tickers': ', '.join(tickers) if tickers else '',
+            'publishedAt': article.published_at,
+            'publishedTs': published.timestamp() if published else 0.0,
+            'ingestedTs': time.time(),
+            'sentiment': article.sentiment
+        }
+        return f"article_{article.fingerprint}", content, metadata
+    
+    def embed_prepared(self, batch: dict, strict: bool = False) -> dict:
+        batch['embeddings'] = np.array(self.get_embeddings(batch['documents'], strict), dtype=np.float32)
+        return batch
+    
+    def write_prepared(self, batch: dict):
+        self._write(batch['ids'], batch['documents'], batch['embeddings'], batch['metadatas'])
+    
+    def add_articles(self, articles: list[Article], mentioned_tickers: list[list[str]], strict: bool = False):
+        if not articles:
+            return
+        
+        batch = self.prepare_articles(articles, mentioned_tickers)
+        if batch['documents']:
+            self.write_prepared(self.embed_prepared(batch, strict))
+            Notifier.success(f"Added {len(batch['documents'])} new articles to vector database")
         else:
-            st.info("No new articles to add - all articles already exist in database")
+            Notifier.info("No new articles to add - all articles already exist in database")
+
+class VectorDatabase(VectorStore):
+    def __init__(self, openai_key: str = None, persist_path: str = "./chroma_db", collection_name: str = "financial_news",
+                 profile=None):
+        super().__init__(openai_key, profile)
+        self.persist_path = persist_path
+        self.collection_name = collection_name + self.profile.collection_suffix
+        #An int8 copy beside the HNSW index only adds memory, quantized search lives in the mmap backend
+        if self.profile.quantize:
+            Notifier.warning(f"{self.profile.name}: int8 search needs VECTOR_BACKEND=mmap, ChromaDB uses the float32 vectors")
+        
+        try:
+            self.chroma_client = _load_chromadb().PersistentClient(path=persist_path)
+            self._recover_compaction()
+            
+            try:
+                self.collection = self.chroma_client.get_collection(self.collection_name)
+                Notifier.info(f"Using existing collection with {self.collection.count()} articles")
+            except:
+                self.collection = self.chroma_client.create_collection(
+                    self.collection_name,
+                    metadata={"hnsw:space": "cosine"}
+                )
+                Notifier.info(f"Created new {self.collection_name} collection")
+        except Exception as e:
+            Notifier.error(f"ChromaDB initialization failed: {e}")
+            raise
     
-    def search(self, query: str, n_results: int = 5) -> list[dict]:
+    def _existing_urls(self, urls: list[str]) -> set:
+        existing = set()
+        for start in range(0, len(urls), 500):
+            found = self.collection.get(where={"url": {"$in": urls[start:start + 500]}}, include=["metadatas"])
+            existing.update(m['url'] for m in found.get('metadatas', []) if m and m.get('url'))
+        return existing
+    
+    def _write(self, ids: list[str], documents: list[str], embeddings, metadatas: list[dict]):
+        self.collection.add(
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=ids
+        )
+    
+    def search(self, query: str, n_results: int = 5, query_embedding: list[float] = None) -> list[dict]:
         try:
-            query_embedding = self.get_embeddings([query])[0]
+            if query_embedding is None:
+                query_embedding = self.get_embeddings([query])[0]
             
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results
-            )
+            with Metrics.span("vector_query", n_results=n_results):
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=n_results
+                )
             
             formatted_results = []
             documents = results.get('documents', [[]])
@@ -120,5 +210,53 @@ class VectorDatabase:
             
             return formatted_results
         except Exception as e:
-            st.error(f"Search error: {e}")
-            return []
\ No newline at end of file
+            Notifier.error(f"Search error: {e}")
+            return []
+    
+    def count(self) -> int:
+        return self.collection.count()
+    
+    #Pages through stored records without loading the whole collection
+    def iter_records(self, batch_size: int = 1000, include: list[str] = None):
+        include = include or ["metadatas"]
+        offset = 0
+        while True:
+            page = self.collection.get(limit=batch_size, offset=offset, include=include)
+            ids = page.get('ids', [])
+            if not ids:
+                return
+            yield page
+            if len(ids) < batch_size:
+                return
+            offset += len(ids)
+    
+    def delete_ids(self, ids: list[str], batch_size: int = 500) -> int:
+        deleted = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            self.collection.delete(ids=batch)
+            deleted += len(batch)
+        return deleted
+    
+    #Older versions compacted by copying into a renamed collection; finish a swap they left half done
+    def _recover_compaction(self):
+        names = {getattr(c, 'name', c) for c in self.chroma_client.list_collections()}
+        pending = f"{self.collection_name}_compacting"
+        if pending in names and self.collection_name not in names:
+            self.chroma_client.get_collection(pending).modify(name=self.collection_name)
+            Notifier.warning(f"Recovered {self.collection_name} from an interrupted compaction")
+    
+    #Chroma drops deleted ids from its HNSW index and reuses their slots, so the collection is never rebuilt here;
+    #swapping in a copy would break the handles of other processes and lose their writes made during the copy
+    def compact(self, batch_size: int = 1000) -> dict:
+        return {"records": self.collection.count(), "rebuilt": False, "seconds": 0.0}
+
+#Opens the backend named by VECTOR_BACKEND: "chroma" (default) or "mmap"
+def open_vector_db(openai_key: str = None, backend: str = None, **kwargs) -> VectorStore:
+    backend = backend or get_setting("VECTOR_BACKEND", "chroma")
+    if backend == "mmap":
+        from MmapVectorDB import MmapVectorDatabase
+        return MmapVectorDatabase(openai_key, **kwargs)
+    if backend != "chroma":
+        raise ValueError(f"Unknown vector backend {backend!r}, expected chroma or mmap")
+    return VectorDatabase(openai_key, **kwargs)
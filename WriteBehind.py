@@ -0,0 +1,270 @@
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from VectorDB import VectorStore
+from Article import Article
+import Sentiment
+import Notifier
+import Metrics
+
+WRITE_BEHIND_PATH = os.environ.get("WRITE_BEHIND_PATH", "write_behind.sqlite")
+#A claim older than this belongs to a process that died mid-batch and is taken over
+CLAIM_TIMEOUT = 300.0
+MAX_ATTEMPTS = 5
+OVERLAY_LIMIT = 5000
+STOPWORDS = {'the', 'and', 'for', 'how', 'what', 'is', 'are', 'in', 'of', 'on', 'to', 'with', 'about', 'current'}
+
+def _json_value(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+def _terms(text: str) -> set:
+    return {term for term in re.findall(r"[a-z0-9]+", text.lower()) if len(term) > 1 and term not in STOPWORDS}
+
+#Durable queue of graph and vector writes drained in batches by a background thread
+#Pending rows live in a SQLite journal, so writes survive a restart and several processes can share one file
+#Until a write lands, the queued articles and companies are served from an in-memory overlay
+class WriteBehindQueue:
+    def __init__(self, knowledge_graph, vector_db: VectorStore, path: str = None, batch_size: int = 32,
+                 flush_interval: float = 0.5):
+        self.knowledge_graph = knowledge_graph
+        self.vector_db = vector_db
+        self.path = path or WRITE_BEHIND_PATH
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.token = f"{os.getpid()}-{id(self)}"
+
+        self._db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pending (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_by TEXT,
+                claimed_at REAL,
+                graph_done INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS pending_claim ON pending(claimed_by, id);
+        """)
+        #Journals created before graph writes were tracked per row
+        if 'graph_done' not in {row[1] for row in self._db.execute("PRAGMA table_info(pending)")}:
+            self._db.execute("ALTER TABLE pending ADD COLUMN graph_done INTEGER NOT NULL DEFAULT 0")
+        self._db_lock = threading.Lock()
+        self._articles = OrderedDict()
+        self._companies = {}
+        self._overlay_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._idle = threading.Event()
+        self._thread = threading.Thread(target=self._drain_loop, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _enqueue(self, rows: list[tuple]):
+        now = time.time()
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT INTO pending (kind, payload, created) VALUES (?, ?, ?)",
+                [(kind, json.dumps(payload, default=_json_value), now) for kind, payload in rows]
+            )
+            self._idle.clear()
+        Metrics.count("write_behind_enqueued", len(rows))
+        self._wake.set()
+
+    def add_company(self, company_data: dict):
+        if not company_data or not company_data.get('ticker'):
+            return
+        with self._overlay_lock:
+            self._companies[company_data['ticker']] = company_data
+        self._enqueue([('company', company_data)])
+
+    #Queues the graph node and the vector record of each article, deduplicated by url
+    def add_articles(self, articles: list[Article], mentioned_tickers: list[list[str]]):
+        rows = []
+        with self._overlay_lock:
+            for article, tickers in zip(articles, mentioned_tickers):
+                article = Article.coerce(article)
+                if not article.key or article.key in self._articles:
+                    continue
+                self._articles[article.key] = (article, list(tickers), time.time())
+                rows.append(('article', {'article': article.to_dict(), 'tickers': list(tickers)}))
+            while len(self._articles) > OVERLAY_LIMIT:
+                self._articles.popitem(last=False)
+        if rows:
+            self._enqueue(rows)
+
+    #Adds queued articles to vector results by term overlap with the query, in the same shape as VectorStore.search
+    def merge_search(self, query: str, results: list[dict], n_results: int) -> list[dict]:
+        with self._overlay_lock:
+            #Entries another process drained for us are never settled here, so they age out instead
+            while self._articles and next(iter(self._articles.values()))[2] < time.time() - CLAIM_TIMEOUT:
+                self._articles.popitem(last=False)
+            pending = list(self._articles.values())
+        terms = _terms(query)
+        if not pending or not terms:
+            return results
+        seen = {result.get('metadata', {}).get('url') for result in results}
+        #Term overlap is not a cosine similarity: full overlap scores as the best vector hit, which stays ahead on ties
+        scale = max((result.get('similarity_score', 0) for result in results), default=1.0)
+        merged = list(results)
+        for article, tickers, _ in pending:
+            if article.url in seen:
+                continue
+            article_id, content, metadata = VectorStore.article_record(article, tickers)
+            score = scale * len(terms & _terms(content)) / len(terms)
+            if score > 0:
+                merged.append({'content': content, 'metadata': metadata, 'similarity_score': score, 'id': article_id,
+                               'pending': True})
+        merged.sort(key=lambda result: result.get('similarity_score', 0), reverse=True)
+        return merged[:n_results]
+
+    #Graph context for a company whose node has not been written yet
+    def company_context(self, ticker: str) -> str:
+        with self._overlay_lock:
+            data = self._companies.get(ticker)
+        if not data:
+            return ""
+        return self.knowledge_graph.describe_company(ticker, data.get('companyName', ''), data.get('sector', ''),
+                                                     data.get('price'))
+
+    #Takes the oldest unclaimed rows, or rows whose claimer stopped answering
+    def _claim(self) -> list[tuple]:
+        now = time.time()
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("""
+                    UPDATE pending SET claimed_by = ?, claimed_at = ?
+                    WHERE id IN (
+                        SELECT id FROM pending
+                        WHERE claimed_by IS NULL OR claimed_at < ?
+                        ORDER BY id LIMIT ?
+                    )
+                """, (self.token, now, now - CLAIM_TIMEOUT, self.batch_size))
+                rows = self._db.execute(
+                    "SELECT id, kind, payload, attempts, graph_done FROM pending WHERE claimed_by = ? ORDER BY id",
+                    (self.token,)
+                ).fetchall()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return rows
+
+    #Companies first so the MENTIONS edges of articles in the same batch find their nodes, then one embedding call
+    #Any failure raises so the batch is released and retried; graph writes that landed are recorded and not repeated
+    def _apply(self, rows: list[tuple]):
+        companies = []
+        articles = []
+        graph_pending = []
+        for row_id, kind, payload, _, graph_done in rows:
+            data = json.loads(payload)
+            if kind == 'article':
+                data['article'] = Article.from_dict(data['article'])
+            (companies if kind == 'company' else articles).append(data)
+            if not graph_done:
+                graph_pending.append((row_id, kind, data))
+        Sentiment.score_articles([item['article'] for item in articles])
+        graph_pending.sort(key=lambda entry: entry[1] != 'company')
+        done = []
+        try:
+            for row_id, kind, data in graph_pending:
+                if kind == 'company':
+                    self.knowledge_graph.add_company(data, strict=True)
+                else:
+                    self.knowledge_graph.add_news_article(data['article'], data['tickers'], strict=True)
+                done.append((row_id,))
+        finally:
+            if done:
+                with self._db_lock:
+                    self._db.executemany("UPDATE pending SET graph_done = 1 WHERE id = ?", done)
+        if articles and self.vector_db is not None:
+            self.vector_db.add_articles([item['article'] for item in articles], [item['tickers'] for item in articles],
+                                        strict=True)
+        return companies, articles
+
+    def _settle(self, rows: list[tuple], companies: list[dict], articles: list[dict]):
+        with self._db_lock:
+            self._db.executemany("DELETE FROM pending WHERE id = ?", [(row[0],) for row in rows])
+        with self._overlay_lock:
+            for company_data in companies:
+                #A newer quote queued meanwhile stays visible until its own row lands
+                if self._companies.get(company_data.get('ticker')) == company_data:
+                    del self._companies[company_data['ticker']]
+            for item in articles:
+                self._articles.pop(item['article'].key, None)
+        Metrics.count("write_behind_written", len(rows))
+
+    #Failed rows go back to the queue; after MAX_ATTEMPTS they are dropped so one bad row cannot block the rest
+    def _release(self, rows: list[tuple], error: Exception):
+        Metrics.count("write_behind_errors")
+        Notifier.warning(f"Write-behind batch of {len(rows)} failed: {error}")
+        with self._db_lock:
+            self._db.executemany(
+                "UPDATE pending SET claimed_by = NULL, attempts = attempts + 1 WHERE id = ?", [(row[0],) for row in rows]
+            )
+            dropped = self._db.execute("DELETE FROM pending WHERE attempts >= ?", (MAX_ATTEMPTS,)).rowcount
+        if dropped:
+            Metrics.count("write_behind_dropped", dropped)
+
+    def drain_once(self) -> int:
+        rows = self._claim()
+        if not rows:
+            return 0
+        try:
+            companies, articles = self._apply(rows)
+        except Exception as e:
+            self._release(rows, e)
+            return 0
+        self._settle(rows, companies, articles)
+        return len(rows)
+
+    def _drain_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            #A short pause lets the rest of a query's writes join the batch
+            time.sleep(min(self.flush_interval, 0.05))
+            try:
+                while self.drain_once():
+                    pass
+                with self._db_lock:
+                    if self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0] == 0:
+                        self._idle.set()
+            except Exception as e:
+                Notifier.warning(f"Write-behind drain error: {e}")
+                time.sleep(self.flush_interval)
+
+    def pending(self) -> int:
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._db_lock:
+            count, oldest = self._db.execute("SELECT COUNT(*), MIN(created) FROM pending").fetchone()
+        with self._overlay_lock:
+            overlay = len(self._articles) + len(self._companies)
+        return {'pending': count, 'oldest_seconds': round(time.time() - oldest, 1) if oldest else 0.0, 'overlay': overlay}
+
+    #Waits until every queued write has landed, e.g. before a batch run exits
+    def flush(self, timeout: float = 30.0) -> bool:
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        if self._stop.is_set():
+            return
+        self.flush(timeout)
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
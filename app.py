@@ -97,6 +97,11 @@ def main():
                             )
                 else:
                     st.info("No specific stock data found for this query")
+                
+                related_companies = result.get('related_companies', [])
+                if related_companies:
+                    st.caption("Related companies: " + ", ".join(
+                        f"{company['name']} ({company['ticker']})" for company in related_companies))
             
             with tab2:
                 if result['relevant_articles']:
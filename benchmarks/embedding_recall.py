@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from Embeddings import FULL_DIMENSIONS, PROFILES, Int8Index, normalize, truncate
+from fakes import ArticleFactory, CallCounter, FakeOpenAI, load_companies
+from pipeline import percentile
+
+#Full-dimension vectors from an existing collection, or the offline corpus embedded by the fake client
+def load_vectors(chroma_path: str, collection: str, size: int) -> np.ndarray:
+    if chroma_path:
+        from VectorDB import VectorDatabase
+        db = VectorDatabase(persist_path=chroma_path, collection_name=collection, profile="full")
+        pages = [page['embeddings'] for page in db.iter_records(1000, include=["embeddings"])]
+        return normalize(np.concatenate(pages)[:size]) if pages else np.zeros((0, FULL_DIMENSIONS), np.float32)
+    companies = load_companies()
+    fake_openai = FakeOpenAI(companies, CallCounter())
+    corpus = ArticleFactory(companies).corpus(size)
+    texts = [f"Title: {a['title']} Content: {a['content']}" for a in corpus]
+    return normalize([fake_openai.embed_text(text, FULL_DIMENSIONS) for text in texts])
+
+def exact_top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> list[list[int]]:
+    scores = queries @ matrix.T
+    return [list(np.argsort(-row)[:k]) for row in scores]
+
+#Recall@k of one profile against exact full-dimension search, held-out documents act as queries
+def evaluate(profile, corpus: np.ndarray, queries: np.ndarray, truth: list[list[int]], k: int, rescore: bool = True) -> dict:
+    vectors = truncate(corpus, profile.dimensions)
+    query_vectors = truncate(queries, profile.dimensions)
+    index = None
+    if profile.quantize:
+        index = Int8Index()
+        index.add([str(i) for i in range(len(vectors))], vectors)
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(query_vectors, truth):
+        started = time.perf_counter()
+        if index is None:
+            found = np.argsort(-(vectors @ query))[:k]
+        else:
+            candidates = [int(id_) for id_, _ in index.search(query, k * profile.oversample if rescore else k)]
+            if rescore:
+                exact = vectors[candidates] @ query
+                found = [candidates[i] for i in np.argsort(-exact)[:k]]
+            else:
+                found = candidates[:k]
+        latencies.append(time.perf_counter() - started)
+        hits += len(set(int(i) for i in found) & set(int(i) for i in expected))
+
+    bytes_per_vector = profile.dimensions + 4 if profile.quantize else profile.dimensions * 4
+    return {
+        'profile': profile.name + ("" if rescore or not profile.quantize else " (no rescore)"),
+        'dimensions': profile.dimensions,
+        f'recall@{k}': round(hits / (len(truth) * k), 4),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'bytes_per_vector': bytes_per_vector,
+        'index_mb': round(bytes_per_vector * len(vectors) / 2 ** 20, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of reduced-dimension and int8 embedding profiles")
+    parser.add_argument("--chroma", help="persist path of a full-dimension collection to sample, defaults to the offline corpus")
+    parser.add_argument("--collection", default="financial_news")
+    parser.add_argument("--size", type=int, default=5000, help="corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="held-out documents used as queries")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="comma separated profile names")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.chroma, args.collection, args.size + args.queries)
+    if len(vectors) <= args.queries:
+        parser.error(f"need more than {args.queries} vectors, found {len(vectors)}")
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    truth = exact_top_k(corpus, queries, args.k)
+
+    rows = []
+    for name in args.profiles.split(","):
+        profile = PROFILES[name.strip()]
+        rows.append(evaluate(profile, corpus, queries, truth, args.k))
+        if profile.quantize:
+            rows.append(evaluate(profile, corpus, queries, truth, args.k, rescore=False))
+
+    recall_key = f'recall@{args.k}'
+    print(f"corpus={len(corpus)} queries={len(queries)}")
+    print(f"{'profile':26} {'dims':>6} {recall_key:>10} {'p50 ms':>9} {'p99 ms':>9} {'B/vector':>9} {'index MB':>9}")
+    for row in rows:
+        print(f"{row['profile']:26} {row['dimensions']:>6} {row[recall_key]:>10.4f} {row['p50_ms']:>9.3f} "
+              f"{row['p99_ms']:>9.3f} {row['bytes_per_vector']:>9} {row['index_mb']:>9.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
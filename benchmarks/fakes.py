@@ -0,0 +1,444 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SECTOR_WORDS = {
+    'Banking': ['bank', 'banking'],
+    'Technology': ['tech', 'technology'],
+    'Healthcare': ['healthcare', 'pharma'],
+    'Energy': ['energy', 'oil']
+}
+
+HEADLINES = [
+    "{name} shares rise after quarterly earnings beat estimates",
+    "Analyst upgrades {name} stock, raises price target",
+    "{name} revenue guidance disappoints as outlook softens",
+    "{name} announces acquisition to expand {industry} business",
+    "Why {name} stock is moving today",
+    "{name} downgrade weighs on {sector} shares",
+]
+
+SENTENCES = [
+    "{name} ({ticker}) reported revenue of ${revenue} billion for the quarter.",
+    "Analysts at {firm} rate the stock a {rating} with a price target of ${target}.",
+    "The company reiterated its full-year guidance for the {industry} segment.",
+    "Shares of {ticker} traded {direction} {pct}% in afternoon trading.",
+    "Investors are watching margins across the {sector} sector closely.",
+    "Management highlighted demand trends and capital returns on the earnings call.",
+]
+
+FIRMS = ['Morgan Stanley', 'Goldman Sachs', 'JPMorgan', 'Bank of America', 'Wedbush', 'Bernstein']
+
+def load_companies() -> list[dict]:
+    with open(os.path.join(FIXTURES_DIR, "companies.json")) as f:
+        return json.load(f)
+
+#Counts every call that would have gone to an external service
+class CallCounter(Counter):
+    def snapshot(self) -> dict:
+        return dict(self)
+
+def short_name(name: str) -> str:
+    words = [w for w in re.split(r'[ ,.]', name) if w and w != 'The']
+    return words[0] if words else name
+
+#Deterministic synthetic news built from the company fixtures
+class ArticleFactory:
+    def __init__(self, companies: list[dict], seed: int = 7):
+        self.companies = companies
+        self.seed = seed
+
+    def article(self, company: dict, index: int, source: str = "Fixture Wire") -> dict:
+        rng = random.Random(f"{self.seed}-{company['ticker']}-{index}")
+        values = {
+            'name': short_name(company['name']),
+            'ticker': company['ticker'],
+            'sector': company['sector'],
+            'industry': company['industry'],
+            'firm': rng.choice(FIRMS),
+            'rating': rng.choice(['buy', 'hold', 'overweight', 'sell']),
+            'target': round(company['price'] * rng.uniform(0.8, 1.3), 2),
+            'revenue': round(rng.uniform(5, 120), 1),
+            'direction': rng.choice(['up', 'down']),
+            'pct': round(rng.uniform(0.1, 4.5), 2),
+        }
+        title = rng.choice(HEADLINES).format(**values)
+        body = " ".join(rng.choice(SENTENCES).format(**values) for _ in range(rng.randint(3, 8)))
+        published = datetime(2026, 10, 1, tzinfo=timezone.utc) - timedelta(hours=index * 7 + rng.randint(0, 6))
+        return {
+            'title': title,
+            'description': body[:160],
+            'content': body,
+            'url': f"https://news.example.com/{company['ticker'].lower()}/{index}",
+            'publishedAt': published.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'source': {'name': source}
+        }
+
+    def for_company(self, company: dict, count: int) -> list[dict]:
+        return [self.article(company, i) for i in range(count)]
+
+    #Articles in the shape FinancialDataCollector hands to the graph and vector store
+    def corpus(self, size: int) -> list[dict]:
+        articles = []
+        for i in range(size):
+            raw = self.article(self.companies[i % len(self.companies)], i // len(self.companies))
+            articles.append(dict(raw, source=raw['source']['name'], relevance_score=0.5))
+        return articles
+
+#Stand-in for the OpenAI client: chat answers by prompt type, embeddings are hashed bag-of-words
+class FakeOpenAI:
+    def __init__(self, companies: list[dict], counter: CallCounter, latency: float = 0.0, dimensions: int = 1536):
+        self.companies = companies
+        self.counter = counter
+        self.latency = latency
+        self.dimensions = dimensions
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    def _usage(self, prompt: str, completion: str):
+        return SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(completion) // 4,
+                               total_tokens=(len(prompt) + len(completion)) // 4)
+
+    def _extract(self, text: str) -> dict:
+        lowered = text.lower()
+        companies = []
+        for company in self.companies:
+            short = short_name(company['name']).lower()
+            if short in lowered or re.search(rf"\b{re.escape(company['ticker'])}\b", text):
+                companies.append({"name": company['name'], "ticker": company['ticker'], "confidence": 0.95})
+        sector_queries = []
+        sectors = []
+        for sector, words in SECTOR_WORDS.items():
+            if any(re.search(rf"\b{w}\b", lowered) for w in words):
+                sectors.append({"sector": sector, "confidence": 0.9})
+                if "stocks" in lowered or "sector" in lowered:
+                    sector_queries.append({"sector": sector, "query_type": "broad_sector", "confidence": 0.95})
+        return {
+            "companies": companies,
+            "stock_groups": [],
+            "sectors": sectors,
+            "tickers_mentioned": [c['ticker'] for c in companies],
+            "sector_queries": sector_queries
+        }
+
+    def _chat(self, model=None, messages=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        system = messages[0]['content'] if messages else ""
+        user = messages[-1]['content'] if messages else ""
+        if "entity extraction expert" in system:
+            self.counter['openai_chat_extraction'] += 1
+            text = user.split("this text:", 1)[-1]
+            content = json.dumps(self._extract(text))
+        elif "search expert" in system:
+            self.counter['openai_chat_search_terms'] += 1
+            match = re.search(r"Company: (.*)\n\s*Ticker: (.*)\n", user)
+            name, ticker = (match.group(1).strip(), match.group(2).strip()) if match else ("", "")
+            terms = [t for t in [name, f"{ticker} stock", f"{name} earnings"] if t.strip()]
+            content = json.dumps({"terms": terms}) if kwargs.get('response_format') else json.dumps(terms)
+        else:
+            self.counter['openai_chat_generation'] += 1
+            content = "Fixture analysis: " + " ".join(re.findall(r"\(([A-Z]{1,5})\)", user)[:10]) + " " + "lorem " * 200
+        self.counter['openai_tokens'] += (len(system) + len(user) + len(content)) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+            usage=self._usage(system + user, content)
+        )
+
+    #Tokens hash towards the leading dimensions so a shortened vector is a prefix of the full one, like text-embedding-3
+    def embed_text(self, text: str, dimensions: int) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            position = int.from_bytes(digest[:4], "little") / 2 ** 32
+            index = int(self.dimensions * position ** 3)
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        vector = vector[:dimensions]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _embed(self, model=None, input=None, dimensions=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        texts = [input] if isinstance(input, str) else list(input)
+        self.counter['openai_embedding_calls'] += 1
+        self.counter['openai_embedded_texts'] += len(texts)
+        dims = dimensions or self.dimensions
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=self.embed_text(t, dims), index=i) for i, t in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=sum(len(t) for t in texts) // 4, total_tokens=sum(len(t) for t in texts) // 4)
+        )
+
+#Minimal yfinance: Ticker(...).history() and .info backed by the company fixtures
+class _Row(dict):
+    pass
+
+class _Rows:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def __getitem__(self, index):
+        return self._rows[index]
+
+class FakeHistory:
+    def __init__(self, rows: list[dict], dates: list[str]):
+        self.empty = not rows
+        self.iloc = _Rows([_Row(r) for r in rows])
+        self.index = dates
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+class FakeYFinance:
+    def __init__(self, companies: list[dict], counter: CallCounter, latency: float = 0.0):
+        self.by_ticker = {c['ticker']: c for c in companies}
+        self.counter = counter
+        self.latency = latency
+        #This many history calls hang regardless of their timeout until release is set
+        self.stalled_calls = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def _take_stall(self) -> bool:
+        with self._lock:
+            if self.stalled_calls <= 0:
+                return False
+            self.stalled_calls -= 1
+            return True
+
+    def Ticker(self, ticker: str):
+        fake = self
+        company = self.by_ticker.get(ticker)
+
+        class _Ticker:
+            def history(self, period="5d", timeout=10):
+                fake.counter['yfinance_history'] += 1
+                if fake._take_stall():
+                    fake.release.wait(120)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if not company:
+                    return FakeHistory([], [])
+                previous = company['price'] - company['change']
+                rows = [{'Close': previous, 'Volume': company['volume']}, {'Close': company['price'], 'Volume': company['volume']}]
+                return FakeHistory(rows, ["2026-09-30 00:00:00-04:00", "2026-10-01 00:00:00-04:00"])
+
+            @property
+            def info(self):
+                fake.counter['yfinance_info'] += 1
+                if not company:
+                    return {}
+                return {
+                    'symbol': company['ticker'], 'shortName': company['name'], 'longName': company['name'],
+                    'sector': company['sector'], 'industry': company['industry'], 'marketCap': company['marketCap'],
+                    'trailingPE': 25.0, 'trailingEps': 4.2, 'dividendYield': 0.01, 'beta': 1.1,
+                    'fiftyTwoWeekHigh': company['price'] * 1.2, 'fiftyTwoWeekLow': company['price'] * 0.7
+                }
+
+        return _Ticker()
+
+#NewsAPI over HTTP: answers /v2/everything from the article factory
+class FakeResponse:
+    def __init__(self, payload: dict = None, status_code: int = 200, content: bytes = None):
+        self._payload = payload
+        self.status_code = status_code
+        self.content = content if content is not None else json.dumps(payload).encode()
+        self.headers = {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+class FakeNewsAPI:
+    def __init__(self, companies: list[dict], factory: ArticleFactory, counter: CallCounter,
+                 articles_per_request: int = 8, latency: float = 0.0):
+        self.companies = companies
+        self.factory = factory
+        self.counter = counter
+        self.articles_per_request = articles_per_request
+        self.latency = latency
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        self.counter['newsapi_requests'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        term = (params or {}).get('q', '').lower()
+        matches = [c for c in self.companies if short_name(c['name']).lower() in term or c['ticker'].lower() in term]
+        articles = []
+        for company in matches[:1]:
+            articles.extend(self.factory.for_company(company, self.articles_per_request))
+        return FakeResponse({'status': 'ok', 'totalResults': len(articles), 'articles': articles})
+
+#Pooled session stand-in: NewsAPI URLs go to FakeNewsAPI, any other URL is served as a feed whose body is the URL
+class FakeHttpSession:
+    def __init__(self, news_api: FakeNewsAPI):
+        self.news_api = news_api
+        self.headers = {}
+        self.adapters = {}
+
+    def get(self, url, params=None, headers=None, timeout=None, **kwargs):
+        if "newsapi.org" in url:
+            return self.news_api.get(url, params=params, timeout=timeout)
+        return FakeResponse(content=url.encode())
+
+    def close(self):
+        pass
+
+#feedparser.parse replacement returning entries from the article factory
+class FakeFeedparser:
+    def __init__(self, factory: ArticleFactory, counter: CallCounter, entries_per_feed: int = 15, latency: float = 0.0):
+        self.factory = factory
+        self.counter = counter
+        self.entries_per_feed = entries_per_feed
+        self.latency = latency
+
+    def parse(self, url_or_content, **kwargs):
+        self.counter['rss_fetches'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        key = url_or_content if isinstance(url_or_content, str) else url_or_content.decode()
+        offset = int(hashlib.md5(key.encode()).hexdigest(), 16) % 1000
+        entries = []
+        for i in range(self.entries_per_feed):
+            company = self.factory.companies[(offset + i) % len(self.factory.companies)]
+            article = self.factory.article(company, 100 + offset + i, source="Fixture RSS")
+            entries.append(SimpleNamespace(title=article['title'], summary=article['content'],
+                                           link=article['url'], published=article['publishedAt']))
+        return SimpleNamespace(entries=entries, feed=SimpleNamespace(title="Fixture RSS"), status=200, bozo=False)
+
+#Neo4j driver stand-in that counts round trips and keeps just enough state for read queries
+class FakeRecord(dict):
+    def data(self):
+        return dict(self)
+
+class FakeResult:
+    def __init__(self, records: list[dict]):
+        self._records = [FakeRecord(r) for r in records]
+
+    def single(self):
+        return self._records[0] if self._records else None
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def data(self):
+        return [dict(r) for r in self._records]
+
+    def consume(self):
+        return SimpleNamespace(counters=SimpleNamespace(nodes_deleted=0, relationships_deleted=0, properties_set=0))
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def run(self, query, parameters=None, **kwargs):
+        params = dict(parameters or {}, **kwargs)
+        self.driver.counter['neo4j_round_trips'] += 1
+        if self.driver.latency:
+            time.sleep(self.driver.latency)
+        return FakeResult(self.driver.handle(query, params))
+
+    def execute_write(self, fn, *args, **kwargs):
+        return fn(self, *args, **kwargs)
+
+    def execute_read(self, fn, *args, **kwargs):
+        return fn(self, *args, **kwargs)
+
+class FakeDriver:
+    def __init__(self, counter: CallCounter, latency: float = 0.0):
+        self.counter = counter
+        self.latency = latency
+        self.companies = {}
+        self.articles = {}
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+    def verify_connectivity(self):
+        return True
+
+    def close(self):
+        pass
+
+    def handle(self, query: str, params: dict) -> list[dict]:
+        if "MERGE (c:Company" in query and 'name' in params:
+            self.companies.setdefault(params['ticker'], {}).update(params)
+        elif "MERGE (sd:StockData" in query:
+            self.companies.setdefault(params['ticker'], {}).update({'price': params.get('price'), 'changePercent': params.get('changePercent')})
+        elif "NewsArticle" in query and "MERGE" in query:
+            for row in params.get('rows', [params]):
+                if 'id' in row:
+                    self.articles[row['id']] = row
+        elif "AS relation" in query:
+            seeds = set(params.get('tickers', []))
+            sectors = {self.companies[t].get('sector') for t in seeds if t in self.companies}
+            return [
+                {'ticker': ticker, 'name': company.get('name'), 'relation': 'sector_peer', 'via': company.get('sector'), 'weight': 1.0}
+                for ticker, company in self.companies.items()
+                if ticker not in seeds and company.get('sector') in sectors
+            ][:params.get('limit', 20)]
+        elif "MATCH (c:Company {ticker: $ticker})" in query and "RETURN" in query:
+            company = self.companies.get(params.get('ticker'))
+            if company:
+                return [{'company': company.get('name'), 'sector': company.get('sector'),
+                         'price': company.get('price'), 'change': company.get('changePercent')}]
+            return []
+        if "count(" in query:
+            return [{'count': len(self.articles), 'removed': 0}]
+        return []
+
+#Wires every stand-in into a GraphRAGSystem; Chroma stays real and is pointed at persist_path
+def install_fakes(system, counter: CallCounter, persist_path: str, latency: float = 0.0,
+                  articles_per_request: int = 8, entries_per_feed: int = 15):
+    import FinDataCollector
+    import HttpTransport
+    import EntityExtractor
+    from VectorDB import VectorDatabase
+    from IngestionWorker import WatchlistState
+    from NewsQuota import NewsQuota
+    from WriteBehind import WriteBehindQueue
+
+    companies = load_companies()
+    factory = ArticleFactory(companies)
+    fake_openai = FakeOpenAI(companies, counter, latency)
+    fake_yf = FakeYFinance(companies, counter, latency)
+
+    FinDataCollector.yf = fake_yf
+    HttpTransport.feedparser = FakeFeedparser(factory, counter, entries_per_feed, latency)
+    EntityExtractor.yf = fake_yf
+
+    os.makedirs(persist_path, exist_ok=True)
+    system.data_collector.quota = NewsQuota(os.path.join(persist_path, "newsapi_quota.sqlite"), daily_limit=0, requests_per_second=0)
+    system.data_collector.http.session = FakeHttpSession(FakeNewsAPI(companies, factory, counter, articles_per_request, latency))
+    system.entity_extractor.openai_client = fake_openai
+    system.openai_client = fake_openai
+    system.knowledge_graph.driver = FakeDriver(counter, latency)
+    system.vector_db = VectorDatabase("offline", persist_path=persist_path)
+    system.vector_db.openai_client = fake_openai
+    system.watchlist_state = WatchlistState(os.path.join(persist_path, "watchlist_state.json"))
+    system.write_behind = WriteBehindQueue(system.knowledge_graph, system.vector_db,
+                                           path=os.path.join(persist_path, "write_behind.sqlite"))
+    return SimpleNamespace(companies=companies, factory=factory, openai=fake_openai, yfinance=fake_yf)
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['streamlit', 'chromadb', 'neo4j', 'yfinance', 'pandas', 'feedparser', 'openai', 'numpy', 'requests']
+
+CHECK_LOADED = """
+import json, sys
+import {module}
+from LazyLoader import is_loaded
+print(json.dumps([name for name in {heavy!r} if is_loaded(name)]))
+"""
+
+#Runs one cold interpreter with -X importtime and returns (total_us, per-module cumulative us)
+def measure_once(module: str) -> tuple[int, dict]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else f"import {module} failed")
+
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            cumulative[name.strip()] = int(parts[1])
+    return sum(cumulative.values()), cumulative
+
+def eagerly_loaded(module: str) -> list[str]:
+    proc = subprocess.run(
+        [sys.executable, "-c", CHECK_LOADED.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip())
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark")
+    parser.add_argument("--module", default="GraphRag")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if the median import time exceeds this budget")
+    parser.add_argument("--json", action="store_true", help="print a single JSON line for tracking")
+    args = parser.parse_args()
+
+    totals = []
+    breakdown = {}
+    for _ in range(args.repeat):
+        total, cumulative = measure_once(args.module)
+        totals.append(total)
+        breakdown = cumulative
+
+    median_ms = statistics.median(totals) / 1000
+    loaded = eagerly_loaded(args.module)
+    slowest = sorted(breakdown.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "median_ms": round(median_ms, 2),
+            "min_ms": round(min(totals) / 1000, 2),
+            "max_ms": round(max(totals) / 1000, 2),
+            "eagerly_loaded": loaded,
+            "slowest": {name: round(us / 1000, 2) for name, us in slowest}
+        }))
+    else:
+        print(f"import {args.module}: median {median_ms:.1f} ms over {args.repeat} runs "
+              f"(min {min(totals) / 1000:.1f}, max {max(totals) / 1000:.1f})")
+        for name, us in slowest:
+            print(f"  {us / 1000:8.1f} ms  {name}")
+        print(f"heavy modules loaded at import: {', '.join(loaded) if loaded else 'none'}")
+
+    failed = bool(loaded)
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
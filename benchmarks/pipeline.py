@@ -0,0 +1,309 @@
+import argparse
+import gc
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import CallCounter, ArticleFactory, FakeDriver, FakeOpenAI, install_fakes, load_companies, short_name
+
+BACKEND_CLASSES = {'chroma': 'VectorDatabase', 'mmap': 'MmapVectorDatabase'}
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+#Times fn over iterations, then runs it once more under tracemalloc for peak memory
+def measure(name: str, dimension: str, value: int, fn, iterations: int, counter: CallCounter, setup=None) -> dict:
+    latencies = []
+    counter.clear()
+    for i in range(iterations):
+        if setup:
+            setup(i)
+        gc.collect()
+        started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - started)
+    calls = {key: round(count / iterations, 2) for key, count in counter.snapshot().items()}
+
+    if setup:
+        setup(iterations)
+    gc.collect()
+    tracemalloc.start()
+    fn(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'scenario': name,
+        'dimension': dimension,
+        'value': value,
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'peak_kb': round(peak / 1024, 1),
+        'calls_per_iteration': calls
+    }
+
+def _query_for(companies: list[dict], count: int) -> str:
+    names = [short_name(c['name']) for c in companies[:count]]
+    if count == 1:
+        return f"How is {names[0]} performing in the current market?"
+    return f"Compare {', '.join(names[:-1])} and {names[-1]} stock performance"
+
+def bench_query(ticker_counts: list[int], iterations: int, workdir: str, latency: float) -> list[dict]:
+    from GraphRag import GraphRAGSystem
+    rows = []
+    companies = load_companies()
+    for count in ticker_counts:
+        counter = CallCounter()
+        system = GraphRAGSystem("offline")
+        install_fakes(system, counter, os.path.join(workdir, f"query_{count}"), latency=latency)
+        query = _query_for(companies, count)
+
+        def setup(i):
+            system.entity_extractor.clear_cache()
+            system.query_cache.clear()
+
+        rows.append(measure('process_user_query', 'tickers', count,
+                            lambda i: system.process_user_query(query), iterations, counter, setup))
+    return rows
+
+#The first queries abandon quote fetches that hang past their timeout; the queries after them must run unaffected
+def bench_stalled_stages(queries: int, workdir: str, deadline: float = 4.0, stalled_queries: int = 8) -> list[dict]:
+    from GraphRag import GraphRAGSystem
+    counter = CallCounter()
+    system = GraphRAGSystem("offline")
+    fakes = install_fakes(system, counter, os.path.join(workdir, "stalled"))
+    tickers = 3
+    fakes.yfinance.stalled_calls = stalled_queries * tickers
+    query = _query_for(fakes.companies, tickers)
+    latencies = []
+    starved = 0
+
+    def run():
+        system.entity_extractor.clear_cache()
+        system.query_cache.clear()
+        return system.process_user_query(query, deadline_seconds=deadline)
+
+    try:
+        for _ in range(stalled_queries):
+            run()
+        for _ in range(queries):
+            started = time.perf_counter()
+            result = run()
+            latencies.append(time.perf_counter() - started)
+            starved += bool(result.get('skipped_sources'))
+    finally:
+        fakes.yfinance.release.set()
+    return [{
+        'scenario': 'after stalled quote stages',
+        'dimension': 'queries',
+        'value': queries,
+        'iterations': queries,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'peak_kb': 0.0,
+        'calls_per_iteration': {'starved_queries': starved}
+    }]
+
+def bench_vector_add(article_counts: list[int], iterations: int, workdir: str, profile: str = "full",
+                     backend: str = "chroma") -> list[dict]:
+    from VectorDB import open_vector_db
+    rows = []
+    companies = load_companies()
+    factory = ArticleFactory(companies)
+    for count in article_counts:
+        counter = CallCounter()
+        fake_openai = FakeOpenAI(companies, counter)
+        articles = factory.corpus(count)
+        tickers = [[companies[i % len(companies)]['ticker']] for i in range(count)]
+        state = {}
+
+        def setup(i):
+            path = os.path.join(workdir, f"add_{count}_{i}")
+            shutil.rmtree(path, ignore_errors=True)
+            state['db'] = open_vector_db("offline", backend, persist_path=path, profile=profile)
+            state['db'].openai_client = fake_openai
+
+        rows.append(measure(f'{BACKEND_CLASSES[backend]}.add_articles', 'articles', count,
+                            lambda i: state['db'].add_articles(articles, tickers), iterations, counter, setup))
+    return rows
+
+def _filled_vector_db(path: str, size: int, profile: str, backend: str, fake_openai):
+    from VectorDB import open_vector_db
+    db = open_vector_db("offline", backend, persist_path=path, profile=profile)
+    db.openai_client = fake_openai
+    corpus = ArticleFactory(load_companies()).corpus(size)
+    for start in range(0, size, 1000):
+        batch = corpus[start:start + 1000]
+        db.add_articles(batch, [[] for _ in batch])
+    return db
+
+def bench_vector_search(corpus_sizes: list[int], iterations: int, workdir: str, profile: str = "full",
+                        backend: str = "chroma") -> list[dict]:
+    rows = []
+    companies = load_companies()
+    queries = [f"{short_name(c['name'])} earnings outlook analyst price target" for c in companies]
+    for size in corpus_sizes:
+        counter = CallCounter()
+        fake_openai = FakeOpenAI(companies, counter)
+        db = _filled_vector_db(os.path.join(workdir, f"search_{backend}_{size}"), size, profile, backend, fake_openai)
+        rows.append(measure(f'{BACKEND_CLASSES[backend]}.search', 'corpus', size,
+                            lambda i: db.search(queries[i % len(queries)], n_results=15), iterations, counter))
+    return rows
+
+OPEN_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from VectorDB import open_vector_db
+db = open_vector_db("offline", {backend!r}, persist_path={path!r}, profile={profile!r})
+db.search("", n_results=15, query_embedding=[1.0] + [0.0] * (db.profile.dimensions - 1))
+print(time.perf_counter() - started)
+"""
+
+#Cold start in a fresh interpreter: import, open an existing store and answer the first query
+def bench_vector_open(corpus_sizes: list[int], iterations: int, workdir: str, profile: str = "full",
+                      backend: str = "chroma") -> list[dict]:
+    rows = []
+    for size in corpus_sizes:
+        path = os.path.join(workdir, f"open_{backend}_{size}")
+        _filled_vector_db(path, size, profile, backend, FakeOpenAI(load_companies(), CallCounter()))
+        script = OPEN_SCRIPT.format(root=REPO_ROOT, backend=backend, path=path, profile=profile)
+        latencies = []
+        for _ in range(iterations):
+            output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+            latencies.append(float(output.strip().splitlines()[-1]))
+        rows.append({
+            'scenario': f'{BACKEND_CLASSES[backend]}.open',
+            'dimension': 'corpus',
+            'value': size,
+            'iterations': iterations,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+            'peak_kb': 0.0,
+            'calls_per_iteration': {}
+        })
+    return rows
+
+def bench_graph_writes(article_counts: list[int], iterations: int) -> list[dict]:
+    from KG import FinancialKnowledgeGraph
+    rows = []
+    companies = load_companies()
+    factory = ArticleFactory(companies)
+    for count in article_counts:
+        counter = CallCounter()
+        kg = FinancialKnowledgeGraph()
+        kg.driver = FakeDriver(counter)
+        articles = factory.corpus(count)
+        quotes = [{
+            'ticker': c['ticker'], 'companyName': c['name'], 'sector': c['sector'], 'industry': c['industry'],
+            'marketCap': c['marketCap'], 'price': c['price'], 'change': c['change'],
+            'changePercent': f"{c['change'] / c['price'] * 100:.2f}%", 'volume': c['volume'], 'lastUpdated': '2026-10-01'
+        } for c in companies]
+
+        def write(i):
+            for quote in quotes:
+                kg.add_company(quote)
+            for index, article in enumerate(articles):
+                kg.add_news_article(article,
+                                    [companies[index % len(companies)]['ticker'], companies[(index + 1) % len(companies)]['ticker']])
+
+        rows.append(measure('FinancialKnowledgeGraph writes', 'articles', count, write, iterations, counter))
+    return rows
+
+#Flags rows whose p50 grew beyond tolerance or that make more external calls than the baseline
+def compare(rows: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    previous = {(r['scenario'], r['dimension'], r['value']): r for r in baseline}
+    regressions = []
+    for row in rows:
+        old = previous.get((row['scenario'], row['dimension'], row['value']))
+        if not old:
+            continue
+        if old['p50_ms'] > 0 and row['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{row['scenario']} {row['dimension']}={row['value']}: p50 {old['p50_ms']}ms -> {row['p50_ms']}ms")
+        for key, calls in row['calls_per_iteration'].items():
+            if calls > old['calls_per_iteration'].get(key, 0):
+                regressions.append(f"{row['scenario']} {row['dimension']}={row['value']}: {key} {old['calls_per_iteration'].get(key, 0)} -> {calls}")
+    return regressions
+
+def print_table(rows: list[dict]):
+    print(f"{'scenario':32} {'dim':>10} {'p50 ms':>10} {'p99 ms':>10} {'peak KB':>10}  calls/iter")
+    for row in rows:
+        calls = ", ".join(f"{k}={v}" for k, v in sorted(row['calls_per_iteration'].items()))
+        print(f"{row['scenario']:32} {row['dimension'][:3]}={row['value']:<6} {row['p50_ms']:>10.2f} {row['p99_ms']:>10.2f} {row['peak_kb']:>10.1f}  {calls}")
+
+def _ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks with recorded fixtures and fake upstreams")
+    parser.add_argument("--scenario", choices=['all', 'query', 'stalled', 'vector-add', 'vector-search', 'vector-open', 'graph'], default='all')
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--tickers", type=_ints, default=[1, 3, 10])
+    parser.add_argument("--articles", type=_ints, default=[50, 200, 1000])
+    parser.add_argument("--corpus", type=_ints, default=[1000, 10000])
+    parser.add_argument("--profile", default="full", help="embedding profile for the vector scenarios")
+    parser.add_argument("--backend", default="chroma", help="comma separated vector backends: chroma, mmap")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per upstream call")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="previous --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 growth before a regression is reported")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="fin-bench-")
+    rows = []
+    try:
+        if args.scenario in ('all', 'query'):
+            rows += bench_query(args.tickers, args.iterations, workdir, args.latency)
+        if args.scenario in ('all', 'stalled'):
+            rows += bench_stalled_stages(args.iterations, workdir)
+        for backend in args.backend.split(","):
+            if args.scenario in ('all', 'vector-add'):
+                rows += bench_vector_add(args.articles, args.iterations, workdir, args.profile, backend)
+            if args.scenario in ('all', 'vector-search'):
+                rows += bench_vector_search(args.corpus, args.iterations, workdir, args.profile, backend)
+            if args.scenario in ('all', 'vector-open'):
+                rows += bench_vector_open(args.corpus, min(args.iterations, 5), workdir, args.profile, backend)
+        if args.scenario in ('all', 'graph'):
+            rows += bench_graph_writes(args.articles, args.iterations)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(rows)
+    starved = [row for row in rows if row['calls_per_iteration'].get('starved_queries')]
+    for row in starved:
+        print(f"STARVED {row['scenario']}: {row['calls_per_iteration']['starved_queries']} of {row['value']} queries lost stages to abandoned calls")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(rows, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions or starved else 0)
+    if starved:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()